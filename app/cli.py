@@ -0,0 +1,231 @@
+"""Command-line corpus extraction, without the web server.
+
+    python -m app.cli extract papers/ -o results.ndjson [--model M] [--target-genes TP53 MDM2]
+
+Every PDF/TXT under the directory is parsed (PDFs in the parser process
+pool) and sent through gene/relation extraction with bounded LLM
+concurrency. One NDJSON record is written per document. A checkpoint next
+to the output file records finished documents, so re-running the same
+command after an interruption continues where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from app.config import DEFAULT_MODEL, EXTRACTION_MAX_CONCURRENCY
+from app.services import document_processor, llm_client, pdf_parser
+from app.services.bio_extractor import extract_documents
+from app.utils.logs import setup_logging
+
+
+class Checkpoint:
+    """Append-only record of finished documents for one output file.
+
+    The first line holds the run settings; each further line names a
+    finished document and the output size after its record was written, so
+    a partially written record can be cut off when resuming.
+    """
+
+    def __init__(self, path: Path, settings: dict):
+        self.path = path
+        self.settings = settings
+        self.done: set[str] = set()
+        self.offset = 0
+        self._file = None
+
+    def load(self, restart: bool = False):
+        """Read an existing checkpoint; raises ValueError if it was made with other settings"""
+        if restart or not self.path.exists():
+            self.path.write_text(json.dumps(self.settings) + "\n", encoding="utf-8")
+        else:
+            content = self.path.read_bytes()
+            lines = content.split(b"\n")
+            try:
+                settings = json.loads(lines[0])
+            except json.JSONDecodeError:
+                settings = None
+            if settings != self.settings:
+                raise ValueError(
+                    f"{self.path} was written with different settings; use --restart to start over"
+                )
+            # Only newline-terminated entries are complete (the last split part never is)
+            valid_end = len(lines[0]) + 1
+            for line in lines[1:-1]:
+                try:
+                    entry = json.loads(line)
+                    path, offset = entry["path"], entry["offset"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # Cut off mid-write
+                    break
+                self.done.add(path)
+                self.offset = offset
+                valid_end += len(line) + 1
+            if valid_end < len(content):
+                # Drop the partial entry so new ones start on a line of their own
+                with open(self.path, "r+b") as f:
+                    f.truncate(valid_end)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def mark_done(self, path: str, offset: int):
+        self.done.add(path)
+        self.offset = offset
+        self._file.write(json.dumps({"path": path, "offset": offset}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+def find_documents(directory: Path) -> list[Path]:
+    """Supported documents under a directory, in a stable order"""
+    return sorted(
+        path for path in directory.rglob("*")
+        if path.is_file() and document_processor.is_supported(path.name) and not path.name.startswith(".")
+    )
+
+
+async def extract_corpus(args: argparse.Namespace) -> int:
+    """Run extraction over a directory; returns the process exit code"""
+    directory = Path(args.directory)
+    output_path = Path(args.output)
+    settings = {
+        "model": args.model or DEFAULT_MODEL,
+        "target_genes": args.target_genes,
+        "target_relations": args.target_relations
+    }
+    # Without the output there is nothing to resume
+    restart = args.restart or not output_path.exists()
+    checkpoint = Checkpoint(Path(f"{output_path}.checkpoint"), settings)
+    if not restart and not checkpoint.path.exists():
+        # Resuming would truncate the output to nothing
+        print(f"error: {output_path} exists but has no checkpoint; use --restart to overwrite it", file=sys.stderr)
+        return 2
+    try:
+        checkpoint.load(restart=restart)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    documents = find_documents(directory)
+    pending = [p for p in documents if p.relative_to(directory).as_posix() not in checkpoint.done]
+    print(f"{len(documents)} documents, {len(documents) - len(pending)} already done, {len(pending)} to go",
+          file=sys.stderr)
+
+    # Drop anything written after the last checkpointed record
+    output = open(output_path, "wb" if restart else "r+b")
+    output.truncate(checkpoint.offset)
+    output.seek(0, 2)
+
+    llm_semaphore = asyncio.Semaphore(args.llm_concurrency)
+    queue: asyncio.Queue[Path] = asyncio.Queue()
+    for path in pending:
+        queue.put_nowait(path)
+
+    started = time.monotonic()
+    stats = {"done": 0, "failed": 0}
+    # Tokens the proxy reported as used (prompt and completion) since the start
+    tokens_before = sum(llm_client.LLM_TOKENS.values().values())
+    last_report = 0.0
+
+    def report(final: bool = False):
+        nonlocal last_report
+        now = time.monotonic()
+        if not final and now - last_report < args.report_interval:
+            return
+        last_report = now
+        minutes = max(now - started, 1e-6) / 60
+        print(
+            f"[{stats['done'] + stats['failed']}/{len(pending)}] "
+            f"{stats['done'] / minutes:.1f} docs/min, "
+            f"{(sum(llm_client.LLM_TOKENS.values().values()) - tokens_before) / minutes:,.0f} tokens/min, "
+            f"{stats['failed']} failed",
+            file=sys.stderr
+        )
+
+    async def worker():
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            key = path.relative_to(directory).as_posix()
+            try:
+                content_hash = await asyncio.to_thread(pdf_parser.file_hash, path)
+                text = await document_processor.extract_text(path, content_hash)
+                results = await extract_documents(
+                    {key: text},
+                    model=args.model,
+                    target_genes=args.target_genes,
+                    target_relations=args.target_relations,
+                    semaphore=llm_semaphore
+                )
+            except Exception as e:
+                # Not checkpointed, so the next run retries it
+                stats["failed"] += 1
+                print(f"failed: {key}: {str(e) or type(e).__name__}", file=sys.stderr)
+                report()
+                continue
+
+            result = results[key]
+            record = {
+                "path": key,
+                "content_hash": content_hash,
+                "model": settings["model"],
+                "char_count": len(text),
+                "chunks_processed": result.get("chunks_processed", 0),
+                "entities": result.get("entities", []),
+                "relations": result.get("relations", []),
+                "parse_error": result.get("parse_error", False)
+            }
+            output.write((json.dumps(record) + "\n").encode("utf-8"))
+            output.flush()
+            checkpoint.mark_done(key, output.tell())
+            stats["done"] += 1
+            report()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(args.documents)))
+    finally:
+        output.close()
+        checkpoint.close()
+        report(final=True)
+        await llm_client.close_client()
+        pdf_parser.shutdown_pool()
+    return 1 if stats["failed"] else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="BioBuilder command-line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="Extract genes/proteins and relations from a directory of documents")
+    extract.add_argument("directory", help="Directory searched recursively for PDF/TXT files")
+    extract.add_argument("-o", "--output", required=True, help="NDJSON output file (one record per document)")
+    extract.add_argument("--model", help=f"LLM model (default: {DEFAULT_MODEL})")
+    extract.add_argument("--target-genes", nargs="+", help="Only extract relations involving these genes")
+    extract.add_argument("--target-relations", nargs="+", help="Only extract these relation types")
+    extract.add_argument("--documents", type=int, default=2 * EXTRACTION_MAX_CONCURRENCY,
+                         help="Documents parsed/extracted at once")
+    extract.add_argument("--llm-concurrency", type=int, default=EXTRACTION_MAX_CONCURRENCY,
+                         help="Max concurrent LLM requests across all documents")
+    extract.add_argument("--report-interval", type=float, default=10.0, help="Seconds between throughput lines")
+    extract.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+
+    args = parser.parse_args(argv)
+    setup_logging()
+    if args.command == "extract":
+        if not Path(args.directory).is_dir():
+            parser.error(f"not a directory: {args.directory}")
+        try:
+            return asyncio.run(extract_corpus(args))
+        except KeyboardInterrupt:
+            print("interrupted; re-run the same command to resume", file=sys.stderr)
+            return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
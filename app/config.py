@@ -1,17 +1,178 @@
 """Configuration settings for BioBuilder"""
+import os
 from pathlib import Path
 
-# Base paths
+# Base paths (uploads and data can be moved with BIOBUILDER_UPLOAD_DIR and
+# BIOBUILDER_DATA_DIR, e.g. to benchmark against an empty instance)
 BASE_DIR = Path(__file__).parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(os.environ.get("BIOBUILDER_UPLOAD_DIR", BASE_DIR / "uploads"))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+DATA_DIR = Path(os.environ.get("BIOBUILDER_DATA_DIR", BASE_DIR / "data"))
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+PAGE_CACHE_DIR = DATA_DIR / "page_cache"
+PAGE_CACHE_DIR.mkdir(exist_ok=True)
 
 # LiteLLM Proxy Settings
-LITELLM_BASE_URL = "http://0.0.0.0:4000"
+LITELLM_BASE_URL = os.environ.get("LITELLM_BASE_URL", "http://0.0.0.0:4000")
 LITELLM_API_KEY = "sk-1234"
 
 # Default model for completions
 DEFAULT_MODEL = "nvidia-gpt-oss-120b"
 
+# Document storage backend ("sqlite" persists across restarts and is shared
+# by all workers; "memory" is process-local)
+DOCUMENT_STORE_BACKEND = "sqlite"
+DOCUMENT_DB_PATH = DATA_DIR / "documents.db"
+
 # Max file upload size (10MB)
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Uploads are streamed to disk in chunks of this size (bytes)
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Batch uploads: max archive size, max files per batch (archive members
+# included) and how many files are processed at once
+MAX_ARCHIVE_UPLOAD_SIZE = 500 * 1024 * 1024
+BATCH_MAX_FILES = 1000
+BATCH_PROCESS_CONCURRENCY = 4
+
+# PDF parsing: worker processes and pages per parsing task
+PDF_PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+PDF_PAGES_PER_TASK = 8
+
+# Text preprocessing at upload: sections dropped before Q&A and extraction
+# (by heading; an unheaded numbered reference list counts as "references"),
+# lines repeated within the first/last PREPROCESS_EDGE_LINES lines of at
+# least PREPROCESS_BOILERPLATE_MIN_PAGES pages and this fraction of all pages
+# (running headers and footers), and line-number columns of at least
+# PREPROCESS_LINE_NUMBER_MIN_RUN lines on a page
+PREPROCESS_ENABLED = True
+PREPROCESS_DROP_SECTIONS = ("references", "acknowledgments", "funding", "author contributions", "competing interests")
+PREPROCESS_EDGE_LINES = 3
+PREPROCESS_BOILERPLATE_MIN_PAGES = 3
+PREPROCESS_BOILERPLATE_MIN_FRACTION = 0.3
+PREPROCESS_LINE_NUMBER_MIN_RUN = 10
+
+# LLM client connection pool and timeouts (seconds)
+LLM_REQUEST_TIMEOUT = 300.0
+LLM_CONNECT_TIMEOUT = 10.0
+LLM_MAX_CONNECTIONS = 100
+LLM_MAX_KEEPALIVE_CONNECTIONS = 20
+LLM_KEEPALIVE_EXPIRY = 30.0
+
+# LLM admission control: concurrent requests and tokens per minute per model
+# (unlisted models get the defaults; None means unlimited), retries of rate
+# limited or failed requests with jittered exponential backoff (seconds), and
+# how long interactive requests may queue before the server reports overload
+LLM_MODEL_CONCURRENCY: dict[str, int] = {}
+LLM_DEFAULT_CONCURRENCY = 16
+LLM_MODEL_TOKENS_PER_MINUTE: dict[str, int] = {}
+LLM_DEFAULT_TOKENS_PER_MINUTE: int | None = None
+LLM_MAX_RETRIES = 4
+LLM_RETRY_BASE_DELAY = 1.0
+LLM_RETRY_MAX_DELAY = 30.0
+LLM_INTERACTIVE_QUEUE_TIMEOUT = 60.0
+
+# Hedged requests: an interactive chat completion still unanswered after the
+# LLM_HEDGE_PERCENTILE of its model's recent latencies (never sooner than
+# LLM_HEDGE_MIN_DELAY seconds) is sent again, to the model's fallback if one
+# is configured, and the first response wins. None disables hedging. A
+# model is hedged once LLM_HEDGE_MIN_SAMPLES of its latencies are known
+LLM_HEDGE_PERCENTILE: float | None = 0.95
+LLM_HEDGE_MIN_DELAY = 1.0
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_LATENCY_SAMPLES = 500
+LLM_FALLBACK_MODELS: dict[str, str] = {}
+
+# Context windows (tokens) of known models; other models get the default.
+# A fraction of every window is left unused to absorb token estimation error
+MODEL_CONTEXT_WINDOWS = {
+    "nvidia-gpt-oss-120b": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+CONTEXT_SAFETY_MARGIN = 0.05
+TOKEN_COUNT_CACHE_ENTRIES = 50000
+
+# Chunked extraction: chunk size and overlap (tokens; chunks shrink further
+# if the model's window is smaller), output tokens per chunk, and how many
+# chunks are sent to the LLM at once
+EXTRACTION_CHUNK_TOKENS = 3000
+EXTRACTION_CHUNK_OVERLAP_TOKENS = 200
+EXTRACTION_MAX_OUTPUT_TOKENS = 4000
+EXTRACTION_MAX_CONCURRENCY = 8
+
+# Q&A retrieval: passage size/overlap (characters), BM25 parameters, how
+# many passages are put into the prompt, and the context token budget (also
+# limited by the model's window; None to fill the window)
+PASSAGE_SIZE = 1500
+PASSAGE_OVERLAP = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+QA_TOP_K_PASSAGES = 12
+QA_CONTEXT_TOKEN_BUDGET = 6000
+QA_MAX_OUTPUT_TOKENS = 2000
+
+# Q&A answer cache (per worker process): answers kept, and seconds before an
+# answer is asked again. Keys include the documents' content hashes, so
+# deleted or replaced documents never serve stale answers
+QA_ANSWER_CACHE_ENTRIES = 1000
+QA_ANSWER_CACHE_TTL = 24 * 3600
+
+# Semantic passage search: embedding model served by the proxy (unset, the
+# default, disables it), passages per embeddings request and requests in
+# flight per document, documents missing from the index embedded per search,
+# and the memory-mapped vector index (grown this many rows at a time,
+# compacted once this fraction of its rows are deleted)
+EMBEDDING_MODEL: str | None = os.environ.get("BIOBUILDER_EMBEDDING_MODEL") or None
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_MAX_CONCURRENCY = 4
+EMBEDDING_BACKFILL_DOCUMENTS = 4
+VECTOR_INDEX_DIR = DATA_DIR / "vectors"
+VECTOR_INDEX_GROWTH_ROWS = 8192
+VECTOR_INDEX_COMPACT_FRACTION = 0.3
+SEARCH_TOP_K = 10
+SEARCH_MAX_TOP_K = 100
+
+# Evidence grounding: fraction of an extracted relation's evidence quote
+# (by characters, ignoring case, spacing and punctuation) that must be found
+# in its document, and documents whose grounding index is kept in memory
+EVIDENCE_MIN_MATCH = 0.6
+EVIDENCE_INDEX_DOCUMENTS = 256
+
+# Extraction result cache: entries kept in memory, and total size of the
+# on-disk tier before least recently used entries are evicted
+EXTRACTION_CACHE_DB_PATH = DATA_DIR / "extraction_cache.db"
+EXTRACTION_CACHE_MEMORY_ENTRIES = 2000
+EXTRACTION_CACHE_DISK_BYTES = 512 * 1024 * 1024
+
+# Background jobs: concurrent jobs per worker process and max queued jobs.
+# Job event streams poll every JOB_EVENTS_POLL_INTERVAL seconds and give up
+# on a job whose record hasn't changed for JOB_EVENTS_STALL_TIMEOUT seconds
+JOB_WORKERS = 4
+JOB_QUEUE_MAX_DEPTH = 100
+JOB_EVENTS_POLL_INTERVAL = 0.5
+JOB_EVENTS_STALL_TIMEOUT = 30 * 60
+
+# Targeted extraction pre-filter: HGNC-style symbol/alias TSV (optional) and
+# sentences of context kept around each target mention
+GENE_ALIAS_PATH = DATA_DIR / "gene_aliases.tsv"
+PREFILTER_CONTEXT_SENTENCES = 1
+
+# Knowledge graph of extracted entities/relations across documents. Path
+# queries give up after KNOWLEDGE_GRAPH_PATH_MAX_NODES nodes searched (and
+# as many partial paths extended)
+KNOWLEDGE_GRAPH_DB_PATH = DATA_DIR / "knowledge_graph.db"
+KNOWLEDGE_GRAPH_PATH_MAX_NODES = 20000
+
+# Logging: JSON lines written by a background thread to LOG_DIR/debug.log,
+# rotated at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT old files. Records are
+# dropped rather than blocking when LOG_QUEUE_SIZE records are waiting. Raw
+# LLM payloads are logged at DEBUG for a sampled fraction of calls, cut to
+# LOG_PAYLOAD_MAX_CHARS
+LOG_DIR = Path(os.environ.get("BIOBUILDER_LOG_DIR", BASE_DIR / "logs"))
+LOG_LEVEL = os.environ.get("BIOBUILDER_LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = 20 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000
+LOG_PAYLOAD_SAMPLE_RATE = 0.1
+LOG_PAYLOAD_MAX_CHARS = 2000
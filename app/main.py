@@ -1,17 +1,40 @@
 """FastAPI main application"""
+import openai
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from app.routers import documents, qa, extraction, models
+from app.routers import documents, qa, extraction, graph, metrics, models, search
+from app.services import job_queue, llm_client, llm_scheduler, pdf_parser
+from app.utils.logs import RequestIdMiddleware, setup_logging, shutdown_logging
+from app.utils.metrics import MetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    # JSON log records, written by a background thread
+    setup_logging()
+    # Resume persisted jobs and fail those whose worker process exited
+    job_queue.start()
+    yield
+    await job_queue.shutdown()
+    # Release pooled connections to the LiteLLM proxy
+    await llm_client.close_client()
+    pdf_parser.shutdown_pool()
+    shutdown_logging()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="BioBuilder",
     description="Scientific Document Analysis Server",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -23,6 +46,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency histograms, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Request IDs for log records, taken from or returned in X-Request-ID
+app.add_middleware(RequestIdMiddleware)
+
+@app.exception_handler(llm_scheduler.LLMOverloadedError)
+@app.exception_handler(openai.RateLimitError)
+async def llm_overloaded_handler(request: Request, exc: Exception):
+    """Report LLM overload as 503 with Retry-After instead of a server error"""
+    retry_after = getattr(exc, "retry_after", None) or llm_scheduler.retry_after(exc) or 5
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc) or "The LLM service is busy, try again shortly"},
+        headers={"Retry-After": str(max(1, round(retry_after)))}
+    )
+
+
 # Setup paths
 BASE_DIR = Path(__file__).parent.parent
 STATIC_DIR = BASE_DIR / "static"
@@ -38,7 +79,10 @@ templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(qa.router, prefix="/api/qa", tags=["Q&A"])
 app.include_router(extraction.router, prefix="/api/extraction", tags=["Extraction"])
+app.include_router(graph.router, prefix="/api/graph", tags=["Knowledge Graph"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
 app.include_router(models.router, prefix="/api/models", tags=["Models"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 
 @app.get("/")
@@ -1,12 +1,13 @@
 """Document management router"""
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services import document_processor
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from app.config import MAX_UPLOAD_SIZE, MAX_ARCHIVE_UPLOAD_SIZE, BATCH_MAX_FILES
+from app.services import document_processor, job_queue
 
 router = APIRouter()
 
 
 @router.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(request: Request, file: UploadFile = File(...)):
     """Upload a scientific document (PDF or TXT)"""
     # Validate file type
     filename = file.filename or "unknown"
@@ -18,11 +19,19 @@ async def upload_document(file: UploadFile = File(...)):
             detail="Only PDF and TXT files are supported"
         )
     
-    # Read content
-    content = await file.read()
+    # Reject oversized requests before streaming anything (allowing for multipart overhead)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_SIZE // (1024 * 1024)}MB upload limit")
     
-    # Process document
-    result = await document_processor.process_document(filename, content)
+    # Stream content to disk
+    try:
+        file_path, content_hash = await document_processor.save_upload(file.read)
+    except document_processor.UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    # Process document (or map to an identical existing one)
+    result = await document_processor.process_document(filename, file_path, content_hash)
     
     return {
         "success": True,
@@ -30,6 +39,97 @@ async def upload_document(file: UploadFile = File(...)):
     }
 
 
+async def run_batch_upload(params: dict, progress) -> dict:
+    """Job runner: process the files of a batch upload"""
+    return await document_processor.process_batch(params["files"], progress)
+
+
+job_queue.register("batch_upload", run_batch_upload)
+
+
+@router.post("/batch", status_code=202)
+async def upload_batch(files: list[UploadFile] = File(...)):
+    """Upload many documents (PDF/TXT files and/or zip/tar archives of them) at once.
+
+    Files are streamed to disk and then processed concurrently as a
+    background job; poll /batch/{job_id} for per-file progress and results.
+    """
+    entries = []
+    try:
+        for file in files:
+            filename = file.filename or "unknown"
+            if document_processor.is_archive(filename):
+                archive_path, _ = await document_processor.save_upload(file.read, MAX_ARCHIVE_UPLOAD_SIZE)
+                try:
+                    entries += await document_processor.unpack_archive(archive_path, BATCH_MAX_FILES - len(entries))
+                finally:
+                    archive_path.unlink(missing_ok=True)
+            elif not document_processor.is_supported(filename):
+                entries.append({"filename": filename, "error": "Only PDF and TXT files are supported"})
+            else:
+                try:
+                    file_path, content_hash = await document_processor.save_upload(file.read)
+                    entries.append({"filename": filename, "path": str(file_path), "content_hash": content_hash})
+                except document_processor.UploadTooLargeError as e:
+                    entries.append({"filename": filename, "error": str(e)})
+            if len(entries) > BATCH_MAX_FILES:
+                raise document_processor.TooManyFilesError(f"A batch may hold at most {BATCH_MAX_FILES} documents")
+        
+        if not any(entry.get("path") for entry in entries):
+            errors = "; ".join(f"{e['filename']}: {e['error']}" for e in entries)
+            raise HTTPException(status_code=400, detail=f"No processable PDF or TXT files in the upload. {errors}".strip())
+        job = job_queue.submit("batch_upload", {"files": entries})
+    except (document_processor.UploadTooLargeError, document_processor.TooManyFilesError) as e:
+        document_processor.discard_batch(entries)
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        document_processor.discard_batch(entries)
+        raise HTTPException(status_code=400, detail=str(e))
+    except job_queue.QueueFullError as e:
+        document_processor.discard_batch(entries)
+        raise HTTPException(status_code=503, detail=str(e))
+    except BaseException:
+        document_processor.discard_batch(entries)
+        raise
+    
+    return {
+        "success": True,
+        "job_id": job["id"],
+        "files": len(entries)
+    }
+
+
+@router.get("/batch/{job_id}")
+async def get_batch_status(job_id: str):
+    """Progress and per-file results of a batch upload"""
+    job = job_queue.get_job(job_id)
+    if not job or job["kind"] != "batch_upload":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "done": job["done"],
+        "total": job["total"] or len(job["params"]["files"]),
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+
+@router.delete("/batch/{job_id}")
+async def cancel_batch(job_id: str):
+    """Stop a batch upload; files already processed are kept"""
+    job = job_queue.get_job(job_id)
+    if not job or job["kind"] != "batch_upload":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Batch already finished")
+    if job["status"] == job_queue.QUEUED:
+        # Never started, so its uploaded files would otherwise be left behind
+        document_processor.discard_batch(job["params"]["files"])
+    return {"success": True, "message": "Batch cancelled"}
+
+
 @router.get("")
 async def list_documents():
     """List all uploaded documents"""
@@ -56,6 +156,6 @@ async def get_document(doc_id: str):
 @router.delete("/{doc_id}")
 async def delete_document(doc_id: str):
     """Delete a document"""
-    if document_processor.delete_document(doc_id):
+    if await document_processor.delete_document(doc_id):
         return {"success": True, "message": "Document deleted"}
     raise HTTPException(status_code=404, detail="Document not found")
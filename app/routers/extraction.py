@@ -1,8 +1,13 @@
 """Gene/protein extraction router"""
+import asyncio
+import json
+import time
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services import document_processor
-from app.services.bio_extractor import extract_genes_and_relations
+from app.config import JOB_EVENTS_POLL_INTERVAL, JOB_EVENTS_STALL_TIMEOUT
+from app.services import document_processor, extraction_cache, job_queue, knowledge_graph
+from app.services.bio_extractor import extract_documents, merge_extraction_results, stream_genes_and_relations
 
 router = APIRouter()
 
@@ -21,12 +26,23 @@ class Entity(BaseModel):
     description: str = ""
 
 
+class EvidenceSpan(BaseModel):
+    doc_id: str
+    start: int
+    end: int
+    page: int | None = None
+    score: float
+
+
 class Relation(BaseModel):
     source: str
     target: str
     type: str
     description: str = ""
     evidence: str = ""
+    additional_evidence: list[str] = []
+    grounded: bool = False
+    evidence_span: EvidenceSpan | None = None
 
 
 class ExtractionResponse(BaseModel):
@@ -35,28 +51,24 @@ class ExtractionResponse(BaseModel):
     model_used: str
     documents_used: int
     parse_error: bool = False
+    chunks_processed: int = 0
+    documents_from_full_extraction: int = 0
 
 
-@router.post("/genes", response_model=ExtractionResponse)
-async def extract_genes(request: ExtractionRequest):
-    """Extract genes/proteins and their relationships from documents"""
-    
-    # Get document text
-    text = document_processor.get_combined_text(request.document_ids)
-    
-    if not text:
-        raise HTTPException(
-            status_code=400,
-            detail="No documents available. Please upload documents first."
-        )
-    
-    # Extract genes and relations
-    result = await extract_genes_and_relations(
-        text, 
-        model=request.model,
-        target_genes=request.target_genes,
-        target_relations=request.target_relations
-    )
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str
+    done: int = 0
+    total: int = 0
+    result: ExtractionResponse | None = None
+    error: str | None = None
+    created_at: float
+    updated_at: float
+
+
+def build_extraction_response(result: dict, request: ExtractionRequest) -> ExtractionResponse:
+    """Convert a raw extraction result into the API response"""
     
     # Count documents used
     if request.document_ids:
@@ -84,7 +96,10 @@ async def extract_genes(request: ExtractionRequest):
                 target=r.get("target", ""),
                 type=r.get("type", "unknown"),
                 description=r.get("description", ""),
-                evidence=r.get("evidence", "")
+                evidence=r.get("evidence", ""),
+                additional_evidence=r.get("additional_evidence", []),
+                grounded=bool(r.get("grounded")),
+                evidence_span=r.get("evidence_span")
             ))
     
     return ExtractionResponse(
@@ -92,5 +107,195 @@ async def extract_genes(request: ExtractionRequest):
         relations=relations,
         model_used=request.model or "default",
         documents_used=docs_used,
-        parse_error=result.get("parse_error", False)
+        parse_error=result.get("parse_error", False),
+        chunks_processed=result.get("chunks_processed", 0),
+        documents_from_full_extraction=result.get("documents_from_full_extraction", 0)
+    )
+
+
+async def run_extraction(params: dict, progress) -> dict:
+    """Job runner: extract genes/proteins and relationships for an ExtractionRequest"""
+    request = ExtractionRequest(**params)
+    
+    # Get document texts
+    texts = document_processor.get_document_texts(request.document_ids)
+    
+    if not texts:
+        raise ValueError("No documents available. Please upload documents first.")
+    
+    # Extract genes and relations per document
+    per_document = await extract_documents(
+        texts,
+        model=request.model,
+        target_genes=request.target_genes,
+        target_relations=request.target_relations,
+        progress=progress
     )
+    
+    # Full (untargeted) extractions are kept in the knowledge graph; partial
+    # ones (truncated or regex-recovered output) would answer later targeted
+    # requests incompletely, like the chunk cache they are left out
+    if not request.target_genes and not request.target_relations:
+        for doc_id, doc_result in per_document.items():
+            if not doc_result.get("parse_error"):
+                knowledge_graph.add_document(doc_id, doc_result, request.model)
+    
+    result = merge_extraction_results(list(per_document.values()))
+    result["chunks_processed"] = sum(r["chunks_processed"] for r in per_document.values())
+    result["documents_from_full_extraction"] = sum(1 for r in per_document.values() if r.get("from_full_extraction"))
+    
+    return build_extraction_response(result, request).model_dump()
+
+
+job_queue.register("extraction", run_extraction)
+
+
+def check_documents(document_ids: list[str] | None):
+    """Raise 400 unless at least one of the requested documents exists"""
+    documents = {doc["id"] for doc in document_processor.get_all_documents()}
+    if document_ids:
+        documents &= set(document_ids)
+    
+    if not documents:
+        raise HTTPException(
+            status_code=400,
+            detail="No documents available. Please upload documents first."
+        )
+
+
+def submit_extraction(request: ExtractionRequest) -> dict:
+    """Validate an extraction request and queue it as a background job"""
+    check_documents(request.document_ids)
+    
+    try:
+        return job_queue.submit("extraction", request.model_dump())
+    except job_queue.QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/genes", response_model=ExtractionResponse)
+async def extract_genes(request: ExtractionRequest):
+    """Extract genes/proteins and their relationships from documents"""
+    
+    # Run as a job and wait for it
+    job = submit_extraction(request)
+    job = await job_queue.wait(job["id"])
+    
+    if job["status"] == job_queue.CANCELLED:
+        raise HTTPException(status_code=409, detail="Extraction was cancelled")
+    if job["status"] != job_queue.COMPLETED:
+        raise HTTPException(status_code=500, detail=job["error"] or "Extraction failed")
+    
+    return job["result"]
+
+
+@router.post("/genes/stream")
+async def extract_genes_stream(request: ExtractionRequest, format: str = "ndjson"):
+    """Extract genes/proteins and relationships, streaming each one as soon as it is parsed.
+
+    Emits NDJSON lines (or server-sent events with format=sse) of type
+    entity, relation and progress, then a final result event holding the
+    merged ExtractionResponse.
+    """
+    check_documents(request.document_ids)
+    texts = document_processor.get_document_texts(request.document_ids)
+    
+    def encode(event: dict) -> str:
+        if format == "sse":
+            return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + "\n"
+    
+    async def events():
+        try:
+            async for event in stream_genes_and_relations(
+                texts,
+                model=request.model,
+                target_genes=request.target_genes,
+                target_relations=request.target_relations
+            ):
+                if event["type"] == "result":
+                    event = {"type": "result", "data": build_extraction_response(event, request).model_dump()}
+                yield encode(event)
+        except Exception as e:
+            yield encode({"type": "error", "detail": str(e) or type(e).__name__})
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_extraction_job(request: ExtractionRequest):
+    """Queue an extraction as a background job; poll or subscribe for progress"""
+    return submit_extraction(request)
+
+
+@router.get("/jobs")
+async def get_job_queue_stats():
+    """Job queue depth and running jobs"""
+    return job_queue.get_stats()
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_extraction_job(job_id: str):
+    """Get status, progress and (when completed) the result of an extraction job"""
+    job = job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_extraction_job(job_id: str):
+    """Server-sent events with job progress until the job finishes.
+
+    A job left running by an exited worker process is failed here; a job
+    whose record stops changing for JOB_EVENTS_STALL_TIMEOUT ends the stream
+    with a "stalled" event.
+    """
+    if not job_queue.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_state = None
+        while True:
+            job = job_queue.get_job(job_id)
+            state = (job["status"], job["done"], job["total"])
+            if state != last_state:
+                last_state = state
+                payload = JobStatus(**job).model_dump()
+                if job["status"] not in job_queue.TERMINAL_STATES:
+                    payload.pop("result")
+                yield f"event: {job['status']}\ndata: {json.dumps(payload)}\n\n"
+            if job["status"] in job_queue.TERMINAL_STATES:
+                break
+            if job_queue.fail_orphaned(job_id):
+                continue
+            if time.time() - job["updated_at"] > JOB_EVENTS_STALL_TIMEOUT:
+                yield f"event: stalled\ndata: {json.dumps({'id': job_id, 'status': job['status']})}\n\n"
+                break
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_extraction_job(job_id: str):
+    """Cancel a queued or running extraction job"""
+    if job_queue.cancel(job_id):
+        return {"success": True, "message": "Job cancelled"}
+    if job_queue.get_job(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    raise HTTPException(status_code=404, detail="Job not found")
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Extraction cache hit/miss counters and sizes"""
+    return extraction_cache.get_stats()
+
+
+@router.delete("/cache")
+async def clear_cache():
+    """Clear the extraction cache"""
+    await extraction_cache.clear()
+    return {"success": True, "message": "Extraction cache cleared"}
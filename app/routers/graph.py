@@ -0,0 +1,68 @@
+"""Knowledge graph router - query entities and relations across documents"""
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+from app.services import knowledge_graph
+
+router = APIRouter()
+
+
+async def resolve_node(name: str) -> str:
+    """Node ID for a name or alias, or 404"""
+    node_id = await asyncio.to_thread(knowledge_graph.resolve, name)
+    if node_id is None:
+        raise HTTPException(status_code=404, detail=f"Entity not found: {name}")
+    return node_id
+
+
+@router.get("/nodes/{name}")
+async def get_node(name: str):
+    """Get an entity with its aliases and the documents it appears in"""
+    return await asyncio.to_thread(knowledge_graph.get_node, await resolve_node(name))
+
+
+@router.get("/nodes/{name}/neighbors")
+async def get_neighbors(name: str, direction: str = "both", relation_type: str | None = None):
+    """Entities related to an entity, optionally by direction (in/out/both) and relation type"""
+    if direction not in ("in", "out", "both"):
+        raise HTTPException(status_code=400, detail="direction must be in, out or both")
+    await resolve_node(name)
+    return {"neighbors": await asyncio.to_thread(knowledge_graph.neighbors, name, direction, relation_type)}
+
+
+@router.get("/edges")
+async def get_edges(
+    source: str | None = None,
+    target: str | None = None,
+    relation_type: str | None = None,
+    document_id: str | None = None,
+    limit: int = Query(500, ge=1, le=10000)
+):
+    """Relations matching all given filters, with document provenance and evidence"""
+    edges = await asyncio.to_thread(knowledge_graph.find_edges, source, target, relation_type, document_id, limit)
+    return {"edges": edges}
+
+
+@router.get("/paths")
+async def get_paths(
+    source: str,
+    target: str,
+    max_hops: int = Query(3, ge=1, le=5),
+    directed: bool = False,
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Paths of up to max_hops relations between two entities, shortest first"""
+    await resolve_node(source)
+    await resolve_node(target)
+    return {"paths": await asyncio.to_thread(knowledge_graph.find_paths, source, target, max_hops, directed, limit)}
+
+
+@router.get("/subgraph")
+async def get_subgraph(names: list[str] = Query(...), hops: int = Query(1, ge=0, le=3)):
+    """Entities within hops of the given entities and the relations among them"""
+    return await asyncio.to_thread(knowledge_graph.subgraph, names, hops)
+
+
+@router.get("/stats")
+async def get_graph_stats():
+    """Node, edge and document counts of the knowledge graph"""
+    return await asyncio.to_thread(knowledge_graph.get_stats)
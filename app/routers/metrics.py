@@ -0,0 +1,61 @@
+"""Metrics router - Prometheus scrape endpoint"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services import extraction_cache, job_queue, llm_scheduler, vector_index
+from app.utils import metrics
+
+router = APIRouter()
+
+
+def _llm_queued():
+    for model, lane in llm_scheduler.get_stats().items():
+        for priority, count in lane["queued"].items():
+            yield (model, priority), count
+
+
+def _llm_in_flight():
+    for model, lane in llm_scheduler.get_stats().items():
+        yield (model,), lane["in_flight"]
+
+
+def _jobs():
+    stats = job_queue.get_stats()
+    yield ("queued",), stats["queued"]
+    yield ("running",), stats["running"]
+
+
+def _cache_hit_ratio():
+    lookups = {}
+    for (cache, result), count in metrics.CACHE_LOOKUPS.values().items():
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (count if result == "hit" else 0), total + count)
+    for cache, (hits, total) in lookups.items():
+        yield (cache,), hits / total if total else None
+
+
+def _extraction_cache_size():
+    stats = extraction_cache.get_stats()
+    yield ("memory",), stats["memory_entries"]
+    yield ("disk",), stats["disk_entries"]
+
+
+def _vector_rows():
+    index = vector_index.get_index()
+    if index is not None:
+        stats = index.get_stats()
+        yield ("live",), stats["rows"]
+        yield ("deleted",), stats["deleted_rows"]
+
+
+metrics.Gauge("biobuilder_llm_queued_requests", "LLM requests waiting for admission", ("model", "priority"), _llm_queued)
+metrics.Gauge("biobuilder_llm_in_flight_requests", "LLM requests admitted and not yet finished", ("model",), _llm_in_flight)
+metrics.Gauge("biobuilder_jobs", "Background jobs of this process by state", ("state",), _jobs)
+metrics.Gauge("biobuilder_cache_hit_ratio", "Cache hits over lookups since start", ("cache",), _cache_hit_ratio)
+metrics.Gauge("biobuilder_extraction_cache_entries", "Extraction cache entries per tier", ("tier",), _extraction_cache_size)
+metrics.Gauge("biobuilder_vector_index_rows", "Passage vectors in the semantic search index", ("state",), _vector_rows)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics of this worker process in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,7 @@
 """Models router - list available LLM models"""
 from fastapi import APIRouter
-from app.services.llm_client import list_models
+from app.services import answer_cache, bio_extractor, context_builder, llm_scheduler
+from app.services.llm_client import get_coalescing_stats, get_latency_stats, list_models
 
 router = APIRouter()
 
@@ -10,3 +11,18 @@ async def get_models():
     """Get list of available LLM models from LiteLLM proxy"""
     models = await list_models()
     return {"models": models}
+
+
+@router.get("/stats")
+async def get_llm_stats():
+    """Admission control queues and waits, latencies and hedging, request coalescing and Q&A answer cache counters, and token estimate calibration"""
+    return {
+        "scheduler": llm_scheduler.get_stats(),
+        "latency": get_latency_stats(),
+        "coalescing": {
+            "chat_completions": get_coalescing_stats(),
+            "extraction_chunks": bio_extractor.get_coalescing_stats()
+        },
+        "answer_cache": answer_cache.get_stats(),
+        "tokens": context_builder.get_stats()
+    }
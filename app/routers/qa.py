@@ -1,9 +1,12 @@
 """Q&A router"""
+import json
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services import document_processor
+from app.config import QA_TOP_K_PASSAGES, QA_CONTEXT_TOKEN_BUDGET, QA_MAX_OUTPUT_TOKENS
+from app.services import answer_cache, context_builder, document_processor, passage_index
 from app.services.llm_client import chat_completion, stream_chat_completion
+from app.utils import metrics
 from app.utils.prompts import QA_WITH_CONTEXT_PROMPT
 
 router = APIRouter()
@@ -15,71 +18,198 @@ class QuestionRequest(BaseModel):
     model: str | None = None
 
 
+class PassageRef(BaseModel):
+    doc_id: str
+    filename: str
+    passage: int
+    start: int
+    end: int
+    score: float
+
+
 class QuestionResponse(BaseModel):
     answer: str
     model_used: str
     documents_used: int
+    passages: list[PassageRef] = []
+    cached: bool = False
 
 
-@router.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
-    """Ask a question about the uploaded documents"""
-    
-    # Get document text
-    context = document_processor.get_combined_text(request.document_ids)
-    
-    if not context:
+def answer_cache_key(request: QuestionRequest) -> tuple[str | None, dict[str, dict]]:
+    """Answer cache key of a request and its documents by content key (no key without documents)"""
+    documents = document_processor.get_documents_by_key(request.document_ids)
+    if not documents:
+        return None, documents
+    return answer_cache.cache_key(request.question, request.model, list(documents)), documents
+
+
+def cache_answer(key: str, documents: dict[str, dict], answer: str, passages: list[dict], docs_used: int):
+    """Store an answer, recording passages by document content so a re-uploaded copy can reuse it"""
+    keys = {doc["id"]: doc_key for doc_key, doc in documents.items()}
+    answer_cache.put(key, list(documents), {
+        "answer": answer,
+        "documents_used": docs_used,
+        "passages": [
+            {**{k: v for k, v in p.items() if k not in ("doc_id", "filename")}, "document_key": keys[p["doc_id"]]}
+            for p in passages if p["doc_id"] in keys
+        ]
+    })
+
+
+def cached_passages(entry: dict, documents: dict[str, dict]) -> list[dict]:
+    """Passages of a cached answer, pointed at the current documents"""
+    return [
+        {
+            **{k: v for k, v in p.items() if k != "document_key"},
+            "doc_id": documents[p["document_key"]]["id"],
+            "filename": documents[p["document_key"]]["filename"]
+        }
+        for p in entry["passages"]
+    ]
+
+
+async def build_context(question: str, document_ids: list[str] | None, model: str | None = None) -> tuple[str, list[dict], int]:
+    """Select the passages most relevant to the question that fit the model's context.
+
+    The token budget is QA_CONTEXT_TOKEN_BUDGET, further limited to what the
+    model's window leaves after the prompt, question and answer. Returns the
+    context text, the passages used and the number of documents searched.
+    """
+    documents = {doc["id"]: doc for doc in document_processor.get_all_documents()}
+    doc_ids = [doc_id for doc_id in document_ids if doc_id in documents] if document_ids else list(documents)
+
+    if not doc_ids:
         raise HTTPException(
             status_code=400,
             detail="No documents available. Please upload documents first."
         )
-    
+
+    await document_processor.ensure_indexed(doc_ids)
+    context, selected = select_passages(question, doc_ids, documents, model)
+    return context, selected, len(doc_ids)
+
+
+@metrics.stage("context_build")
+def select_passages(question: str, doc_ids: list[str], documents: dict[str, dict], model: str | None) -> tuple[str, list[dict]]:
+    """Context text and passages of build_context, from the indexed documents"""
+    candidates = passage_index.search(question, doc_ids, QA_TOP_K_PASSAGES)
+    if not candidates:
+        candidates = passage_index.leading_passages(doc_ids, QA_TOP_K_PASSAGES)
+
+    prompt_tokens = context_builder.count_message_tokens([
+        {"role": "system", "content": QA_WITH_CONTEXT_PROMPT.format(context="")},
+        {"role": "user", "content": question}
+    ], model)
+    budget = context_builder.input_budget(model, QA_MAX_OUTPUT_TOKENS, prompt_tokens)
+    if QA_CONTEXT_TOKEN_BUDGET is not None:
+        budget = min(budget, QA_CONTEXT_TOKEN_BUDGET)
+
+    # Take the best passages that fit the budget, fetching only their text
+    selected = []
+    for passage in candidates:
+        doc_id = passage["doc_id"]
+        passage["filename"] = documents[doc_id]["filename"]
+        header = f"=== Document: {passage['filename']} (passage {passage['passage'] + 1}) ===\n"
+        text = document_processor.get_document_text_range(doc_id, passage["start"], passage["end"])
+        tokens = (
+            context_builder.cached_tokens((doc_id, passage["start"], passage["end"]), text, model)
+            + context_builder.count_tokens(header, model)
+        )
+        if tokens <= budget:
+            selected.append((passage, header + text))
+            budget -= tokens
+
+    # Present passages in document order
+    order = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    selected.sort(key=lambda item: (order[item[0]["doc_id"]], item[0]["start"]))
+
+    context = "\n\n".join(text for _, text in selected)
+    return context, [passage for passage, _ in selected]
+
+
+@router.post("/ask", response_model=QuestionResponse)
+async def ask_question(request: QuestionRequest):
+    """Ask a question about the uploaded documents"""
+    key, documents = answer_cache_key(request)
+    cached = answer_cache.get(key) if key else None
+    if cached:
+        return QuestionResponse(
+            answer=cached["answer"],
+            model_used=request.model or "default",
+            documents_used=cached["documents_used"],
+            passages=[PassageRef(**p) for p in cached_passages(cached, documents)],
+            cached=True
+        )
+
+    # Retrieve relevant passages
+    context, passages, docs_used = await build_context(request.question, request.document_ids, request.model)
+
     # Prepare prompt with context
     system_prompt = QA_WITH_CONTEXT_PROMPT.format(context=context)
-    
+
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": request.question}
     ]
-    
+
     # Get answer from LLM
-    answer = await chat_completion(messages, model=request.model)
-    
-    # Count documents used
-    if request.document_ids:
-        docs_used = len(request.document_ids)
-    else:
-        docs_used = len(document_processor.get_all_documents())
-    
+    answer = await chat_completion(messages, model=request.model, max_tokens=QA_MAX_OUTPUT_TOKENS)
+    cache_answer(key, documents, answer, passages, docs_used)
+
     return QuestionResponse(
         answer=answer,
         model_used=request.model or "default",
-        documents_used=docs_used
+        documents_used=docs_used,
+        passages=[PassageRef(**p) for p in passages]
     )
 
 
 @router.post("/ask_stream")
 async def ask_question_stream(request: QuestionRequest):
-    """Ask a question about the uploaded documents with streaming response"""
-    
-    # Get document text
-    context = document_processor.get_combined_text(request.document_ids)
-    
-    if not context:
-        raise HTTPException(
-            status_code=400,
-            detail="No documents available. Please upload documents first."
-        )
-    
-    # Prepare prompt with context
-    system_prompt = QA_WITH_CONTEXT_PROMPT.format(context=context)
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": request.question}
-    ]
-    
+    """Ask a question about the uploaded documents with streaming response.
+
+    Cached answers are replayed as a single chunk; X-Answer-Cache tells
+    whether the answer came from the cache.
+    """
+    key, documents = answer_cache_key(request)
+    cached = answer_cache.get(key) if key else None
+    if cached:
+        passages = cached_passages(cached, documents)
+
+        async def replay():
+            yield cached["answer"]
+
+        body = replay()
+    else:
+        # Retrieve relevant passages
+        context, passages, docs_used = await build_context(request.question, request.document_ids, request.model)
+
+        # Prepare prompt with context
+        system_prompt = QA_WITH_CONTEXT_PROMPT.format(context=context)
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": request.question}
+        ]
+
+        async def record():
+            # Only answers streamed to the end are cached
+            parts = []
+            async for piece in stream_chat_completion(messages, model=request.model, max_tokens=QA_MAX_OUTPUT_TOKENS):
+                parts.append(piece)
+                yield piece
+            cache_answer(key, documents, "".join(parts), passages, docs_used)
+
+        body = record()
+
+    # Passages used are reported in a header since the body is the answer text
+    passages_header = json.dumps(
+        [{"doc_id": p["doc_id"], "passage": p["passage"]} for p in passages],
+        separators=(",", ":")
+    )
+
     return StreamingResponse(
-        stream_chat_completion(messages, model=request.model),
-        media_type="text/plain"
+        body,
+        media_type="text/plain",
+        headers={"X-Passages-Used": passages_header, "X-Answer-Cache": "hit" if cached else "miss"}
     )
@@ -0,0 +1,31 @@
+"""Semantic search router - passages closest in meaning to a query"""
+from fastapi import APIRouter, HTTPException, Query
+from app.config import EMBEDDING_MODEL, SEARCH_TOP_K, SEARCH_MAX_TOP_K
+from app.services import document_processor, vector_index
+
+router = APIRouter()
+
+
+@router.get("")
+async def search(
+    q: str = Query(..., min_length=1),
+    top_k: int = Query(SEARCH_TOP_K, ge=1, le=SEARCH_MAX_TOP_K),
+    document_ids: list[str] | None = Query(None)
+):
+    """Top-k passages by cosine similarity of their embeddings to the query's"""
+    if vector_index.get_index() is None:
+        raise HTTPException(status_code=503, detail="Semantic search is disabled (no EMBEDDING_MODEL configured)")
+
+    documents = {doc["id"]: doc for doc in document_processor.get_all_documents()}
+    doc_ids = [doc_id for doc_id in document_ids if doc_id in documents] if document_ids else list(documents)
+    await document_processor.ensure_embedded(doc_ids)
+
+    results = []
+    for passage in await vector_index.search(q, top_k, doc_ids if document_ids else None):
+        doc = documents.get(passage["doc_id"])
+        if doc is None:
+            continue
+        passage["filename"] = doc["filename"]
+        passage["text"] = document_processor.get_document_text_range(passage["doc_id"], passage["start"], passage["end"])
+        results.append(passage)
+    return {"query": q, "model": EMBEDDING_MODEL, "results": results}
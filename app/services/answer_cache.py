@@ -0,0 +1,102 @@
+"""Cache of Q&A answers keyed by question, model and document contents.
+
+Keys cover the normalized question, the model, the prompt and the content
+hashes of the documents asked about, so deleting, adding or replacing a
+document in the set makes old answers unreachable even in other worker
+processes; this process also drops them right away. Entries expire after
+QA_ANSWER_CACHE_TTL seconds and the least recently used are evicted beyond
+QA_ANSWER_CACHE_ENTRIES.
+"""
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from app.config import (
+    DEFAULT_MODEL,
+    QA_TOP_K_PASSAGES,
+    QA_CONTEXT_TOKEN_BUDGET,
+    QA_MAX_OUTPUT_TOKENS,
+    QA_ANSWER_CACHE_ENTRIES,
+    QA_ANSWER_CACHE_TTL,
+)
+from app.utils import metrics
+from app.utils.prompts import QA_WITH_CONTEXT_PROMPT
+
+# Most recently used last; values are (stored_at, content hashes, entry)
+_entries: OrderedDict[str, tuple[float, frozenset[str], dict]] = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Question with case, spacing and trailing punctuation ignored"""
+    question = unicodedata.normalize("NFKC", question).lower()
+    return TRAILING_PUNCTUATION.sub("", " ".join(question.split()))
+
+
+def cache_key(question: str, model: str | None, content_hashes: list[str]) -> str:
+    """Hash of everything that determines the answer"""
+    payload = json.dumps([
+        QA_WITH_CONTEXT_PROMPT,
+        QA_TOP_K_PASSAGES,
+        QA_CONTEXT_TOKEN_BUDGET,
+        QA_MAX_OUTPUT_TOKENS,
+        model or DEFAULT_MODEL,
+        sorted(content_hashes),
+        normalize_question(question)
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> dict | None:
+    """A cached answer ({"answer", "passages", "documents_used"}), if present and fresh"""
+    item = _entries.get(key)
+    if item is not None and time.monotonic() - item[0] > QA_ANSWER_CACHE_TTL:
+        del _entries[key]
+        _stats["expired"] += 1
+        item = None
+    metrics.cache_lookup("qa_answers", item is not None)
+    if item is None:
+        _stats["misses"] += 1
+        return None
+    _entries.move_to_end(key)
+    _stats["hits"] += 1
+    return item[2]
+
+
+def put(key: str, content_hashes: list[str], entry: dict):
+    """Store an answer for the documents with these content hashes"""
+    if QA_ANSWER_CACHE_ENTRIES <= 0:
+        return
+    _entries[key] = (time.monotonic(), frozenset(content_hashes), entry)
+    _entries.move_to_end(key)
+    _stats["stores"] += 1
+    while len(_entries) > QA_ANSWER_CACHE_ENTRIES:
+        _entries.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+def forget_document(content_hash: str):
+    """Drop answers that used a document with this content hash"""
+    stale = [key for key, (_, hashes, _) in _entries.items() if content_hash in hashes]
+    for key in stale:
+        del _entries[key]
+    _stats["invalidations"] += len(stale)
+
+
+def get_stats() -> dict:
+    """Hit/miss counters and the number of cached answers"""
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "entries": len(_entries)
+    }
+
+
+def clear():
+    """Remove all cached answers"""
+    _entries.clear()
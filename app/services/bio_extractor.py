@@ -1,33 +1,205 @@
 """Bio entity extraction service"""
+import asyncio
 import json
-from app.services.llm_client import chat_completion
+import logging
+import re
+from collections import Counter
+from typing import Callable
+from app.config import (
+    EXTRACTION_CHUNK_TOKENS,
+    EXTRACTION_CHUNK_OVERLAP_TOKENS,
+    EXTRACTION_MAX_OUTPUT_TOKENS,
+    EXTRACTION_MAX_CONCURRENCY
+)
+from app.services import context_builder, evidence_grounding, extraction_cache, gene_dictionary, knowledge_graph
+from app.services.llm_client import chat_completion, stream_chat_completion
+from app.services.llm_scheduler import BATCH
+from app.utils import metrics
+from app.utils.json_stream import IncrementalArrayParser
+from app.utils.logs import log_payload
 from app.utils.prompts import get_extraction_prompt
+from app.utils.single_flight import SingleFlight
+from app.utils.text_chunker import split_into_chunks
 
+logger = logging.getLogger(__name__)
 
-import logging
-import os
-from datetime import datetime
-
-# Setup logger
-log_dir = "logs"
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, "debug.log"),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+# Chunk extractions in flight, shared by concurrent requests for the same chunk
+_extraction_flights = SingleFlight()
+
+# How LLM extraction output could be parsed: ok, fallback (regex recovery of
+# malformed JSON), failed, or truncated (streamed output cut off)
+PARSE_RESULTS = metrics.Counter(
+    "biobuilder_extraction_parse_total",
+    "LLM extraction responses by parse outcome",
+    ("outcome",)
 )
 
-async def extract_genes_and_relations(text: str, model: str = None, target_genes: list[str] = None, target_relations: list[str] = None) -> dict:
-    """Extract genes/proteins and their relationships from text"""
+
+def get_coalescing_stats() -> dict:
+    """Single-flight counters of chunk extractions"""
+    return _extraction_flights.get_stats()
+
+
+async def extract_genes_and_relations(text: str, model: str = None, target_genes: list[str] = None, target_relations: list[str] = None, progress: Callable[[int, int], None] = None) -> dict:
+    """Extract genes/proteins and their relationships from text.
+
+    Long text is split into overlapping chunks which are sent to the LLM
+    concurrently; the per-chunk results are merged into one result.
+    progress(done, total) is called as chunks complete.
+    """
+    # Keyed None: the text is not a stored document, so nothing is looked up or cached under an ID
+    results = await extract_documents({None: text}, model, target_genes, target_relations, progress)
+    return results[None]
+
+
+async def extract_documents(texts: dict[str | None, str], model: str = None, target_genes: list[str] = None, target_relations: list[str] = None, progress: Callable[[int, int], None] = None, semaphore: asyncio.Semaphore = None) -> dict[str, dict]:
+    """Extract genes/proteins and their relationships from several documents.
+
+    texts maps document IDs (None for text that is not a stored document)
+    to text. The chunks of all documents are sent to the LLM concurrently under one limit (EXTRACTION_MAX_CONCURRENCY, or a
+    semaphore shared with other calls), and the merged result of each
+    document is returned by document ID, with the evidence of its relations
+    located in the text (see evidence_grounding).
+    """
+    # Targeted requests are answered by filtering a stored full extraction
+    # where one exists; only the remaining documents go to the LLM
+    local = {}
+    if target_genes or target_relations:
+        for doc_id in filter(None, texts):
+            full = knowledge_graph.get_extraction(doc_id, model)
+            if full is not None:
+                local[doc_id] = {
+                    **filter_extraction(full, target_genes, target_relations),
+                    "chunks_processed": 0,
+                    "from_full_extraction": True
+                }
+        if local:
+            logger.info("Serving %d of %d documents from stored full extractions", len(local), len(texts))
+    
+    chunks = []
+    for doc_id, text in texts.items():
+        if doc_id in local:
+            continue
+        if target_genes:
+            doc_chunks = split_for_model(prefilter_text(text, target_genes), model, target_genes, target_relations)
+        else:
+            doc_chunks = split_for_model(text, model, target_genes, target_relations, doc_id)
+        chunks += [(doc_id, chunk) for chunk in doc_chunks]
+    
+    logger.info(
+        "Extracting %d chunks from %d documents", len(chunks), len(texts),
+        extra={"model": model, "target_genes": target_genes, "target_relations": target_relations}
+    )
+    
+    semaphore = semaphore or asyncio.Semaphore(EXTRACTION_MAX_CONCURRENCY)
+    done = 0
+    if progress:
+        progress(0, len(chunks))
+    
+    async def run(chunk: dict) -> dict:
+        nonlocal done
+        result = await extract_cached(chunk)
+        done += 1
+        if progress:
+            progress(done, len(chunks))
+        return result
+    
+    async def extract_cached(chunk: dict) -> dict:
+        # Unchanged chunks are served from the cache without an LLM call
+        key = extraction_cache.cache_key(chunk["text"], model, target_genes, target_relations)
+        cached = await extraction_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        async def extract() -> dict:
+            async with semaphore:
+                result = await extract_chunk(chunk["text"], model, target_genes, target_relations)
+            if not result.get("parse_error"):
+                await extraction_cache.put(key, result)
+            return result
+        
+        # The same chunk being extracted for another request is awaited, not repeated
+        return await _extraction_flights.run(key, extract)
+    
+    tasks = [asyncio.ensure_future(run(chunk)) for _, chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # Don't leave the remaining chunks running after a failure
+        for task in tasks:
+            task.cancel()
+        raise
     
-    # Truncate text if too long (keep ~15k chars for context)
-    if len(text) > 15000:
-        text = text[:15000] + "...[truncated]"
+    by_document: dict[str, list[dict]] = {doc_id: [] for doc_id in texts if doc_id not in local}
+    for (doc_id, _), result in zip(chunks, results):
+        by_document[doc_id].append(result)
+    
+    merged = {}
+    for doc_id in texts:
+        if doc_id in local:
+            merged[doc_id] = local[doc_id]
+            continue
+        doc_results = by_document[doc_id]
+        merged[doc_id] = merge_extraction_results(doc_results)
+        merged[doc_id]["chunks_processed"] = len(doc_results)
+    with metrics.stage("grounding"):
+        for doc_id, result in merged.items():
+            result["relations"] = evidence_grounding.ground_relations(doc_id, texts[doc_id], result["relations"])
+    logger.info(
+        "Extracted %d entities and %d relations from %d chunks",
+        sum(len(m["entities"]) for m in merged.values()),
+        sum(len(m["relations"]) for m in merged.values()),
+        len(chunks)
+    )
+    return merged
+
+
+@metrics.stage("chunking")
+def split_for_model(text: str, model: str = None, target_genes: list[str] = None, target_relations: list[str] = None, doc_id: str = None) -> list[dict]:
+    """Split text into chunks that, with the extraction prompt and output, fit the model's context window.
+
+    Chunks hold up to EXTRACTION_CHUNK_TOKENS tokens, converted to characters
+    using the token density of this text. doc_id, if the text is a whole
+    document, lets its token count be cached.
+    
+    Chunks are sized with the uncalibrated token estimate so their boundaries,
+    and with them the extraction cache keys, don't move as the model's
+    calibration changes; the calibrated count only shrinks them when they
+    would not fit the model's window.
+    """
+    if not text:
+        return []
+    prompt_tokens = context_builder.count_message_tokens(build_extraction_messages("", target_genes, target_relations), model)
+    budget = context_builder.input_budget(model, EXTRACTION_MAX_OUTPUT_TOKENS, prompt_tokens)
+    chunk_tokens = EXTRACTION_CHUNK_TOKENS
+    if context_builder.calibrated(chunk_tokens, model) > budget:
+        chunk_tokens = int(chunk_tokens * budget / context_builder.calibrated(chunk_tokens, model))
+    if chunk_tokens <= 0:
+        raise ValueError(f"The context window of {model} is too small for extraction")
+    if doc_id:
+        text_tokens = context_builder.cached_estimate((doc_id, len(text)), text)
+    else:
+        text_tokens = context_builder.estimate_tokens(text)
+    
+    chunk_size = context_builder.chars_for_tokens(chunk_tokens, len(text), text_tokens)
+    overlap = context_builder.chars_for_tokens(min(EXTRACTION_CHUNK_OVERLAP_TOKENS, chunk_tokens // 4), len(text), text_tokens)
+    return split_into_chunks(text, chunk_size, overlap)
+
+
+def prefilter_text(text: str, target_genes: list[str]) -> str:
+    """Reduce text to the sentences mentioning the target genes or their aliases"""
+    filtered = gene_dictionary.filter_text(text, target_genes)
+    logger.info("Pre-filtered text for %s: %d -> %d chars", target_genes, len(text), len(filtered))
+    return filtered
+
+
+def build_extraction_messages(text: str, target_genes: list[str] = None, target_relations: list[str] = None) -> list[dict]:
+    """Chat messages asking the LLM to extract entities and relations from text"""
     
     # Get customized prompt
     system_prompt = get_extraction_prompt(target_genes, target_relations)
     
-    messages = [
+    return [
         {
             "role": "system",
             "content": system_prompt
@@ -37,19 +209,128 @@ async def extract_genes_and_relations(text: str, model: str = None, target_genes
             "content": f"Extract all genes, proteins, and their relationships from the following scientific text:\n\n{text}"
         }
     ]
+
+
+async def extract_chunk(text: str, model: str = None, target_genes: list[str] = None, target_relations: list[str] = None) -> dict:
+    """Extract genes/proteins and their relationships from a single chunk of text"""
+    messages = build_extraction_messages(text, target_genes, target_relations)
     
-    logging.info(f"Using model: {model}")
-    logging.info(f"Input text length: {len(text)}")
-    if target_genes:
-        logging.info(f"Targeting genes: {target_genes}")
-    if target_relations:
-        logging.info(f"Targeting relations: {target_relations}")
-    logging.info("Sending request to LLM...")
+    logger.debug("Sending %d chars to the LLM", len(text), extra={"model": model})
+
+    response = await chat_completion(messages, model=model, temperature=0.1, max_tokens=EXTRACTION_MAX_OUTPUT_TOKENS, priority=BATCH)
+    
+    log_payload(logger, "LLM extraction response", response, model=model)
+    
+    return parse_extraction_response(response)
+
+
+async def stream_chunk(text: str, model: str = None, target_genes: list[str] = None, target_relations: list[str] = None):
+    """Stream extraction of a single chunk, yielding ("entities"|"relations", obj) as each object closes.
+
+    The final item is ("result", chunk_result); if the output was cut off,
+    the result holds everything parsed before the cut and parse_error is set.
+    """
+    messages = build_extraction_messages(text, target_genes, target_relations)
+    parser = IncrementalArrayParser(("entities", "relations"))
+    
+    logger.debug("Streaming %d chars to the LLM", len(text), extra={"model": model})
+    
+    async for token in stream_chat_completion(messages, model=model, temperature=0.1, max_tokens=EXTRACTION_MAX_OUTPUT_TOKENS, priority=BATCH):
+        for key, obj in parser.feed(token):
+            yield key, obj
+    
+    result = {
+        "entities": [e for e in parser.results["entities"] if "name" in e and "type" in e],
+        "relations": [r for r in parser.results["relations"] if "source" in r and "target" in r]
+    }
+    if not parser.complete:
+        logger.warning("Streamed extraction output was incomplete")
+        result["parse_error"] = True
+    PARSE_RESULTS.inc(outcome="ok" if parser.complete else "truncated")
+    yield "result", result
+
+
+async def stream_genes_and_relations(texts: dict[str, str], model: str = None, target_genes: list[str] = None, target_relations: list[str] = None):
+    """Extract genes/proteins and relationships from documents, yielding events as results arrive.
 
-    response = await chat_completion(messages, model=model, temperature=0.1, max_tokens=4000)
+    texts maps document IDs to text. Chunks of all documents are streamed
+    from the LLM concurrently. Events are dicts:
+    {"type": "entity"|"relation", "data": ...} as soon as each object is
+    parsed (first occurrence only), {"type": "progress", "done", "total"}
+    as chunks finish, and finally {"type": "result", ...} with the merged
+    result in the same shape as extract_genes_and_relations, its relations
+    grounded in their documents (see evidence_grounding).
+    """
+    chunks = []
+    for doc_id, text in texts.items():
+        if target_genes:
+            doc_chunks = split_for_model(prefilter_text(text, target_genes), model, target_genes, target_relations)
+        else:
+            doc_chunks = split_for_model(text, model, target_genes, target_relations, doc_id)
+        chunks += [(doc_id, chunk) for chunk in doc_chunks]
+    semaphore = asyncio.Semaphore(EXTRACTION_MAX_CONCURRENCY)
+    queue: asyncio.Queue = asyncio.Queue()
+    results: list[dict | None] = [None] * len(chunks)
     
-    logging.info("Received response from LLM")
-    logging.info(f"Raw Response: {response}")
+    async def run(i: int, doc_id: str, chunk: dict):
+        try:
+            key = extraction_cache.cache_key(chunk["text"], model, target_genes, target_relations)
+            result = await extraction_cache.get(key)
+            if result is None:
+                async with semaphore:
+                    async for kind, obj in stream_chunk(chunk["text"], model, target_genes, target_relations):
+                        if kind == "result":
+                            result = obj
+                        else:
+                            await queue.put((kind, obj))
+                if not result.get("parse_error"):
+                    await extraction_cache.put(key, result)
+            else:
+                for kind in ("entities", "relations"):
+                    for obj in result.get(kind, []):
+                        await queue.put((kind, obj))
+            # Cached results stay ungrounded, as the same chunk may come from another document
+            with metrics.stage("grounding"):
+                relations = evidence_grounding.ground_relations(doc_id, texts[doc_id], result.get("relations", []))
+            results[i] = {**result, "relations": relations}
+            await queue.put(("chunk_done", None))
+        except Exception as e:
+            await queue.put(("error", e))
+    
+    tasks = [asyncio.ensure_future(run(i, doc_id, chunk)) for i, (doc_id, chunk) in enumerate(chunks)]
+    seen = set()
+    done = 0
+    try:
+        while done < len(chunks):
+            kind, obj = await queue.get()
+            if kind == "error":
+                raise obj
+            if kind == "chunk_done":
+                done += 1
+                yield {"type": "progress", "done": done, "total": len(chunks)}
+            elif kind == "entities" and "name" in obj and "type" in obj:
+                key = ("entity", _entity_key(obj["name"]))
+                if key not in seen:
+                    seen.add(key)
+                    yield {"type": "entity", "data": obj}
+            elif kind == "relations" and "source" in obj and "target" in obj:
+                key = ("relation", _entity_key(obj["source"]), _entity_key(obj["target"]), str(obj.get("type", "")).lower())
+                if key not in seen:
+                    seen.add(key)
+                    yield {"type": "relation", "data": obj}
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    merged = merge_extraction_results(results)
+    merged["chunks_processed"] = len(chunks)
+    yield {"type": "result", **merged}
+
+
+@metrics.stage("parse_response")
+def parse_extraction_response(response: str) -> dict:
+    """Parse the LLM JSON response, falling back to regex recovery of objects"""
+    response = response or ""
     
     # Parse JSON response
     try:
@@ -59,14 +340,12 @@ async def extract_genes_and_relations(text: str, model: str = None, target_genes
         if start != -1 and end > start:
             json_str = response[start:end]
             result = json.loads(json_str)
+            PARSE_RESULTS.inc(outcome="ok")
             return result
     except json.JSONDecodeError as e:
-        logging.error(f"JSON Decode Error: {e}")
-        logging.info("Attempting fallback regex parsing...")
+        logger.warning("Extraction response is not valid JSON (%s), trying fallback parsing", e)
         
         # Fallback: Extract arrays using regex
-        import re
-        
         fallback_result = {"entities": [], "relations": []}
         
         # Regex to capture individual objects inside entities/relations arrays
@@ -116,18 +395,187 @@ async def extract_genes_and_relations(text: str, model: str = None, target_genes
                     except:
                         continue
                         
-            logging.info(f"Fallback extracted {len(fallback_result['entities'])} entities and {len(fallback_result['relations'])} relations")
+            logger.info(
+                "Fallback parsing recovered %d entities and %d relations",
+                len(fallback_result["entities"]), len(fallback_result["relations"])
+            )
+            PARSE_RESULTS.inc(outcome="fallback")
             return fallback_result
             
         except Exception as fallback_error:
-            logging.error(f"Fallback parsing failed: {fallback_error}")
+            logger.error("Fallback parsing failed: %s", fallback_error)
             pass
     
     # Return raw response if JSON parsing fails
-
+    PARSE_RESULTS.inc(outcome="failed")
     return {
         "entities": [],
         "relations": [],
         "raw_response": response,
         "parse_error": True
     }
+
+
+def _entity_key(name) -> str:
+    """Normalize an entity name for matching (case, spaces, dashes)"""
+    return re.sub(r"[\s\-_]+", "", str(name)).lower()
+
+
+# Word endings that make the forms of a relation type ("phosphorylates",
+# "phosphorylation", "phosphorylated") share a stem
+RELATION_SUFFIXES = ("ation", "ion", "ing", "es", "ed", "s")
+
+
+def _relation_stems(word: str) -> set[str]:
+    """A word and what remains of it without each matching suffix (and a final "e")"""
+    stems = {word}
+    for suffix in RELATION_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stems.add(word[:-len(suffix)])
+    return stems | {stem[:-1] for stem in stems if stem.endswith("e") and len(stem) > 3}
+
+
+def relation_type_matches(rel_type: str, targets: list[str]) -> bool:
+    """Whether a relation type matches one of the requested types.
+
+    Word forms are treated alike ("phosphorylates" matches "phosphorylation",
+    "binds" matches "binding"): types match when each of their words has a
+    stem in common once RELATION_SUFFIXES are stripped.
+    """
+    rel_words = re.findall(r"[a-z]+", str(rel_type).lower())
+    for target in targets:
+        target_words = re.findall(r"[a-z]+", target.lower())
+        if not rel_words or not target_words:
+            continue
+        if "".join(rel_words) == "".join(target_words):
+            return True
+        if len(rel_words) == len(target_words) and all(
+            _relation_stems(r) & _relation_stems(t) for r, t in zip(rel_words, target_words)
+        ):
+            return True
+    return False
+
+
+def filter_extraction(result: dict, target_genes: list[str] = None, target_relations: list[str] = None) -> dict:
+    """Restrict a full extraction result to the target genes and relation types.
+
+    Targets match entity names and aliases, both those in the result and
+    those from the gene alias dictionary. Relations are kept when either
+    endpoint is a target, and entities when they are a target or take part
+    in a kept relation.
+    """
+    relations = result.get("relations", [])
+    if target_relations:
+        relations = [r for r in relations if relation_type_matches(r.get("type", ""), target_relations)]
+    
+    if target_genes:
+        target_keys = {_entity_key(name) for name in gene_dictionary.expand_targets(target_genes)}
+        for e in result.get("entities", []):
+            names = [e.get("name", ""), *(e.get("aliases") or [])]
+            if any(_entity_key(n) in target_keys for n in names):
+                target_keys.update(_entity_key(n) for n in names)
+        target_keys.discard("")
+        relations = [
+            r for r in relations
+            if _entity_key(r.get("source", "")) in target_keys or _entity_key(r.get("target", "")) in target_keys
+        ]
+    else:
+        target_keys = set()
+    
+    involved = target_keys | {_entity_key(r.get(end, "")) for r in relations for end in ("source", "target")}
+    entities = [e for e in result.get("entities", []) if _entity_key(e.get("name", "")) in involved]
+    return {"entities": entities, "relations": relations}
+
+
+def merge_extraction_results(results: list[dict]) -> dict:
+    """Merge per-chunk extraction results into one deduplicated result.
+
+    Entities that share a name or alias are unified into a single entity and
+    relations are deduplicated on (source, target, type) after mapping their
+    endpoints to the unified entity names. Distinct evidence quotes are kept.
+    """
+    results = [r for r in results if isinstance(r, dict)]
+    entities = [e for r in results for e in r.get("entities", []) if isinstance(e, dict) and e.get("name")]
+    relations = [x for r in results for x in r.get("relations", []) if isinstance(x, dict)]
+    
+    # Union entities whose names/aliases overlap
+    parent: dict[str, str] = {}
+    
+    def find(key: str) -> str:
+        while parent.setdefault(key, key) != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+    
+    for e in entities:
+        keys = [_entity_key(n) for n in [e["name"], *(e.get("aliases") or [])] if _entity_key(n)]
+        root = find(keys[0])
+        for key in keys[1:]:
+            other = find(key)
+            if other != root:
+                parent[other] = root
+    
+    groups: dict[str, list[dict]] = {}
+    for e in entities:
+        groups.setdefault(find(_entity_key(e["name"])), []).append(e)
+    
+    merged_entities = []
+    canonical: dict[str, str] = {}
+    for root, members in groups.items():
+        name = Counter(str(e["name"]) for e in members).most_common(1)[0][0]
+        types = Counter(e.get("type") for e in members if e.get("type"))
+        aliases = []
+        seen = {_entity_key(name)}
+        for e in members:
+            for alias in [e["name"], *(e.get("aliases") or [])]:
+                if _entity_key(alias) not in seen:
+                    seen.add(_entity_key(alias))
+                    aliases.append(alias)
+        descriptions = [e.get("description") for e in members if e.get("description")]
+        merged_entities.append({
+            "name": name,
+            "type": types.most_common(1)[0][0] if types else "unknown",
+            "aliases": aliases,
+            "description": max(descriptions, key=len) if descriptions else ""
+        })
+        canonical[root] = name
+    
+    def resolve(name) -> str:
+        key = _entity_key(name)
+        return canonical.get(find(key), name) if key in parent else name
+    
+    merged_relations: dict[tuple, dict] = {}
+    for r in relations:
+        source, target = resolve(r.get("source", "")), resolve(r.get("target", ""))
+        rel_type = r.get("type", "unknown")
+        key = (_entity_key(source), _entity_key(target), str(rel_type).lower())
+        if key not in merged_relations:
+            merged_relations[key] = {
+                **r,
+                "source": source,
+                "target": target,
+                "type": rel_type,
+                "evidence": "",
+                "additional_evidence": []
+            }
+        existing = merged_relations[key]
+        if not existing.get("description") and r.get("description"):
+            existing["description"] = r["description"]
+        # Inputs may themselves be merged results carrying additional evidence
+        for evidence in [r.get("evidence", ""), *(r.get("additional_evidence") or [])]:
+            if not evidence or evidence == existing["evidence"] or evidence in existing["additional_evidence"]:
+                continue
+            if existing["evidence"]:
+                existing["additional_evidence"].append(evidence)
+            else:
+                existing["evidence"] = evidence
+                # The location found for a quote goes with it
+                if evidence == r.get("evidence") and "evidence_span" in r:
+                    existing["grounded"] = r.get("grounded")
+                    existing["evidence_span"] = r["evidence_span"]
+    
+    merged = {"entities": merged_entities, "relations": list(merged_relations.values())}
+    if any(r.get("parse_error") for r in results):
+        merged["parse_error"] = True
+        merged["raw_responses"] = [raw for r in results for raw in ([r["raw_response"]] if r.get("raw_response") else r.get("raw_responses", []))]
+    return merged
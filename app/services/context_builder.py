@@ -0,0 +1,122 @@
+"""Token counting and model-aware context budgets.
+
+Token counts come from a local estimator (letter runs of up to 6
+characters, digit runs of up to 3, and single symbols each count as one
+token). The estimate is corrected per model by comparing it with the prompt
+token usage the proxy reports, so budgets track the real tokenizer of each
+model without needing it locally.
+"""
+import math
+import re
+import threading
+from collections import OrderedDict
+from app.config import (
+    DEFAULT_MODEL,
+    MODEL_CONTEXT_WINDOWS,
+    DEFAULT_CONTEXT_WINDOW,
+    CONTEXT_SAFETY_MARGIN,
+    TOKEN_COUNT_CACHE_ENTRIES,
+)
+from app.utils import metrics
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]{1,6}|\d{1,3}|\S")
+
+# Tokens added per chat message for role and formatting
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Weight of each new observation in the calibration average, and the range
+# the correction factor is kept in
+CALIBRATION_WEIGHT = 0.2
+CALIBRATION_RANGE = (0.5, 2.0)
+
+_calibration: dict[str, float] = {}
+_counts: OrderedDict[tuple, int] = OrderedDict()
+_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Uncalibrated token estimate of a text"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _factor(model: str | None) -> float:
+    return _calibration.get(model or DEFAULT_MODEL, 1.0)
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Estimated number of tokens of a text for a model"""
+    return math.ceil(estimate_tokens(text) * _factor(model))
+
+
+def count_message_tokens(messages: list[dict], model: str | None = None) -> int:
+    """Estimated prompt tokens of a list of chat messages"""
+    raw = sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    return math.ceil(raw * _factor(model))
+
+
+def cached_tokens(key: tuple, text: str, model: str | None = None) -> int:
+    """count_tokens for a text identified by key (e.g. a document or passage), computed once per key"""
+    return math.ceil(cached_estimate(key, text) * _factor(model))
+
+
+def cached_estimate(key: tuple, text: str) -> int:
+    """estimate_tokens for a text identified by key, computed once per key"""
+    with _lock:
+        raw = _counts.get(key)
+        if raw is not None:
+            _counts.move_to_end(key)
+    metrics.cache_lookup("token_counts", raw is not None)
+    if raw is None:
+        raw = estimate_tokens(text)
+        with _lock:
+            _counts[key] = raw
+            while len(_counts) > TOKEN_COUNT_CACHE_ENTRIES:
+                _counts.popitem(last=False)
+    return raw
+
+
+def calibrated(tokens: int, model: str | None = None) -> int:
+    """A token estimate corrected for a model"""
+    return math.ceil(tokens * _factor(model))
+
+
+def forget(doc_id: str):
+    """Drop cached token counts of a document"""
+    with _lock:
+        for key in [k for k in _counts if k[0] == doc_id]:
+            del _counts[key]
+
+
+def calibrate(messages: list[dict], prompt_tokens: int, model: str | None = None):
+    """Adjust a model's correction factor from the prompt tokens the proxy reported"""
+    raw = sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    if raw <= 0 or prompt_tokens <= 0:
+        return
+    model = model or DEFAULT_MODEL
+    low, high = CALIBRATION_RANGE
+    observed = min(high, max(low, prompt_tokens / raw))
+    current = _calibration.get(model)
+    _calibration[model] = observed if current is None else current + CALIBRATION_WEIGHT * (observed - current)
+
+
+def context_window(model: str | None = None) -> int:
+    """Context window of a model in tokens"""
+    return MODEL_CONTEXT_WINDOWS.get(model or DEFAULT_MODEL, DEFAULT_CONTEXT_WINDOW)
+
+
+def input_budget(model: str | None, max_output_tokens: int, prompt_tokens: int = 0) -> int:
+    """Tokens left for context after the prompt, the completion and the safety margin"""
+    usable = int(context_window(model) * (1 - CONTEXT_SAFETY_MARGIN))
+    return max(0, usable - max_output_tokens - prompt_tokens)
+
+
+def chars_for_tokens(tokens: int, text_chars: int, text_tokens: int) -> int:
+    """Characters of a text that hold about this many tokens, from the text's own density"""
+    if text_tokens <= 0:
+        return tokens * 4
+    return max(1, int(tokens * text_chars / text_tokens))
+
+
+def get_stats() -> dict:
+    """Calibration factors and token count cache size"""
+    return {"calibration": dict(_calibration), "cached_counts": len(_counts)}
@@ -1,25 +1,41 @@
 """Document processing service"""
 from pathlib import Path
-from PyPDF2 import PdfReader
+from typing import Awaitable, Callable
+import asyncio
+import hashlib
+import logging
+import tarfile
 import uuid
 import json
-from app.config import UPLOAD_DIR
+import zipfile
+import aiofiles
+from app.config import (
+    UPLOAD_DIR,
+    MAX_UPLOAD_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    BATCH_MAX_FILES,
+    BATCH_PROCESS_CONCURRENCY,
+    EMBEDDING_BACKFILL_DOCUMENTS
+)
+from app.services import (
+    answer_cache,
+    context_builder,
+    evidence_grounding,
+    knowledge_graph,
+    passage_index,
+    pdf_parser,
+    text_preprocessor,
+    vector_index
+)
+from app.services.document_store import get_store
+from app.utils import metrics
 
-# In-memory document store (for simplicity)
-_documents: dict[str, dict] = {}
+logger = logging.getLogger(__name__)
 
 
 def extract_text_from_pdf(file_path: Path) -> str:
     """Extract text content from PDF file"""
-    reader = PdfReader(str(file_path))
-    text_parts = []
-    
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            text_parts.append(text)
-    
-    return "\n\n".join(text_parts)
+    return pdf_parser.join_pages(pdf_parser.extract_pages(str(file_path)))
 
 
 def extract_text_from_txt(file_path: Path) -> str:
@@ -27,48 +43,294 @@ def extract_text_from_txt(file_path: Path) -> str:
     return file_path.read_text(encoding="utf-8")
 
 
-async def process_document(filename: str, content: bytes) -> dict:
-    """Process uploaded document and store it"""
-    doc_id = str(uuid.uuid4())[:8]
+# File types accepted as documents, and archive types accepted by batch uploads
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".text")
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE"""
+
+
+class TooManyFilesError(ValueError):
+    """Raised when a batch upload holds more than BATCH_MAX_FILES files"""
+
+
+def is_archive(filename: str) -> bool:
+    """Whether a filename is a zip or tar archive"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_supported(filename: str) -> bool:
+    """Whether a filename has a supported document extension"""
+    return Path(filename).suffix.lower() in SUPPORTED_EXTENSIONS
+
+
+async def save_upload(read: Callable[[int], Awaitable[bytes]], max_size: int = MAX_UPLOAD_SIZE) -> tuple[Path, str]:
+    """Stream an upload to a temporary file in bounded chunks, hashing as it goes.
+
+    read is an async callable returning up to n bytes (b"" at the end), such
+    as UploadFile.read. Returns the temporary path and SHA-256 of the content.
+    Raises UploadTooLargeError as soon as more than max_size bytes arrive.
+    """
+    tmp_path = UPLOAD_DIR / f".upload-{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with metrics.stage("upload"):
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while chunk := await read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLargeError(f"File exceeds the {max_size // (1024 * 1024)}MB upload limit")
+                    digest.update(chunk)
+                    await out.write(chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, digest.hexdigest()
+
+
+async def extract_pages(file_path: Path, content_hash: str | None = None) -> list[str]:
+    """Extract the per-page text of a document file (one page for non-PDFs)"""
+    ext = file_path.suffix.lower()
+    with metrics.stage("parse"):
+        if ext == ".pdf":
+            # Parsed in the process pool so the event loop stays responsive
+            return await pdf_parser.extract_pdf_pages(file_path, content_hash)
+        if ext in [".txt", ".text"]:
+            return [await asyncio.to_thread(extract_text_from_txt, file_path)]
+        # Try as text
+        content = await asyncio.to_thread(file_path.read_bytes)
+        return [content.decode("utf-8", errors="ignore")]
+
+
+async def extract_document(file_path: Path, content_hash: str | None = None) -> dict:
+    """Extract and preprocess a document file (see text_preprocessor.preprocess)"""
+    pages = await extract_pages(file_path, content_hash)
+    return await asyncio.to_thread(text_preprocessor.preprocess, pages, content_hash)
+
+
+async def extract_text(file_path: Path, content_hash: str | None = None) -> str:
+    """Extract the cleaned text of a document file, choosing the parser by extension"""
+    return (await extract_document(file_path, content_hash))["text"]
+
+
+async def process_document(filename: str, file_path: Path, content_hash: str) -> dict:
+    """Process an uploaded file and store it.
+
+    file_path is a temporary file (see save_upload) that is moved into the
+    upload directory. A file whose content hash matches a stored document is
+    not parsed again; the existing document is returned instead.
+    """
+    existing = get_store().find_by_hash(content_hash)
+    if existing:
+        file_path.unlink(missing_ok=True)
+        return {
+            "id": existing["id"],
+            "filename": existing["filename"],
+            "char_count": existing["char_count"],
+            "word_count": existing["word_count"],
+            "duplicate": True
+        }
     
-    # Determine file extension
-    ext = Path(filename).suffix.lower()
+    doc_id = str(uuid.uuid4())[:8]
     
-    # Save file
-    file_path = UPLOAD_DIR / f"{doc_id}_{filename}"
-    file_path.write_bytes(content)
+    # Move file into place
+    stored_path = UPLOAD_DIR / f"{doc_id}_{Path(filename).name}"
+    file_path.replace(stored_path)
+    file_path = stored_path
     
-    # Extract text based on file type
-    if ext == ".pdf":
-        text = extract_text_from_pdf(file_path)
-    elif ext in [".txt", ".text"]:
-        text = extract_text_from_txt(file_path)
-    else:
-        # Try as text
-        text = content.decode("utf-8", errors="ignore")
+    # Extract and clean text based on file type
+    try:
+        extracted = await extract_document(file_path, content_hash)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+    text = extracted["text"]
+    logger.info(
+        "Preprocessed %s: %d of %d characters kept",
+        filename, len(text), extracted["raw_char_count"],
+        extra={"doc_id": doc_id, "dropped_sections": extracted["dropped_sections"],
+               "removed_lines": extracted["removed_lines"]}
+    )
     
     # Store document
     doc = {
         "id": doc_id,
         "filename": filename,
         "path": str(file_path),
+        "content_hash": content_hash,
         "text": text,
         "char_count": len(text),
         "word_count": len(text.split())
     }
-    _documents[doc_id] = doc
+    get_store().add(doc)
+    # Indexes are built off the event loop and registered on it
+    index, evidence = await asyncio.gather(
+        asyncio.to_thread(passage_index.PassageIndex, text),
+        asyncio.to_thread(evidence_grounding.EvidenceIndex, text, extracted["page_starts"])
+    )
+    passage_index.add_index(doc_id, index)
+    evidence_grounding.add_index(doc_id, evidence)
+    try:
+        await vector_index.index_document(doc_id, text, list(zip(index.starts, index.ends)))
+    except Exception:
+        # Semantic search catches up later (see ensure_embedded); the upload itself succeeded
+        logger.warning("Embedding passages of %s failed", filename, exc_info=True, extra={"doc_id": doc_id})
     
     return {
         "id": doc_id,
         "filename": filename,
         "char_count": doc["char_count"],
-        "word_count": doc["word_count"]
+        "word_count": doc["word_count"],
+        "duplicate": False
     }
 
 
+async def unpack_archive(archive_path: Path, max_files: int = BATCH_MAX_FILES) -> list[dict]:
+    """Stream the supported documents in a zip/tar archive to temporary files.
+
+    Returns one batch entry per member, as {"filename", "path", "content_hash"}
+    or {"filename", "error"} for members that are too large. Directories,
+    unsupported types and macOS metadata files are skipped. Raises
+    TooManyFilesError if the archive holds more than max_files documents.
+    """
+    def members() -> tuple[zipfile.ZipFile | tarfile.TarFile, list[tuple[str, Callable]]]:
+        # The open archive and (name, opener) for every file member
+        if zipfile.is_zipfile(archive_path):
+            archive = zipfile.ZipFile(archive_path)
+            infos = [i for i in archive.infolist() if not i.is_dir()]
+            return archive, [(i.filename, lambda i=i: archive.open(i)) for i in infos]
+        archive = tarfile.open(archive_path, "r:*")
+        infos = [m for m in archive.getmembers() if m.isfile()]
+        return archive, [(m.name, lambda m=m: archive.extractfile(m)) for m in infos]
+    
+    try:
+        archive, entries = await asyncio.to_thread(members)
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise ValueError(f"Could not read archive: {e}")
+    
+    entries = [
+        (name, opener) for name, opener in entries
+        if is_supported(name) and "__MACOSX" not in name and not Path(name).name.startswith(".")
+    ]
+    saved = []
+    try:
+        if len(entries) > max_files:
+            raise TooManyFilesError(f"Archive holds more than {max_files} documents")
+        for name, opener in entries:
+            member = await asyncio.to_thread(opener)
+            try:
+                tmp_path, content_hash = await save_upload(lambda n: asyncio.to_thread(member.read, n))
+                saved.append({"filename": Path(name).name, "path": str(tmp_path), "content_hash": content_hash})
+            except UploadTooLargeError as e:
+                saved.append({"filename": Path(name).name, "error": str(e)})
+            finally:
+                member.close()
+    except BaseException:
+        discard_batch(saved)
+        raise
+    finally:
+        archive.close()
+    return saved
+
+
+def discard_batch(entries: list[dict]):
+    """Delete the temporary files of batch entries that were not processed"""
+    for entry in entries:
+        if entry.get("path"):
+            Path(entry["path"]).unlink(missing_ok=True)
+
+
+async def process_batch(entries: list[dict], progress: Callable[..., None] = None) -> dict:
+    """Process batch upload entries concurrently, isolating failures per file.
+
+    entries come from save_upload/unpack_archive. At most
+    BATCH_PROCESS_CONCURRENCY files are processed at once (PDF parsing itself
+    runs in the parser process pool). Files with identical content are
+    processed once. progress(done, total, partial_result) is called as files
+    finish.
+    """
+    results: list[dict] = [{"filename": e["filename"], "status": "pending"} for e in entries]
+    semaphore = asyncio.Semaphore(BATCH_PROCESS_CONCURRENCY)
+    done = 0
+    
+    def summary() -> dict:
+        return {
+            "files": results,
+            "succeeded": sum(1 for r in results if r["status"] == "success"),
+            "failed": sum(1 for r in results if r["status"] == "failed")
+        }
+    
+    def finish(i: int, result: dict):
+        nonlocal done
+        results[i] = {"filename": entries[i]["filename"], **result}
+        done += 1
+        if progress:
+            progress(done, len(entries), summary())
+    
+    # Later copies of the same content wait for the first one
+    first_by_hash: dict[str, asyncio.Future] = {}
+    
+    async def run(i: int, entry: dict):
+        if "error" in entry:
+            finish(i, {"status": "failed", "error": entry["error"]})
+            return
+        original = first_by_hash.get(entry["content_hash"])
+        if original is not None:
+            Path(entry["path"]).unlink(missing_ok=True)
+            document = await original
+            if document is None:
+                finish(i, {"status": "failed", "error": "Processing of an identical file failed"})
+            else:
+                finish(i, {"status": "success", "document": {**document, "duplicate": True}})
+            return
+        future = first_by_hash[entry["content_hash"]] = asyncio.get_running_loop().create_future()
+        try:
+            async with semaphore:
+                document = await process_document(entry["filename"], Path(entry["path"]), entry["content_hash"])
+        except Exception as e:
+            future.set_result(None)
+            finish(i, {"status": "failed", "error": str(e) or type(e).__name__})
+            return
+        except BaseException:
+            future.cancel()
+            raise
+        future.set_result(document)
+        finish(i, {"status": "success", "document": document})
+    
+    if progress:
+        progress(0, len(entries), summary())
+    tasks = [asyncio.ensure_future(run(i, entry)) for i, entry in enumerate(entries)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        discard_batch(entries)
+    return summary()
+
+
 def get_document(doc_id: str) -> dict | None:
     """Get document by ID"""
-    return _documents.get(doc_id)
+    doc = get_store().get(doc_id)
+    if doc:
+        doc["text"] = get_store().get_text(doc_id) or ""
+    return doc
+
+
+def get_document_text(doc_id: str) -> str | None:
+    """Get the full text of a document by ID"""
+    return get_store().get_text(doc_id)
+
+
+def get_document_text_range(doc_id: str, start: int, end: int) -> str:
+    """Get a slice of a document's text by character offsets"""
+    return get_store().get_text_range(doc_id, start, end) or ""
 
 
 def get_all_documents() -> list[dict]:
@@ -80,14 +342,34 @@ def get_all_documents() -> list[dict]:
             "char_count": doc["char_count"],
             "word_count": doc["word_count"]
         }
-        for doc in _documents.values()
+        for doc in get_store().list()
     ]
 
 
-def delete_document(doc_id: str) -> bool:
+def document_key(doc: dict) -> str:
+    """Content identity of a document: its content hash, or its ID if it was stored without one"""
+    return doc.get("content_hash") or f"id:{doc['id']}"
+
+
+def get_documents_by_key(doc_ids: list[str] | None = None) -> dict[str, dict]:
+    """Metadata of the specified documents (or all if none specified) by document_key"""
+    docs = get_store().list()
+    if doc_ids:
+        wanted = set(doc_ids)
+        docs = [doc for doc in docs if doc["id"] in wanted]
+    return {document_key(doc): doc for doc in docs}
+
+
+async def delete_document(doc_id: str) -> bool:
     """Delete document by ID"""
-    if doc_id in _documents:
-        doc = _documents.pop(doc_id)
+    doc = get_store().delete(doc_id)
+    if doc:
+        passage_index.remove_index(doc_id)
+        evidence_grounding.remove_index(doc_id)
+        await vector_index.remove_document(doc_id)
+        answer_cache.forget_document(document_key(doc))
+        knowledge_graph.remove_document(doc_id)
+        context_builder.forget(doc_id)
         # Delete file
         try:
             Path(doc["path"]).unlink()
@@ -97,18 +379,48 @@ def delete_document(doc_id: str) -> bool:
     return False
 
 
-def get_combined_text(doc_ids: list[str] | None = None) -> str:
-    """Get combined text from specified documents (or all if none specified)"""
-    if doc_ids:
-        docs = [_documents.get(doc_id) for doc_id in doc_ids if doc_id in _documents]
-    else:
-        docs = list(_documents.values())
-    
-    if not docs:
-        return ""
-    
-    parts = []
-    for doc in docs:
-        parts.append(f"=== Document: {doc['filename']} ===\n{doc['text']}")
+async def ensure_indexed(doc_ids: list[str]):
+    """Build passage indexes for documents stored by another worker or before a restart"""
+    for doc_id in doc_ids:
+        if passage_index.get_index(doc_id) is None:
+            text = get_store().get_text(doc_id)
+            if text is not None:
+                passage_index.add_index(doc_id, await asyncio.to_thread(passage_index.PassageIndex, text))
+
+
+async def ensure_embedded(doc_ids: list[str]):
+    """Embed the passages of documents that were uploaded before, or whose embedding failed.
+
+    At most EMBEDDING_BACKFILL_DOCUMENTS are embedded per call, so one
+    search never waits on the whole backlog; failures are logged and left
+    for the next call.
+    """
+    index = vector_index.get_index()
+    if index is None:
+        return
+    embedded = await asyncio.to_thread(index.documents)
+    missing = [doc_id for doc_id in doc_ids if doc_id not in embedded]
+    for doc_id in missing[:EMBEDDING_BACKFILL_DOCUMENTS]:
+        text = get_store().get_text(doc_id)
+        if text is None:
+            continue
+        try:
+            await ensure_indexed([doc_id])
+            passages = passage_index.get_index(doc_id)
+            await vector_index.index_document(doc_id, text, list(zip(passages.starts, passages.ends)))
+        except Exception:
+            logger.warning("Embedding passages of %s failed", doc_id, exc_info=True, extra={"doc_id": doc_id})
+
+
+def get_document_texts(doc_ids: list[str] | None = None) -> dict[str, str]:
+    """Texts of the specified documents (or all if none specified) by document ID"""
+    store = get_store()
+    if not doc_ids:
+        doc_ids = [doc["id"] for doc in store.list()]
     
-    return "\n\n".join(parts)
+    texts = {}
+    for doc_id in doc_ids:
+        text = store.get_text(doc_id)
+        if text:
+            texts[doc_id] = text
+    return texts
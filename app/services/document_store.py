@@ -0,0 +1,307 @@
+"""Document storage backends"""
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from app.config import DOCUMENT_STORE_BACKEND, DOCUMENT_DB_PATH
+
+# Metadata columns returned by get/list (everything except the text)
+METADATA_FIELDS = ("id", "filename", "path", "content_hash", "char_count", "word_count", "created_at")
+
+# Background job fields; params and result are JSON-serializable,
+# and worker identifies the process running the job ("host:pid")
+JOB_FIELDS = ("id", "kind", "status", "params", "done", "total", "result", "error", "worker", "created_at", "updated_at")
+
+
+class DocumentStore(ABC):
+    """Interface for document storage backends.
+
+    Backends keep document metadata and text; text is only loaded through
+    get_text so that listing and lookups stay cheap.
+    """
+
+    @abstractmethod
+    def add(self, doc: dict):
+        """Store a document (metadata fields plus "text")"""
+
+    @abstractmethod
+    def get(self, doc_id: str) -> dict | None:
+        """Get document metadata by ID"""
+
+    @abstractmethod
+    def get_text(self, doc_id: str) -> str | None:
+        """Get the full text of a document"""
+
+    @abstractmethod
+    def get_text_range(self, doc_id: str, start: int, end: int) -> str | None:
+        """Get characters [start, end) of a document's text without loading all of it"""
+
+    @abstractmethod
+    def list(self) -> list[dict]:
+        """Metadata of all documents in upload order"""
+
+    @abstractmethod
+    def find_by_hash(self, content_hash: str) -> dict | None:
+        """Metadata of a document whose file has the given SHA-256"""
+
+    @abstractmethod
+    def delete(self, doc_id: str) -> dict | None:
+        """Delete a document, returning its metadata if it existed"""
+
+    @abstractmethod
+    def save_job(self, job: dict):
+        """Insert or replace a background job record"""
+
+    @abstractmethod
+    def update_job(self, job_id: str, **fields):
+        """Update fields of a background job record"""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> dict | None:
+        """Get a background job record by ID"""
+
+    @abstractmethod
+    def list_jobs(self, statuses: tuple[str, ...]) -> list[dict]:
+        """Background job records in any of these states, oldest first"""
+
+    @abstractmethod
+    def claim_job(self, job_id: str, from_status: str, to_status: str, worker: str) -> bool:
+        """Atomically move a job from one state to another for a worker; False if it was not in from_status"""
+
+
+class MemoryDocumentStore(DocumentStore):
+    """Process-local store; contents are lost on restart"""
+
+    def __init__(self):
+        self._docs: dict[str, dict] = {}
+        self._jobs: dict[str, dict] = {}
+
+    def add(self, doc: dict):
+        self._docs[doc["id"]] = {"created_at": time.time(), "content_hash": None, **doc}
+
+    def get(self, doc_id: str) -> dict | None:
+        doc = self._docs.get(doc_id)
+        return {k: doc[k] for k in METADATA_FIELDS} if doc else None
+
+    def get_text(self, doc_id: str) -> str | None:
+        doc = self._docs.get(doc_id)
+        return doc["text"] if doc else None
+
+    def get_text_range(self, doc_id: str, start: int, end: int) -> str | None:
+        doc = self._docs.get(doc_id)
+        return doc["text"][start:end] if doc else None
+
+    def list(self) -> list[dict]:
+        return [{k: doc[k] for k in METADATA_FIELDS} for doc in self._docs.values()]
+
+    def find_by_hash(self, content_hash: str) -> dict | None:
+        for doc in self._docs.values():
+            if doc["content_hash"] == content_hash:
+                return {k: doc[k] for k in METADATA_FIELDS}
+        return None
+
+    def delete(self, doc_id: str) -> dict | None:
+        doc = self._docs.pop(doc_id, None)
+        return {k: doc[k] for k in METADATA_FIELDS} if doc else None
+
+    def save_job(self, job: dict):
+        self._jobs[job["id"]] = dict(job)
+
+    def update_job(self, job_id: str, **fields):
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get_job(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def list_jobs(self, statuses: tuple[str, ...]) -> list[dict]:
+        jobs = [dict(job) for job in self._jobs.values() if job["status"] in statuses]
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    def claim_job(self, job_id: str, from_status: str, to_status: str, worker: str) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job["status"] != from_status:
+            return False
+        job.update(status=to_status, worker=worker, updated_at=time.time())
+        return True
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """SQLite-backed store shared by all worker processes.
+
+    Metadata and text live in separate tables so that listing documents
+    never pages text in; WAL mode lets several uvicorn workers read while
+    one writes.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    content_hash TEXT,
+                    char_count INTEGER NOT NULL,
+                    word_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS document_texts (
+                    id TEXT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+                    text TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+            # Databases created before content hashes were stored
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(content_hash)")
+            # Databases created before jobs recorded their worker process
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "worker" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Per-thread connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def add(self, doc: dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO documents (id, filename, path, content_hash, char_count, word_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc["id"], doc["filename"], doc["path"], doc.get("content_hash"), doc["char_count"],
+                 doc["word_count"], doc.get("created_at", time.time()))
+            )
+            conn.execute("INSERT INTO document_texts (id, text) VALUES (?, ?)", (doc["id"], doc["text"]))
+
+    def get(self, doc_id: str) -> dict | None:
+        row = self._connect().execute(
+            f"SELECT {', '.join(METADATA_FIELDS)} FROM documents WHERE id = ?", (doc_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_text(self, doc_id: str) -> str | None:
+        row = self._connect().execute("SELECT text FROM document_texts WHERE id = ?", (doc_id,)).fetchone()
+        return row["text"] if row else None
+
+    def get_text_range(self, doc_id: str, start: int, end: int) -> str | None:
+        row = self._connect().execute(
+            "SELECT substr(text, ?, ?) AS text FROM document_texts WHERE id = ?", (start + 1, end - start, doc_id)
+        ).fetchone()
+        return row["text"] if row else None
+
+    def list(self) -> list[dict]:
+        rows = self._connect().execute(
+            f"SELECT {', '.join(METADATA_FIELDS)} FROM documents ORDER BY created_at, rowid"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_by_hash(self, content_hash: str) -> dict | None:
+        row = self._connect().execute(
+            f"SELECT {', '.join(METADATA_FIELDS)} FROM documents WHERE content_hash = ? "
+            "ORDER BY created_at LIMIT 1", (content_hash,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, doc_id: str) -> dict | None:
+        doc = self.get(doc_id)
+        if doc:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return doc
+
+    def save_job(self, job: dict):
+        row = {k: job.get(k) for k in JOB_FIELDS}
+        row["params"] = json.dumps(row["params"] or {})
+        row["result"] = json.dumps(row["result"]) if row["result"] is not None else None
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(JOB_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                [row[k] for k in JOB_FIELDS]
+            )
+
+    def update_job(self, job_id: str, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                [*fields.values(), job_id]
+            )
+
+    def get_job(self, job_id: str) -> dict | None:
+        row = self._connect().execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return self._job(row)
+
+    def list_jobs(self, statuses: tuple[str, ...]) -> list[dict]:
+        rows = self._connect().execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status IN ({', '.join('?' for _ in statuses)}) "
+            "ORDER BY created_at", statuses
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def claim_job(self, job_id: str, from_status: str, to_status: str, worker: str) -> bool:
+        with self._connect() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (to_status, worker, time.time(), job_id, from_status)
+            ).rowcount
+        return claimed == 1
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+_store: DocumentStore | None = None
+
+
+def get_store() -> DocumentStore:
+    """Get the configured document store"""
+    global _store
+    if _store is None:
+        if DOCUMENT_STORE_BACKEND == "sqlite":
+            _store = SQLiteDocumentStore(DOCUMENT_DB_PATH)
+        elif DOCUMENT_STORE_BACKEND == "memory":
+            _store = MemoryDocumentStore()
+        else:
+            raise ValueError(f"Unknown document store backend: {DOCUMENT_STORE_BACKEND}")
+    return _store
@@ -0,0 +1,232 @@
+"""Locate the evidence quotes of extracted relations in their source documents.
+
+Each document gets an index of its text reduced to lowercase letters and
+digits (case folding also expands ligatures), with the original offset of
+every token, so quotes match across whitespace, line breaks, hyphenation
+and punctuation differences. A quote is found by exact search in the
+reduced text; failing that, its character n-grams vote for the region they
+occur in, and the quote counts as found when at least EVIDENCE_MIN_MATCH of
+them agree. Quotes elided with "..." are matched piece by piece.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from app.config import EVIDENCE_MIN_MATCH, EVIDENCE_INDEX_DOCUMENTS
+from app.services import text_preprocessor
+from app.services.document_store import get_store
+from app.utils import metrics
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+ELLIPSIS_PATTERN = re.compile(r"\[?(?:\.\s*){3,}\]?|…")
+
+# Approximate matching: n-gram length, occurrences of one n-gram considered
+# (common ones say little about where a quote is), and how far n-grams of one
+# match may stray from where the quote would put them, as a fraction of its length
+GRAM = 10
+MAX_OCCURRENCES = 50
+DRIFT = 0.25
+
+# Elided pieces shorter than this (reduced characters) are too ambiguous to place
+MIN_FRAGMENT = 3
+
+# Relations by outcome: exact (whole quote found), approximate, not_found,
+# or no_evidence (no quote given)
+GROUNDING_RESULTS = metrics.Counter(
+    "biobuilder_evidence_grounding_total",
+    "Extracted relations by evidence grounding outcome",
+    ("outcome",)
+)
+
+
+def normalize(text: str) -> str:
+    """Lowercase letters and digits of text, everything else dropped"""
+    return "".join(token.casefold() for token in TOKEN_PATTERN.findall(text))
+
+
+class EvidenceIndex:
+    """Reduced text of one document with token offsets back into the original.
+
+    norm_starts holds where each token starts in the reduced text and
+    text_starts/text_ends its span in the document; page_starts are the
+    document offsets of its pages, when known.
+    """
+    __slots__ = ("normalized", "norm_starts", "text_starts", "text_ends", "page_starts", "text_length")
+
+    def __init__(self, text: str, page_starts: list[int] | None = None):
+        self.norm_starts = array("I")
+        self.text_starts = array("I")
+        self.text_ends = array("I")
+        tokens = []
+        length = 0
+        for match in TOKEN_PATTERN.finditer(text):
+            token = match.group().casefold()
+            self.norm_starts.append(length)
+            self.text_starts.append(match.start())
+            self.text_ends.append(match.end())
+            tokens.append(token)
+            length += len(token)
+        self.normalized = "".join(tokens)
+        self.page_starts = page_starts or None
+        self.text_length = len(text)
+
+    def to_text(self, start: int, end: int) -> tuple[int, int]:
+        """Document offsets of a span of the reduced text"""
+        first = bisect_right(self.norm_starts, start) - 1
+        last = bisect_right(self.norm_starts, end - 1) - 1
+        # Folding may lengthen a token (ligatures), so offsets within it are clamped
+        text_start = min(self.text_starts[first] + start - self.norm_starts[first], self.text_ends[first] - 1)
+        text_end = min(self.text_starts[last] + end - self.norm_starts[last], self.text_ends[last])
+        return text_start, text_end
+
+    def page(self, offset: int) -> int | None:
+        """1-based page of a document offset, if page boundaries are known"""
+        if not self.page_starts:
+            return None
+        return max(bisect_right(self.page_starts, offset), 1)
+
+    def _approximate(self, fragment: str) -> tuple[int, int, float] | None:
+        """Region of the reduced text holding the most n-grams of fragment, with their fraction"""
+        offsets = range(0, len(fragment) - GRAM + 1, GRAM)
+        if len(offsets) < 2:
+            return None
+        hits = []
+        for piece_id, offset in enumerate(offsets):
+            piece = fragment[offset:offset + GRAM]
+            position = self.normalized.find(piece)
+            occurrences = 0
+            while position != -1 and occurrences < MAX_OCCURRENCES:
+                hits.append((position - offset, position, piece_id))
+                occurrences += 1
+                position = self.normalized.find(piece, position + 1)
+        if not hits:
+            return None
+
+        # Slide a window over the implied quote starts, counting distinct n-grams
+        hits.sort()
+        drift = int(len(fragment) * DRIFT) + GRAM
+        pieces: Counter = Counter()
+        best = (0, 0, 0)
+        low = 0
+        for high, (implied, _, piece_id) in enumerate(hits):
+            pieces[piece_id] += 1
+            while implied - hits[low][0] > drift:
+                pieces[hits[low][2]] -= 1
+                if not pieces[hits[low][2]]:
+                    del pieces[hits[low][2]]
+                low += 1
+            if len(pieces) > best[0]:
+                best = (len(pieces), low, high)
+        count, low, high = best
+        positions = [position for _, position, _ in hits[low:high + 1]]
+        return min(positions), max(positions) + GRAM, count / len(offsets)
+
+    def locate(self, quote: str) -> dict | None:
+        """Document span of a quote as {"start", "end", "page", "score"}, or None if not found"""
+        fragments = [f for f in (normalize(part) for part in ELLIPSIS_PATTERN.split(quote)) if len(f) >= MIN_FRAGMENT]
+        if not fragments:
+            return None
+        spans = []
+        matched = 0.0
+        position = 0
+        for fragment in fragments:
+            # Elided pieces are looked for after the previous one first
+            start = self.normalized.find(fragment, position)
+            if start == -1:
+                start = self.normalized.find(fragment)
+            if start != -1:
+                span = (start, start + len(fragment), 1.0)
+            else:
+                span = self._approximate(fragment)
+            if span is None:
+                continue
+            spans.append(span)
+            matched += span[2] * len(fragment)
+            position = span[1]
+        score = matched / sum(len(f) for f in fragments)
+        if not spans or score < EVIDENCE_MIN_MATCH:
+            return None
+
+        start, end = min(s[0] for s in spans), max(s[1] for s in spans)
+        if end - start > 4 * sum(len(f) for f in fragments):
+            # Pieces scattered over the document: keep the best-matched one
+            start, end, _ = max(spans, key=lambda s: (s[2], s[1] - s[0]))
+        text_start, text_end = self.to_text(start, end)
+        return {"start": text_start, "end": text_end, "page": self.page(text_start), "score": round(score, 3)}
+
+
+# Indexes by document ID, least recently used first
+_indexes: OrderedDict[str, EvidenceIndex] = OrderedDict()
+
+
+def add_index(doc_id: str, index: EvidenceIndex) -> EvidenceIndex:
+    """Register the evidence index of a document, evicting least recently used ones"""
+    _indexes[doc_id] = index
+    _indexes.move_to_end(doc_id)
+    while len(_indexes) > EVIDENCE_INDEX_DOCUMENTS:
+        _indexes.popitem(last=False)
+    return index
+
+
+def build_index(doc_id: str, text: str, page_starts: list[int] | None = None) -> EvidenceIndex:
+    """Build and register the evidence index of a document"""
+    return add_index(doc_id, EvidenceIndex(text, page_starts))
+
+
+def remove_index(doc_id: str):
+    """Drop the evidence index of a document"""
+    _indexes.pop(doc_id, None)
+
+
+def _page_starts(doc_id: str, text: str) -> list[int] | None:
+    """Page boundaries of a stored document, from its cached preprocessing result"""
+    doc = get_store().get(doc_id)
+    if not doc or not doc.get("content_hash"):
+        return None
+    cached = text_preprocessor.load_cached(doc["content_hash"])
+    # Documents stored before preprocessing have other offsets
+    if cached is None or len(cached["text"]) != len(text):
+        return None
+    return cached["page_starts"]
+
+
+def get_index(doc_id: str | None, text: str) -> EvidenceIndex:
+    """The evidence index of a document, built if not in memory (and not kept when doc_id is None)"""
+    if doc_id is None:
+        return EvidenceIndex(text)
+    index = _indexes.get(doc_id)
+    if index is None or index.text_length != len(text):
+        return build_index(doc_id, text, _page_starts(doc_id, text))
+    _indexes.move_to_end(doc_id)
+    return index
+
+
+def ground_relations(doc_id: str | None, text: str, relations: list) -> list:
+    """Copies of relations with the location of their evidence in the document.
+
+    Each relation gets "grounded" and "evidence_span" ({"doc_id", "start",
+    "end", "page", "score"}, or None when the evidence quote is missing or
+    was not found in the text). doc_id is None for text that is not a
+    stored document.
+    """
+    index = None
+    grounded = []
+    for relation in relations:
+        if not isinstance(relation, dict):
+            grounded.append(relation)
+            continue
+        evidence = relation.get("evidence")
+        span = None
+        if evidence and isinstance(evidence, str):
+            index = index or get_index(doc_id, text)
+            span = index.locate(evidence)
+            if span is None:
+                outcome = "not_found"
+            else:
+                outcome = "exact" if span["score"] == 1.0 else "approximate"
+                span = {"doc_id": doc_id, **span}
+        else:
+            outcome = "no_evidence"
+        GROUNDING_RESULTS.inc(outcome=outcome)
+        grounded.append({**relation, "grounded": span is not None, "evidence_span": span})
+    return grounded
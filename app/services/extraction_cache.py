@@ -0,0 +1,180 @@
+"""Content-addressed cache of per-chunk extraction results"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.config import (
+    DEFAULT_MODEL,
+    EXTRACTION_CACHE_DB_PATH,
+    EXTRACTION_CACHE_MEMORY_ENTRIES,
+    EXTRACTION_CACHE_DISK_BYTES,
+)
+from app.utils import metrics
+from app.utils.prompts import EXTRACTION_PROMPT_VERSION
+
+# Memory tier: most recently used entries last
+_memory: OrderedDict[str, dict] = OrderedDict()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+# Disk hits whose access time is not yet written, by key
+_touched: dict[str, float] = {}
+_local = threading.local()
+
+
+def cache_key(text: str, model: str | None, target_genes: list[str] | None, target_relations: list[str] | None) -> str:
+    """Hash of everything that determines the extraction result of a chunk"""
+    payload = json.dumps([
+        EXTRACTION_PROMPT_VERSION,
+        model or DEFAULT_MODEL,
+        sorted(g.strip().lower() for g in target_genes or []),
+        sorted(r.strip().lower() for r in target_relations or []),
+        text
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread connection to the disk tier.
+
+    Entry sizes and access times live apart from the results so eviction
+    scans stay small, and the totals row keeps the tier's size without a
+    full scan.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(EXTRACTION_CACHE_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            -- Single-table layout of earlier versions
+            DROP TABLE IF EXISTS extraction_cache;
+            CREATE TABLE IF NOT EXISTS extraction_results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS extraction_entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_extraction_entries_access ON extraction_entries(last_access);
+            CREATE TABLE IF NOT EXISTS extraction_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO extraction_totals (id, entries, bytes) VALUES (0, 0, 0);
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _remember(key: str, result: dict):
+    """Put an entry in the memory tier, evicting least recently used entries"""
+    _memory[key] = result
+    _memory.move_to_end(key)
+    while len(_memory) > EXTRACTION_CACHE_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def _load(key: str) -> dict | None:
+    """Read a result from the disk tier"""
+    row = _connect().execute("SELECT value FROM extraction_results WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _store(key: str, result: dict, touched: list[tuple[float, str]]) -> int:
+    """Write a result to the disk tier along with pending access times; returns the number of entries evicted"""
+    value = json.dumps(result)
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO extraction_results (key, value) VALUES (?, ?)", (key, value))
+        conn.executemany("UPDATE extraction_entries SET last_access = ? WHERE key = ?", touched)
+        old = conn.execute("SELECT size FROM extraction_entries WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO extraction_entries (key, size, last_access) VALUES (?, ?, ?)",
+            (key, len(value), time.time())
+        )
+        conn.execute(
+            "UPDATE extraction_totals SET entries = entries + ?, bytes = bytes + ? WHERE id = 0",
+            (0 if old else 1, len(value) - (old[0] if old else 0))
+        )
+        total = conn.execute("SELECT bytes FROM extraction_totals WHERE id = 0").fetchone()[0]
+        if total <= EXTRACTION_CACHE_DISK_BYTES:
+            return 0
+        # Drop least recently used entries down to 90% of the limit
+        excess = total - int(EXTRACTION_CACHE_DISK_BYTES * 0.9)
+        freed = 0
+        stale = []
+        for old_key, size in conn.execute("SELECT key, size FROM extraction_entries ORDER BY last_access"):
+            if freed >= excess:
+                break
+            stale.append((old_key,))
+            freed += size
+        conn.executemany("DELETE FROM extraction_results WHERE key = ?", stale)
+        conn.executemany("DELETE FROM extraction_entries WHERE key = ?", stale)
+        conn.execute(
+            "UPDATE extraction_totals SET entries = entries - ?, bytes = bytes - ? WHERE id = 0",
+            (len(stale), freed)
+        )
+    return len(stale)
+
+
+async def get(key: str) -> dict | None:
+    """Look up a cached chunk result (memory first, then disk)"""
+    if key in _memory:
+        _memory.move_to_end(key)
+        _stats["memory_hits"] += 1
+        metrics.cache_lookup("extraction", True)
+        return _memory[key]
+
+    result = await asyncio.to_thread(_load, key)
+    if result is None:
+        _stats["misses"] += 1
+        metrics.cache_lookup("extraction", False)
+        return None
+
+    # Access times are written with the next store rather than on every hit
+    _touched[key] = time.time()
+    _remember(key, result)
+    _stats["disk_hits"] += 1
+    metrics.cache_lookup("extraction", True)
+    return result
+
+
+async def put(key: str, result: dict):
+    """Store a chunk result in both tiers, evicting old disk entries over the size limit"""
+    _remember(key, result)
+    touched = [(accessed, touched_key) for touched_key, accessed in _touched.items()]
+    _touched.clear()
+    _stats["evictions"] += await asyncio.to_thread(_store, key, result, touched)
+    _stats["stores"] += 1
+
+
+def get_stats() -> dict:
+    """Hit/miss counters and tier sizes"""
+    lookups = _stats["memory_hits"] + _stats["disk_hits"] + _stats["misses"]
+    entries, size = _connect().execute("SELECT entries, bytes FROM extraction_totals WHERE id = 0").fetchone()
+    return {
+        **_stats,
+        "hit_rate": round((lookups - _stats["misses"]) / lookups, 4) if lookups else 0.0,
+        "memory_entries": len(_memory),
+        "disk_entries": entries,
+        "disk_bytes": size
+    }
+
+
+def _clear_disk():
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM extraction_results")
+        conn.execute("DELETE FROM extraction_entries")
+        conn.execute("UPDATE extraction_totals SET entries = 0, bytes = 0 WHERE id = 0")
+
+
+async def clear():
+    """Remove all cached results"""
+    _memory.clear()
+    _touched.clear()
+    await asyncio.to_thread(_clear_disk)
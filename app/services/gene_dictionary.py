@@ -0,0 +1,178 @@
+"""Gene/protein alias dictionary and target-driven text pre-filtering"""
+import csv
+import logging
+import re
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from app.config import GENE_ALIAS_PATH, PREFILTER_CONTEXT_SENTENCES
+
+# Document headers, then sentences ending at terminal punctuation or a paragraph break
+SENTENCE_PATTERN = re.compile(r"=== Document:[^\n]*\n|.*?(?:[.!?](?=\s|$)|\n\s*\n|$)", re.DOTALL)
+
+# Columns holding alternative names in an HGNC-style TSV; multiple names in
+# one cell are separated by "|" or ","
+ALIAS_COLUMNS = ("alias_symbol", "prev_symbol", "alias_name", "aliases")
+
+# Terms this short are matched case-sensitively (e.g. "CAT" the gene, not "cat")
+CASE_SENSITIVE_MAX_LENGTH = 3
+
+_aliases: dict[str, set[str]] | None = None
+
+logger = logging.getLogger(__name__)
+
+
+def load_dictionary(path: Path = GENE_ALIAS_PATH) -> dict[str, set[str]]:
+    """Load a symbol/alias TSV into a map from lowercased name to all names of that gene.
+
+    The file needs a "symbol" column; alias columns are optional. A missing
+    file gives an empty dictionary, in which case targets match only by
+    their own names.
+    """
+    aliases: dict[str, set[str]] = {}
+    path = Path(path)
+    if not path.exists():
+        logger.info("Gene alias dictionary not found at %s; matching target names only", path)
+        return aliases
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            symbol = (row.get("symbol") or "").strip()
+            if not symbol:
+                continue
+            names = {symbol}
+            for column in ALIAS_COLUMNS:
+                for name in re.split(r"[|,]", row.get(column) or ""):
+                    name = name.strip().strip('"')
+                    if name:
+                        names.add(name)
+            for name in names:
+                aliases.setdefault(name.lower(), set()).update(names)
+    return aliases
+
+
+def get_dictionary() -> dict[str, set[str]]:
+    """Alias dictionary, loaded on first use"""
+    global _aliases
+    if _aliases is None:
+        _aliases = load_dictionary()
+    return _aliases
+
+
+def expand_targets(targets: list[str]) -> set[str]:
+    """Target names plus every alias the dictionary knows for them"""
+    dictionary = get_dictionary()
+    names = set()
+    for target in targets:
+        target = target.strip()
+        if target:
+            names.add(target)
+            names.update(dictionary.get(target.lower(), ()))
+    return names
+
+
+class AhoCorasick:
+    """Multi-pattern matcher finding all whole-word occurrences of a set of terms in one pass"""
+
+    def __init__(self, terms: set[str]):
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.output: list[list[str]] = [[]]
+        # Original spellings of case-sensitive (short) terms by lowercased form
+        self.exact: dict[str, set[str]] = {}
+
+        for term in terms:
+            key = term.lower()
+            if len(term) <= CASE_SENSITIVE_MAX_LENGTH:
+                self.exact.setdefault(key, set()).add(term)
+            state = 0
+            for char in key:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            if key not in self.output[state]:
+                self.output[state].append(key)
+
+        # Breadth-first construction of failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        """All (start, end, term) whole-word matches in text"""
+        matches = []
+        state = 0
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Keep offsets aligned when lowercasing changes the length of a character
+            lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        for i, char in enumerate(lowered):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for key in self.output[state]:
+                start, end = i + 1 - len(key), i + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end < len(text) and text[end].isalnum():
+                    continue
+                if key in self.exact and text[start:end] not in self.exact[key]:
+                    continue
+                matches.append((start, end, key))
+        return matches
+
+
+@lru_cache(maxsize=64)
+def _matcher(targets: frozenset[str]) -> AhoCorasick:
+    return AhoCorasick(expand_targets(sorted(targets)))
+
+
+def filter_text(text: str, targets: list[str], context: int = PREFILTER_CONTEXT_SENTENCES) -> str:
+    """Keep only the sentences mentioning a target (or alias), with neighbouring sentences.
+
+    Non-adjacent excerpts are separated by "[...]"; "=== Document: ..."
+    headers are kept so the LLM still knows where excerpts come from.
+    """
+    matcher = _matcher(frozenset(targets))
+    spans = [(m.start(), m.end()) for m in SENTENCE_PATTERN.finditer(text) if m.end() > m.start()]
+    if not spans:
+        return ""
+
+    # Mark sentences containing a match
+    starts = [start for start, _ in spans]
+    hit = [False] * len(spans)
+    for start, _, _ in matcher.find(text):
+        hit[bisect_right(starts, start) - 1] = True
+    if not any(hit):
+        return ""
+
+    keep = [False] * len(spans)
+    for i, is_hit in enumerate(hit):
+        if is_hit:
+            for j in range(max(0, i - context), min(len(spans), i + context + 1)):
+                keep[j] = True
+    for i, (start, end) in enumerate(spans):
+        if text.startswith("=== Document:", start):
+            keep[i] = True
+
+    parts = []
+    previous = -1
+    for i, (start, end) in enumerate(spans):
+        if not keep[i]:
+            continue
+        if parts and previous != i - 1:
+            parts.append(" [...]\n")
+        parts.append(text[start:end])
+        previous = i
+    return "".join(parts).strip()
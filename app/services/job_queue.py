@@ -0,0 +1,238 @@
+"""Background job queue for long-running work such as extraction"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable
+from app.config import JOB_WORKERS, JOB_QUEUE_MAX_DEPTH
+from app.services.document_store import get_store
+from app.utils import logs, metrics
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# A runner receives the job params and a progress(done, total[, result])
+# callback and returns the JSON-serializable job result; result, if given,
+# is a partial result visible while the job runs
+Runner = Callable[[dict, Callable[..., None]], Awaitable[dict]]
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at JOB_QUEUE_MAX_DEPTH"""
+
+
+class JobCancelledError(Exception):
+    """Raised inside a job whose cancellation was requested by another worker process"""
+
+
+_runners: dict[str, Runner] = {}
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_running: dict[str, asyncio.Task] = {}
+_cancel_requested: set[str] = set()
+_done_events: dict[str, asyncio.Event] = {}
+
+# Recorded on the jobs this process runs, so others can tell when it is gone
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def register(kind: str, runner: Runner):
+    """Register the coroutine that runs jobs of a given kind"""
+    _runners[kind] = runner
+
+
+def _ensure_workers():
+    """Start the worker tasks on first use, picking up jobs left behind by exited processes"""
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=JOB_QUEUE_MAX_DEPTH)
+    if not _workers:
+        _recover()
+        for _ in range(JOB_WORKERS):
+            _workers.append(asyncio.create_task(_worker()))
+
+
+def start():
+    """Start the workers (at application startup, so persisted jobs resume without a new submission)"""
+    _ensure_workers()
+
+
+def is_orphaned(job: dict) -> bool:
+    """Whether a running job's worker process no longer exists"""
+    if job["status"] != RUNNING:
+        return False
+    if not job.get("worker"):
+        # Started before jobs recorded their worker
+        return True
+    host, _, pid = job["worker"].rpartition(":")
+    if job["worker"] == WORKER_ID:
+        return job["id"] not in _running
+    if host != socket.gethostname():
+        # Processes on other hosts can't be checked
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, ValueError):
+        pass
+    return False
+
+
+def fail_orphaned(job_id: str) -> bool:
+    """Mark a running job whose worker process exited as failed; False if it wasn't orphaned"""
+    job = get_store().get_job(job_id)
+    if not job or not is_orphaned(job):
+        return False
+    if not get_store().claim_job(job_id, RUNNING, FAILED, job["worker"] or ""):
+        return False
+    get_store().update_job(job_id, error="Interrupted: the worker process running it exited")
+    logger.warning("Failed %s job %s left running by %s", job["kind"], job_id, job["worker"], extra={"job_id": job_id})
+    return True
+
+
+def _recover():
+    """Fail jobs whose worker process exited while running them, and queue persisted queued jobs"""
+    store = get_store()
+    requeued = 0
+    for job in store.list_jobs((RUNNING, QUEUED)):
+        if job["status"] == RUNNING:
+            fail_orphaned(job["id"])
+        elif job["kind"] in _runners and not _queue.full():
+            # Other live processes may queue the same job; whoever claims it first runs it
+            _queue.put_nowait(job["id"])
+            requeued += 1
+    if requeued:
+        logger.info("Re-queued %d persisted jobs", requeued)
+
+
+async def shutdown():
+    """Cancel running jobs and stop the workers"""
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+
+
+def submit(kind: str, params: dict) -> dict:
+    """Queue a job and return its record.
+
+    Raises QueueFullError when JOB_QUEUE_MAX_DEPTH jobs are already waiting.
+    """
+    if kind not in _runners:
+        raise ValueError(f"Unknown job kind: {kind}")
+    _ensure_workers()
+    if _queue.full():
+        raise QueueFullError("Too many queued jobs, try again later")
+
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "kind": kind,
+        "status": QUEUED,
+        "params": params,
+        "done": 0,
+        "total": 0,
+        "result": None,
+        "error": None,
+        "worker": None,
+        "created_at": now,
+        "updated_at": now
+    }
+    get_store().save_job(job)
+    logger.info("Queued %s job %s", kind, job["id"], extra={"job_id": job["id"]})
+    _done_events[job["id"]] = asyncio.Event()
+    _queue.put_nowait(job["id"])
+    return job
+
+
+def get_job(job_id: str) -> dict | None:
+    """Get a job record (from any worker process)"""
+    return get_store().get_job(job_id)
+
+
+def cancel(job_id: str) -> bool:
+    """Cancel a queued or running job; returns False if it already finished"""
+    job = get_store().get_job(job_id)
+    if not job or job["status"] in TERMINAL_STATES:
+        return False
+    get_store().update_job(job_id, status=CANCELLED)
+    task = _running.get(job_id)
+    if task:
+        _cancel_requested.add(job_id)
+        task.cancel()
+    return True
+
+
+async def wait(job_id: str, timeout: float | None = None) -> dict | None:
+    """Wait for a job submitted by this process to finish and return its record"""
+    event = _done_events.get(job_id)
+    if event:
+        await asyncio.wait_for(event.wait(), timeout)
+    return get_store().get_job(job_id)
+
+
+def get_stats() -> dict:
+    """Queue depth and worker utilisation of this process"""
+    return {
+        "queued": _queue.qsize() if _queue else 0,
+        "running": len(_running),
+        "workers": JOB_WORKERS,
+        "max_queue_depth": JOB_QUEUE_MAX_DEPTH
+    }
+
+
+async def _worker():
+    """Take jobs off the queue and run them one at a time"""
+    store = get_store()
+    while True:
+        job_id = await _queue.get()
+        try:
+            if not store.claim_job(job_id, QUEUED, RUNNING, WORKER_ID):
+                continue
+            job = store.get_job(job_id)
+            # Records logged while the job runs carry its ID
+            logs.request_id.set(f"job-{job_id}")
+            metrics.STAGE_SECONDS.observe(max(0.0, time.time() - job["created_at"]), stage="job_queue")
+            _running[job_id] = asyncio.current_task()
+
+            def progress(done: int, total: int, result: dict | None = None):
+                # Cancellation may have been requested through another worker process
+                if store.get_job(job_id)["status"] == CANCELLED:
+                    raise JobCancelledError()
+                if result is None:
+                    store.update_job(job_id, done=done, total=total)
+                else:
+                    store.update_job(job_id, done=done, total=total, result=result)
+
+            try:
+                result = await _runners[job["kind"]](job["params"], progress)
+                store.update_job(job_id, status=COMPLETED, result=result)
+            except JobCancelledError:
+                store.update_job(job_id, status=CANCELLED)
+            except asyncio.CancelledError:
+                if job_id not in _cancel_requested:
+                    # The worker itself is shutting down
+                    store.update_job(job_id, status=FAILED, error="Interrupted by server shutdown")
+                    raise
+                asyncio.current_task().uncancel()
+            except Exception as e:
+                store.update_job(job_id, status=FAILED, error=str(e) or type(e).__name__)
+        finally:
+            _running.pop(job_id, None)
+            _cancel_requested.discard(job_id)
+            event = _done_events.pop(job_id, None)
+            if event:
+                event.set()
+            _queue.task_done()
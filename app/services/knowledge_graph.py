@@ -0,0 +1,361 @@
+"""Persistent cross-document knowledge graph of extracted entities and relations"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from app.config import DEFAULT_MODEL, KNOWLEDGE_GRAPH_DB_PATH, KNOWLEDGE_GRAPH_PATH_MAX_NODES
+from app.utils.prompts import EXTRACTION_PROMPT_VERSION
+
+_local = threading.local()
+
+
+def node_key(name) -> str:
+    """Normalized node ID of an entity name (case, spaces, dashes ignored)"""
+    return re.sub(r"[\s\-_]+", "", str(name)).lower()
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread connection"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(KNOWLEDGE_GRAPH_DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS nodes (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS node_aliases (
+                alias TEXT PRIMARY KEY,
+                node_id TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS mentions (
+                node_id TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                description TEXT,
+                PRIMARY KEY (node_id, doc_id)
+            );
+            CREATE TABLE IF NOT EXISTS edges (
+                id INTEGER PRIMARY KEY,
+                source_id TEXT NOT NULL,
+                target_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                model TEXT,
+                description TEXT,
+                evidence TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_edges_source ON edges(source_id, type);
+            CREATE INDEX IF NOT EXISTS idx_edges_target ON edges(target_id, type);
+            CREATE INDEX IF NOT EXISTS idx_edges_type ON edges(type);
+            CREATE INDEX IF NOT EXISTS idx_edges_doc ON edges(doc_id);
+            CREATE INDEX IF NOT EXISTS idx_mentions_doc ON mentions(doc_id);
+            CREATE TABLE IF NOT EXISTS extractions (
+                doc_id TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        _local.conn = conn
+    return conn
+
+
+def resolve(name: str) -> str | None:
+    """Node ID for an entity name or alias, if the graph knows it"""
+    row = _connect().execute("SELECT node_id FROM node_aliases WHERE alias = ?", (node_key(name),)).fetchone()
+    return row["node_id"] if row else None
+
+
+def _ensure_node(conn: sqlite3.Connection, name: str, entity_type: str = "unknown", aliases: list[str] = ()) -> str:
+    """Find or create the node for an entity, registering its aliases"""
+    keys = [k for k in (node_key(n) for n in [name, *aliases]) if k]
+    node_id = None
+    for key in keys:
+        row = conn.execute("SELECT node_id FROM node_aliases WHERE alias = ?", (key,)).fetchone()
+        if row:
+            node_id = row["node_id"]
+            break
+    if node_id is None:
+        node_id = keys[0]
+        conn.execute("INSERT OR IGNORE INTO nodes (id, name, type) VALUES (?, ?, ?)", (node_id, name, entity_type))
+    elif entity_type != "unknown":
+        conn.execute("UPDATE nodes SET type = ? WHERE id = ? AND type = 'unknown'", (entity_type, node_id))
+    conn.executemany(
+        "INSERT OR IGNORE INTO node_aliases (alias, node_id) VALUES (?, ?)",
+        [(key, node_id) for key in keys]
+    )
+    return node_id
+
+
+def add_document(doc_id: str, result: dict, model: str | None = None):
+    """Replace the graph contribution of a document with a new full extraction result"""
+    model = model or DEFAULT_MODEL
+    conn = _connect()
+    now = time.time()
+    with conn:
+        _remove_document(conn, doc_id)
+        conn.execute(
+            "INSERT INTO extractions (doc_id, model, prompt_version, result, created_at) VALUES (?, ?, ?, ?, ?)",
+            (doc_id, model, EXTRACTION_PROMPT_VERSION, json.dumps(result), now)
+        )
+        for entity in result.get("entities", []):
+            if not node_key(entity.get("name", "")):
+                continue
+            node_id = _ensure_node(conn, entity["name"], entity.get("type") or "unknown", entity.get("aliases") or [])
+            conn.execute(
+                "INSERT OR REPLACE INTO mentions (node_id, doc_id, description) VALUES (?, ?, ?)",
+                (node_id, doc_id, entity.get("description", ""))
+            )
+        for relation in result.get("relations", []):
+            if not node_key(relation.get("source", "")) or not node_key(relation.get("target", "")):
+                continue
+            source_id = _ensure_node(conn, relation["source"])
+            target_id = _ensure_node(conn, relation["target"])
+            conn.execute(
+                "INSERT INTO edges (source_id, target_id, type, doc_id, model, description, evidence, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source_id, target_id, str(relation.get("type") or "unknown").lower(), doc_id, model,
+                 relation.get("description", ""), relation.get("evidence", ""), now)
+            )
+
+
+def _remove_document(conn: sqlite3.Connection, doc_id: str):
+    conn.execute("DELETE FROM extractions WHERE doc_id = ?", (doc_id,))
+    conn.execute("DELETE FROM edges WHERE doc_id = ?", (doc_id,))
+    conn.execute("DELETE FROM mentions WHERE doc_id = ?", (doc_id,))
+    # Drop nodes no longer supported by any document
+    orphan_filter = (
+        "NOT EXISTS (SELECT 1 FROM mentions m WHERE m.node_id = {id}) "
+        "AND NOT EXISTS (SELECT 1 FROM edges e WHERE e.source_id = {id} OR e.target_id = {id})"
+    )
+    conn.execute(f"DELETE FROM node_aliases WHERE {orphan_filter.format(id='node_aliases.node_id')}")
+    conn.execute(f"DELETE FROM nodes WHERE {orphan_filter.format(id='nodes.id')}")
+
+
+def remove_document(doc_id: str):
+    """Remove everything a document contributed to the graph"""
+    conn = _connect()
+    with conn:
+        _remove_document(conn, doc_id)
+
+
+def get_extraction(doc_id: str, model: str | None = None) -> dict | None:
+    """Stored full extraction result of a document, if made with this model and the current prompt"""
+    row = _connect().execute(
+        "SELECT result FROM extractions WHERE doc_id = ? AND model = ? AND prompt_version = ?",
+        (doc_id, model or DEFAULT_MODEL, EXTRACTION_PROMPT_VERSION)
+    ).fetchone()
+    if not row:
+        return None
+    result = json.loads(row["result"])
+    # Rows stored before partial results were kept out are not served
+    return None if result.get("parse_error") else result
+
+
+def get_node(node_id: str) -> dict | None:
+    """Node with its aliases and the documents mentioning it"""
+    conn = _connect()
+    row = conn.execute("SELECT id, name, type FROM nodes WHERE id = ?", (node_id,)).fetchone()
+    if not row:
+        return None
+    node = dict(row)
+    node["aliases"] = [r["alias"] for r in conn.execute("SELECT alias FROM node_aliases WHERE node_id = ?", (node_id,))]
+    node["documents"] = sorted({
+        r["doc_id"] for r in conn.execute(
+            "SELECT doc_id FROM mentions WHERE node_id = ? UNION "
+            "SELECT doc_id FROM edges WHERE source_id = ? OR target_id = ?", (node_id, node_id, node_id)
+        )
+    })
+    return node
+
+
+def find_edges(
+    source: str | None = None,
+    target: str | None = None,
+    relation_type: str | None = None,
+    doc_id: str | None = None,
+    limit: int = 500
+) -> list[dict]:
+    """Edges matching all given filters; source/target may be any name or alias"""
+    clauses, params = [], []
+    for column, name in (("source_id", source), ("target_id", target)):
+        if name:
+            node_id = resolve(name)
+            if node_id is None:
+                return []
+            clauses.append(f"e.{column} = ?")
+            params.append(node_id)
+    if relation_type:
+        clauses.append("e.type = ?")
+        params.append(relation_type.lower())
+    if doc_id:
+        clauses.append("e.doc_id = ?")
+        params.append(doc_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _connect().execute(
+        "SELECT e.source_id, s.name AS source, e.target_id, t.name AS target, e.type, e.doc_id, "
+        "e.model, e.description, e.evidence FROM edges e "
+        "JOIN nodes s ON s.id = e.source_id JOIN nodes t ON t.id = e.target_id "
+        f"{where} ORDER BY e.id LIMIT ?",
+        [*params, limit]
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def neighbors(name: str, direction: str = "both", relation_type: str | None = None) -> list[dict]:
+    """Nodes adjacent to an entity, with relation type, direction and supporting documents"""
+    node_id = resolve(name)
+    if node_id is None:
+        return []
+    conn = _connect()
+    type_clause = " AND type = ?" if relation_type else ""
+    type_params = [relation_type.lower()] if relation_type else []
+    queries = []
+    if direction in ("out", "both"):
+        queries.append(("out", f"SELECT target_id AS other, type, doc_id FROM edges WHERE source_id = ?{type_clause}"))
+    if direction in ("in", "both"):
+        queries.append(("in", f"SELECT source_id AS other, type, doc_id FROM edges WHERE target_id = ?{type_clause}"))
+
+    grouped: dict[tuple, set[str]] = {}
+    for edge_direction, query in queries:
+        for row in conn.execute(query, [node_id, *type_params]):
+            grouped.setdefault((row["other"], row["type"], edge_direction), set()).add(row["doc_id"])
+
+    names = {}
+    result = []
+    for (other, edge_type, edge_direction), docs in grouped.items():
+        if other not in names:
+            row = conn.execute("SELECT name, type FROM nodes WHERE id = ?", (other,)).fetchone()
+            names[other] = (row["name"], row["type"]) if row else (other, "unknown")
+        result.append({
+            "id": other,
+            "name": names[other][0],
+            "entity_type": names[other][1],
+            "relation": edge_type,
+            "direction": edge_direction,
+            "documents": sorted(docs)
+        })
+    result.sort(key=lambda n: (-len(n["documents"]), n["name"]))
+    return result
+
+
+def _adjacent(conn: sqlite3.Connection, node_id: str, directed: bool) -> list[tuple[str, str, str]]:
+    """(neighbor, relation type, direction) for one node"""
+    rows = [(r["target_id"], r["type"], "out") for r in conn.execute(
+        "SELECT DISTINCT target_id, type FROM edges WHERE source_id = ?", (node_id,))]
+    if not directed:
+        rows += [(r["source_id"], r["type"], "in") for r in conn.execute(
+            "SELECT DISTINCT source_id, type FROM edges WHERE target_id = ?", (node_id,))]
+    return rows
+
+
+# Node IDs bound per IN (...) query, well under SQLite's variable limit
+_QUERY_BATCH = 500
+
+
+def _edges_into(conn: sqlite3.Connection, node_ids: list[str], directed: bool) -> list[tuple[str, str, str, str]]:
+    """(neighbor, node, relation type, direction) for every step from a neighbor onto one of node_ids"""
+    steps = []
+    for i in range(0, len(node_ids), _QUERY_BATCH):
+        batch = node_ids[i:i + _QUERY_BATCH]
+        placeholders = ", ".join("?" for _ in batch)
+        steps += [(r["source_id"], r["target_id"], r["type"], "out") for r in conn.execute(
+            f"SELECT DISTINCT source_id, target_id, type FROM edges WHERE target_id IN ({placeholders})", batch)]
+        if not directed:
+            steps += [(r["target_id"], r["source_id"], r["type"], "in") for r in conn.execute(
+                f"SELECT DISTINCT source_id, target_id, type FROM edges WHERE source_id IN ({placeholders})", batch)]
+    return steps
+
+
+def find_paths(source: str, target: str, max_hops: int = 3, directed: bool = False, limit: int = 20) -> list[list[dict]]:
+    """Shortest-first simple paths of up to max_hops edges between two entities.
+
+    A breadth-first search back from the target, one query per level, gives
+    every node's distance to it; paths are then enumerated from the source
+    only through nodes close enough to still reach the target in time. Both
+    phases stop after KNOWLEDGE_GRAPH_PATH_MAX_NODES nodes.
+    """
+    source_id, target_id = resolve(source), resolve(target)
+    if source_id is None or target_id is None or source_id == target_id:
+        return []
+    conn = _connect()
+    distance = {target_id: 0}
+    steps: dict[str, list[tuple[str, str, str]]] = {}
+    frontier = [target_id]
+    for hops in range(1, max_hops + 1):
+        next_frontier = []
+        for other, node_id, edge_type, direction in _edges_into(conn, frontier, directed):
+            steps.setdefault(other, []).append((node_id, edge_type, direction))
+            if other not in distance and len(distance) < KNOWLEDGE_GRAPH_PATH_MAX_NODES:
+                distance[other] = hops
+                next_frontier.append(other)
+        frontier = next_frontier
+        if not frontier:
+            break
+    if source_id not in distance:
+        return []
+
+    paths = []
+    expanded = 0
+    for length in range(distance[source_id], max_hops + 1):
+        stack = [(source_id, [], {source_id})]
+        while stack and len(paths) < limit and expanded < KNOWLEDGE_GRAPH_PATH_MAX_NODES:
+            node_id, path, visited = stack.pop()
+            expanded += 1
+            remaining = length - len(path) - 1
+            for other, edge_type, direction in reversed(steps.get(node_id, ())):
+                if other in visited or distance.get(other, max_hops + 1) > remaining:
+                    continue
+                step = {"from": node_id, "to": other, "relation": edge_type, "direction": direction}
+                if other == target_id:
+                    if not remaining:
+                        paths.append(path + [step])
+                else:
+                    stack.append((other, path + [step], visited | {other}))
+    return paths[:limit]
+
+
+def subgraph(names: list[str], hops: int = 1) -> dict:
+    """Nodes within hops of the given entities and all edges among them"""
+    conn = _connect()
+    frontier = {node_id for node_id in (resolve(n) for n in names) if node_id}
+    node_ids = set(frontier)
+    for _ in range(hops):
+        next_frontier = set()
+        for node_id in frontier:
+            next_frontier.update(other for other, _, _ in _adjacent(conn, node_id, directed=False))
+        frontier = next_frontier - node_ids
+        node_ids |= frontier
+
+    if not node_ids:
+        return {"nodes": [], "edges": []}
+    placeholders = ", ".join("?" for _ in node_ids)
+    nodes = [dict(r) for r in conn.execute(
+        f"SELECT id, name, type FROM nodes WHERE id IN ({placeholders})", list(node_ids))]
+    edges = [dict(r) for r in conn.execute(
+        "SELECT source_id, target_id, type, doc_id, evidence FROM edges "
+        f"WHERE source_id IN ({placeholders}) AND target_id IN ({placeholders})",
+        [*node_ids, *node_ids])]
+    return {"nodes": nodes, "edges": edges}
+
+
+def get_stats() -> dict:
+    """Node, edge and document counts"""
+    conn = _connect()
+    return {
+        "nodes": conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0],
+        "edges": conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0],
+        "documents": conn.execute(
+            "SELECT COUNT(*) FROM (SELECT doc_id FROM edges UNION SELECT doc_id FROM mentions)"
+        ).fetchone()[0],
+        "relation_types": {
+            r["type"]: r["n"] for r in conn.execute("SELECT type, COUNT(*) AS n FROM edges GROUP BY type")
+        }
+    }
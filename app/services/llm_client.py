@@ -1,40 +1,266 @@
 """LiteLLM proxy client"""
-from openai import OpenAI
-from app.config import LITELLM_BASE_URL, LITELLM_API_KEY, DEFAULT_MODEL
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+import httpx
+from openai import AsyncOpenAI
+from app.config import (
+    LITELLM_BASE_URL,
+    LITELLM_API_KEY,
+    DEFAULT_MODEL,
+    EMBEDDING_MODEL,
+    LLM_REQUEST_TIMEOUT,
+    LLM_CONNECT_TIMEOUT,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_LATENCY_SAMPLES,
+    LLM_FALLBACK_MODELS,
+)
+from app.services import context_builder, llm_scheduler
+from app.services.llm_scheduler import BATCH, INTERACTIVE
+from app.utils import metrics
+from app.utils.single_flight import SingleFlight, request_key
 
+# Shared client, created lazily on first use and reused for every request so
+# that connections to the proxy are kept alive and pooled
+_client: AsyncOpenAI | None = None
 
-def get_client() -> OpenAI:
-    """Get OpenAI client configured for LiteLLM proxy"""
-    return OpenAI(
-        base_url=LITELLM_BASE_URL,
-        api_key=LITELLM_API_KEY
-    )
+# Identical chat completions in flight at the same time share one request
+_chat_flights = SingleFlight()
+
+# Recent latencies (seconds) of interactive chat completions per model, and
+# how often requests to each model were hedged and the hedge answered first
+_latencies: dict[str, deque] = {}
+_hedges: dict[str, dict[str, int]] = {}
+
+LLM_REQUEST_SECONDS = metrics.Histogram(
+    "biobuilder_llm_request_seconds",
+    "Duration of requests to the LLM proxy (streams until the last token), by outcome",
+    ("model", "mode", "outcome")
+)
+LLM_TIME_TO_FIRST_TOKEN = metrics.Histogram(
+    "biobuilder_llm_time_to_first_token_seconds",
+    "Time from sending a streamed request to its first content token",
+    ("model",)
+)
+LLM_TOKENS = metrics.Counter(
+    "biobuilder_llm_tokens_total",
+    "Tokens used per model as reported in the response usage (prompt or completion)",
+    ("model", "type")
+)
+
+
+def get_client() -> AsyncOpenAI:
+    """Get the shared async OpenAI client configured for LiteLLM proxy"""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        )
+        # Retries are done by llm_scheduler, which frees the request's slot
+        # while backing off
+        _client = AsyncOpenAI(
+            base_url=LITELLM_BASE_URL,
+            api_key=LITELLM_API_KEY,
+            max_retries=0,
+            http_client=http_client
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its connection pool"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
 
 
 async def chat_completion(
     messages: list[dict],
     model: str = None,
     temperature: float = 0.7,
-    max_tokens: int = 2000
+    max_tokens: int = 2000,
+    priority: int = INTERACTIVE
 ) -> str:
-    """Send chat completion request to LiteLLM proxy"""
+    """Send chat completion request to LiteLLM proxy.
+
+    The request is admitted by llm_scheduler according to priority
+    (llm_scheduler.INTERACTIVE or BATCH). Interactive requests are hedged
+    when they take longer than usual for the model.
+    """
     client = get_client()
     model = model or DEFAULT_MODEL
+    max_tokens = fit_max_tokens(messages, model, max_tokens)
     
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=max_tokens
-    )
+    async def send(target: str):
+        prompt_tokens = context_builder.count_message_tokens(messages, target)
+        target_max_tokens = max_tokens if target == model else fit_max_tokens(messages, target, max_tokens)
+        
+        async def create():
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                response = await client.chat.completions.create(
+                    model=target,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=target_max_tokens
+                )
+                outcome = "ok"
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                _observe_request(target, "chat", started, outcome)
+            _record_usage(target, response.usage)
+            return response
+        
+        response = await llm_scheduler.call(
+            target,
+            create,
+            priority=priority,
+            tokens=prompt_tokens + target_max_tokens,
+            used_tokens=lambda r: r.usage.total_tokens if r.usage else None
+        )
+        
+        # Keep token estimates in line with the model's real tokenizer
+        if response.usage and response.usage.prompt_tokens:
+            context_builder.calibrate(messages, response.usage.prompt_tokens, target)
+        
+        return response
+    
+    async def request() -> str:
+        if priority == INTERACTIVE:
+            response = await _hedged(model, send)
+        else:
+            response = await send(model)
+        return response.choices[0].message.content
+    
+    key = request_key(model, messages, temperature, max_tokens)
+    return await _chat_flights.run(key, request)
+
+
+def _observe_request(model: str, mode: str, started: float, outcome: str):
+    elapsed = time.monotonic() - started
+    LLM_REQUEST_SECONDS.observe(elapsed, model=model, mode=mode, outcome=outcome)
+    metrics.STAGE_SECONDS.observe(elapsed, stage="llm")
+
+
+def _record_usage(model: str, usage):
+    if usage:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, type="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, type="completion")
+
+
+def record_latency(model: str, seconds: float):
+    """Add a chat completion latency to the model's recent latencies"""
+    samples = _latencies.get(model)
+    if samples is None:
+        samples = _latencies[model] = deque(maxlen=LLM_LATENCY_SAMPLES)
+    samples.append(seconds)
+
+
+def hedge_delay(model: str) -> float | None:
+    """Seconds after which an unanswered request to the model is hedged, or None"""
+    samples = _latencies.get(model)
+    if LLM_HEDGE_PERCENTILE is None or not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return max(LLM_HEDGE_MIN_DELAY, metrics.percentile(samples, LLM_HEDGE_PERCENTILE))
+
+
+async def _timed(model: str, send: Callable[[str], Awaitable[Any]]) -> Any:
+    started = time.monotonic()
+    response = await send(model)
+    record_latency(model, time.monotonic() - started)
+    return response
+
+
+async def _hedged(model: str, send: Callable[[str], Awaitable[Any]]) -> Any:
+    """Await send(model); if it outlasts hedge_delay(model), race send(fallback) against it.
+
+    The fallback is LLM_FALLBACK_MODELS[model], or the model itself. The
+    first successful response wins and the other request is cancelled.
+    No hedge is sent while the fallback's requests are queueing, since a
+    duplicate would only add to the load.
+    """
+    delay = hedge_delay(model)
+    if delay is None:
+        return await _timed(model, send)
     
-    return response.choices[0].message.content
+    started = time.monotonic()
+    primary = asyncio.ensure_future(_timed(model, send))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        fallback = LLM_FALLBACK_MODELS.get(model, model)
+        if not done and llm_scheduler.has_free_slot(fallback):
+            counts = _hedges.setdefault(model, {"hedged": 0, "hedge_wins": 0})
+            counts["hedged"] += 1
+            pending.add(asyncio.ensure_future(_timed(fallback, send)))
+        
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        counts["hedge_wins"] += 1
+                        # The primary took at least this long; leaving it out
+                        # would bias the model's latencies low
+                        record_latency(model, time.monotonic() - started)
+                    return task.result()
+                if task is primary or error is None:
+                    error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def get_latency_stats() -> dict:
+    """Per-model latency percentiles, hedge thresholds and hedge counters"""
+    stats = {}
+    for model, samples in _latencies.items():
+        delay = hedge_delay(model)
+        stats[model] = {
+            "samples": len(samples),
+            "p50": round(metrics.percentile(samples, 0.5), 3),
+            "p95": round(metrics.percentile(samples, 0.95), 3),
+            "p99": round(metrics.percentile(samples, 0.99), 3),
+            "hedge_after": round(delay, 3) if delay is not None else None,
+            "fallback": LLM_FALLBACK_MODELS.get(model, model),
+            **_hedges.get(model, {"hedged": 0, "hedge_wins": 0})
+        }
+    return stats
+
+
+def get_coalescing_stats() -> dict:
+    """Single-flight counters of chat completions"""
+    return _chat_flights.get_stats()
+
+
+def fit_max_tokens(messages: list[dict], model: str, max_tokens: int) -> int:
+    """Shrink max_tokens so that prompt plus completion fit the model's context window"""
+    available = context_builder.input_budget(model, 0, context_builder.count_message_tokens(messages, model))
+    return max(1, min(max_tokens, available))
 
 
 async def list_models() -> list[dict]:
     """List available models from LiteLLM proxy"""
     client = get_client()
-    models = client.models.list()
+    models = await client.models.list()
     
     # Filter to chat models only (exclude embedding models)
     chat_models = []
@@ -51,25 +277,102 @@ async def list_models() -> list[dict]:
     return chat_models
 
 
-def stream_chat_completion(
+async def embed(texts: list[str], model: str | None = None, priority: int = BATCH) -> list[list[float]]:
+    """Embed texts in one request to the proxy's embeddings endpoint, admitted by llm_scheduler"""
+    client = get_client()
+    model = model or EMBEDDING_MODEL
+    
+    async def create():
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            response = await client.embeddings.create(model=model, input=texts)
+            outcome = "ok"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            _observe_request(model, "embedding", started, outcome)
+        if response.usage:
+            LLM_TOKENS.inc(response.usage.prompt_tokens or 0, model=model, type="prompt")
+        return response
+    
+    response = await llm_scheduler.call(
+        model,
+        create,
+        priority=priority,
+        tokens=sum(context_builder.estimate_tokens(text) for text in texts),
+        used_tokens=lambda r: r.usage.total_tokens if r.usage else None
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def stream_chat_completion(
     messages: list[dict],
     model: str = None,
     temperature: float = 0.7,
-    max_tokens: int = 2000
+    max_tokens: int = 2000,
+    priority: int = INTERACTIVE
 ):
-    """Send chat completion request to LiteLLM proxy with streaming"""
+    """Send chat completion request to LiteLLM proxy with streaming.
+
+    The request holds its llm_scheduler slot until the stream ends; opening
+    the stream is retried like chat_completion.
+    """
     client = get_client()
     model = model or DEFAULT_MODEL
+    prompt_tokens = context_builder.count_message_tokens(messages, model)
+    max_tokens = fit_max_tokens(messages, model, max_tokens)
     
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=max_tokens,
-        stream=True
-    )
+    for attempt in itertools.count(1):
+        lease = await llm_scheduler.acquire(model, priority, prompt_tokens + max_tokens)
+        started = time.monotonic()
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                # Ask for a final usage chunk (passed as extra body so older
+                # SDK versions accept it)
+                extra_body={"stream_options": {"include_usage": True}}
+            )
+            break
+        except Exception as e:
+            lease.release()
+            _observe_request(model, "stream", started, "error")
+            delay = llm_scheduler.retry_delay(model, e, attempt)
+            if delay is None:
+                raise
+        except BaseException:
+            # Cancelled while opening the stream (e.g. the client went away)
+            lease.release()
+            _observe_request(model, "stream", started, "cancelled")
+            raise
+        await asyncio.sleep(delay)
     
-    for chunk in response:
-        content = chunk.choices[0].delta.content
-        if content:
-            yield content
+    output_tokens = 0
+    usage = None
+    outcome = "cancelled"
+    try:
+        async with response:
+            async for chunk in response:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if not output_tokens:
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.monotonic() - started, model=model)
+                    output_tokens += context_builder.count_tokens(content, model)
+                    yield content
+        outcome = "ok"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        _observe_request(model, "stream", started, outcome)
+        _record_usage(model, usage)
+        lease.release(usage.total_tokens if usage else prompt_tokens + output_tokens)
@@ -0,0 +1,311 @@
+"""Admission control for LLM calls: per-model limits, priority queueing and retries.
+
+Every request to the proxy is admitted through the lane of its model, which
+enforces a concurrency limit and an optional tokens-per-minute budget.
+Waiting requests are admitted in priority order (interactive before batch).
+Rate limited (429) and transient failures are retried with jittered
+exponential backoff, honouring Retry-After; a 429 also pauses the model's
+lane so queued requests don't hit the same limit.
+"""
+import asyncio
+import email.utils
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+import openai
+from app.config import (
+    DEFAULT_MODEL,
+    LLM_MODEL_CONCURRENCY,
+    LLM_DEFAULT_CONCURRENCY,
+    LLM_MODEL_TOKENS_PER_MINUTE,
+    LLM_DEFAULT_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_INTERACTIVE_QUEUE_TIMEOUT,
+)
+from app.utils import metrics
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Queue waits kept per lane and priority for percentiles
+WAIT_SAMPLES = 1000
+
+QUEUE_WAIT_SECONDS = metrics.Histogram(
+    "biobuilder_llm_queue_wait_seconds",
+    "Time LLM requests waited for admission",
+    ("model", "priority")
+)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an interactive request waited too long to be admitted"""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """Admission state of one model"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.concurrency = LLM_MODEL_CONCURRENCY.get(model, LLM_DEFAULT_CONCURRENCY)
+        self.tokens_per_minute = LLM_MODEL_TOKENS_PER_MINUTE.get(model, LLM_DEFAULT_TOKENS_PER_MINUTE)
+        self.tokens = float(self.tokens_per_minute or 0)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.waiting: list[tuple[int, int, asyncio.Future, int]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.overloaded = 0
+
+    def refill(self):
+        if self.tokens_per_minute:
+            now = time.monotonic()
+            self.tokens = min(
+                self.tokens_per_minute,
+                self.tokens + (now - self.refilled_at) * self.tokens_per_minute / 60
+            )
+            self.refilled_at = now
+
+    def dispatch(self):
+        """Admit waiting requests in priority order while the limits allow"""
+        self.refill()
+        while self.waiting:
+            _, _, future, cost = self.waiting[0]
+            if future.done():
+                # Cancelled or timed out while queued
+                heapq.heappop(self.waiting)
+                continue
+            if self.in_flight >= self.concurrency:
+                return
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0 and self.tokens_per_minute:
+                # A request larger than the whole budget waits for a full bucket
+                needed = min(cost, self.tokens_per_minute)
+                if self.tokens < needed:
+                    delay = (needed - self.tokens) * 60 / self.tokens_per_minute
+            if delay > 0:
+                self.wake_after(delay)
+                return
+            heapq.heappop(self.waiting)
+            self.in_flight += 1
+            if self.tokens_per_minute:
+                self.tokens -= cost
+            future.set_result(None)
+
+    def wake_after(self, delay: float):
+        loop = asyncio.get_running_loop()
+        if self.timer is not None and self.timer.when() <= loop.time() + delay:
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = loop.call_later(delay, self.on_timer)
+
+    def on_timer(self):
+        self.timer = None
+        self.dispatch()
+
+    def pause(self, delay: float):
+        """Stop admitting requests for delay seconds (after a 429)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+
+class Lease:
+    """An admitted request's slot; release it when the request is finished"""
+
+    def __init__(self, lane: _Lane, tokens: int):
+        self.lane = lane
+        self.tokens = tokens
+        self.released = False
+
+    def release(self, used_tokens: int | None = None):
+        """Free the slot; used_tokens (if known) corrects the token budget charged at admission"""
+        if self.released:
+            return
+        self.released = True
+        lane = self.lane
+        lane.in_flight -= 1
+        if lane.tokens_per_minute and used_tokens is not None:
+            lane.refill()
+            lane.tokens = min(lane.tokens_per_minute, lane.tokens + self.tokens - used_tokens)
+        lane.dispatch()
+
+
+_lanes: dict[str, _Lane] = {}
+_sequence = itertools.count()
+
+
+def _lane(model: str | None) -> _Lane:
+    model = model or DEFAULT_MODEL
+    lane = _lanes.get(model)
+    if lane is None:
+        lane = _lanes[model] = _Lane(model)
+    return lane
+
+
+async def acquire(model: str | None, priority: int = INTERACTIVE, tokens: int = 0) -> Lease:
+    """Wait until a request of about this many tokens may be sent to the model.
+
+    Interactive requests raise LLMOverloadedError after waiting
+    LLM_INTERACTIVE_QUEUE_TIMEOUT seconds; batch requests wait as long as
+    it takes.
+    """
+    lane = _lane(model)
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(lane.waiting, (priority, next(_sequence), future, tokens))
+    queued_at = time.monotonic()
+    lane.dispatch()
+
+    timeout = LLM_INTERACTIVE_QUEUE_TIMEOUT if priority == INTERACTIVE else None
+    try:
+        await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        lane.overloaded += 1
+        raise LLMOverloadedError(
+            f"The LLM service for {lane.model} is busy, try again shortly",
+            retry_after=max(1.0, lane.paused_until - time.monotonic())
+        )
+    except BaseException:
+        if future.done() and not future.cancelled():
+            # Admitted just as the caller went away
+            Lease(lane, tokens).release(0)
+        else:
+            future.cancel()
+        raise
+
+    waited = time.monotonic() - queued_at
+    lane.waits[priority].append(waited)
+    lane.admitted[priority] += 1
+    QUEUE_WAIT_SECONDS.observe(waited, model=lane.model, priority=PRIORITY_NAMES[priority])
+    metrics.STAGE_SECONDS.observe(waited, stage="llm_queue")
+    return Lease(lane, tokens)
+
+
+def has_free_slot(model: str | None) -> bool:
+    """Whether a request to the model would be admitted without queueing"""
+    lane = _lane(model)
+    return (
+        lane.in_flight < lane.concurrency
+        and lane.paused_until <= time.monotonic()
+        and all(future.done() for _, _, future, _ in lane.waiting)
+    )
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(model: str | None, error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying after error on attempt (1-based), or None to give up"""
+    lane = _lane(model)
+    if not isinstance(error, RETRYABLE_ERRORS) or attempt > LLM_MAX_RETRIES:
+        lane.failures += 1
+        return None
+    delay = retry_after(error)
+    if delay is None:
+        # Full jitter exponential backoff
+        delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    else:
+        delay = min(delay, LLM_RETRY_MAX_DELAY)
+    if isinstance(error, openai.RateLimitError):
+        lane.rate_limited += 1
+        lane.pause(delay)
+    lane.retries += 1
+    return delay
+
+
+async def call(
+    model: str | None,
+    request: Callable[[], Awaitable[Any]],
+    priority: int = INTERACTIVE,
+    tokens: int = 0,
+    used_tokens: Callable[[Any], int | None] | None = None
+) -> Any:
+    """Run an LLM request under the model's limits, retrying rate limited and transient failures.
+
+    tokens is the estimated cost charged to the token budget at admission;
+    used_tokens(result), if given, returns the actual usage to settle it.
+    """
+    for attempt in itertools.count(1):
+        lease = await acquire(model, priority, tokens)
+        used = None
+        try:
+            result = await request()
+            used = used_tokens(result) if used_tokens else None
+            return result
+        except Exception as e:
+            delay = retry_delay(model, e, attempt)
+            if delay is None:
+                raise
+        finally:
+            lease.release(used)
+        await asyncio.sleep(delay)
+
+
+def get_stats() -> dict:
+    """Per-model limits, queue depths, queue-wait percentiles and retry counters"""
+    stats = {}
+    for model, lane in _lanes.items():
+        lane.refill()
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future, _ in lane.waiting:
+            if not future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        stats[model] = {
+            "concurrency_limit": lane.concurrency,
+            "tokens_per_minute": lane.tokens_per_minute,
+            "tokens_available": round(lane.tokens) if lane.tokens_per_minute else None,
+            "in_flight": lane.in_flight,
+            "queued": queued,
+            "paused_for": round(max(0.0, lane.paused_until - time.monotonic()), 3),
+            "queue_wait": {
+                PRIORITY_NAMES[p]: {
+                    "admitted": lane.admitted[p],
+                    "p50": round(metrics.percentile(waits, 0.5), 4),
+                    "p95": round(metrics.percentile(waits, 0.95), 4),
+                    "max": round(max(waits, default=0.0), 4)
+                }
+                for p, waits in lane.waits.items()
+            },
+            "retries": lane.retries,
+            "rate_limited": lane.rate_limited,
+            "failures": lane.failures,
+            "overloaded": lane.overloaded
+        }
+    return stats
@@ -0,0 +1,152 @@
+"""Per-document BM25 passage index for retrieval-based Q&A"""
+import math
+import re
+from array import array
+from collections import Counter
+from app.config import PASSAGE_SIZE, PASSAGE_OVERLAP, BM25_K1, BM25_B
+from app.utils.text_chunker import split_into_chunks
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[\-/][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can did do does for from had has have how i if in into is it its "
+    "of on or our such that the their then there these they this to was we were what when where "
+    "which while who whom why will with would you".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class PassageIndex:
+    """Inverted index over the passages of one document.
+
+    Postings are stored as compact unsigned int arrays of passage ids and
+    term frequencies; passage text is referenced by offsets into the document.
+    """
+    __slots__ = ("starts", "ends", "lengths", "postings")
+
+    def __init__(self, text: str):
+        self.starts = array("I")
+        self.ends = array("I")
+        self.lengths = array("I")
+        postings: dict[str, tuple[array, array]] = {}
+
+        for chunk in split_into_chunks(text, PASSAGE_SIZE, PASSAGE_OVERLAP):
+            passage_id = len(self.starts)
+            tokens = tokenize(chunk["text"])
+            self.starts.append(chunk["start"])
+            self.ends.append(chunk["end"])
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                ids, tfs = postings.setdefault(term, (array("I"), array("I")))
+                ids.append(passage_id)
+                tfs.append(tf)
+
+        self.postings = postings
+
+    @property
+    def passage_count(self) -> int:
+        return len(self.starts)
+
+    @property
+    def total_length(self) -> int:
+        return sum(self.lengths)
+
+    def document_frequency(self, term: str) -> int:
+        """Number of passages containing term"""
+        entry = self.postings.get(term)
+        return len(entry[0]) if entry else 0
+
+    def score(self, terms: list[str], idf: dict[str, float], avg_length: float) -> dict[int, float]:
+        """BM25 scores of the passages matching any of terms"""
+        scores: dict[int, float] = {}
+        for term in terms:
+            entry = self.postings.get(term)
+            if not entry:
+                continue
+            weight = idf[term]
+            for passage_id, tf in zip(*entry):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[passage_id] / avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + weight * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+
+# Indexes by document ID
+_indexes: dict[str, PassageIndex] = {}
+
+
+def add_index(doc_id: str, index: PassageIndex) -> PassageIndex:
+    """Register the passage index of a document"""
+    _indexes[doc_id] = index
+    return index
+
+def remove_index(doc_id: str):
+    """Drop the passage index of a document"""
+    _indexes.pop(doc_id, None)
+
+
+def get_index(doc_id: str) -> PassageIndex | None:
+    """Get the passage index of a document"""
+    return _indexes.get(doc_id)
+
+
+def search(question: str, doc_ids: list[str], top_k: int) -> list[dict]:
+    """Rank passages of the given documents against the question with BM25.
+
+    Returns up to top_k passages as dicts with doc_id, passage index,
+    character offsets and score, best first.
+    """
+    indexes = [(doc_id, _indexes[doc_id]) for doc_id in doc_ids if doc_id in _indexes]
+    terms = list(dict.fromkeys(tokenize(question)))
+    if not indexes or not terms:
+        return []
+
+    # Corpus statistics over the selected documents only
+    total_passages = sum(index.passage_count for _, index in indexes)
+    avg_length = max(sum(index.total_length for _, index in indexes) / max(total_passages, 1), 1.0)
+    idf = {}
+    for term in terms:
+        df = sum(index.document_frequency(term) for _, index in indexes)
+        idf[term] = math.log(1 + (total_passages - df + 0.5) / (df + 0.5))
+
+    ranked = []
+    for doc_id, index in indexes:
+        for passage_id, score in index.score(terms, idf, avg_length).items():
+            ranked.append((score, doc_id, passage_id))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+
+    return [
+        {
+            "doc_id": doc_id,
+            "passage": passage_id,
+            "start": _indexes[doc_id].starts[passage_id],
+            "end": _indexes[doc_id].ends[passage_id],
+            "score": round(score, 4)
+        }
+        for score, doc_id, passage_id in ranked[:top_k]
+    ]
+
+
+def leading_passages(doc_ids: list[str], limit: int) -> list[dict]:
+    """First passages of each document in turn, for questions with no searchable terms"""
+    result = []
+    position = 0
+    while len(result) < limit:
+        added = False
+        for doc_id in doc_ids:
+            index = _indexes.get(doc_id)
+            if index and position < index.passage_count and len(result) < limit:
+                result.append({
+                    "doc_id": doc_id,
+                    "passage": position,
+                    "start": index.starts[position],
+                    "end": index.ends[position],
+                    "score": 0.0
+                })
+                added = True
+        if not added:
+            break
+        position += 1
+    return result
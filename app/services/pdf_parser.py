@@ -0,0 +1,108 @@
+"""PDF text extraction off the event loop, split across worker processes by page range"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PyPDF2 import PdfReader
+from app.config import PDF_PARSE_WORKERS, PDF_PAGES_PER_TASK, PAGE_CACHE_DIR
+from app.utils import metrics
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Get the shared PDF parsing process pool"""
+    global _pool
+    if _pool is None:
+        # spawn: never fork a process that is running the event loop
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the PDF parsing worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def count_pages(file_path: str) -> int:
+    """Number of pages in a PDF"""
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pages(file_path: str, start: int = 0, end: int | None = None) -> list[str]:
+    """Extract the text of pages [start, end) of a PDF"""
+    reader = PdfReader(file_path)
+    pages = reader.pages[start:end]
+    return [page.extract_text() or "" for page in pages]
+
+
+def file_hash(file_path: Path) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(content_hash: str) -> Path:
+    return PAGE_CACHE_DIR / f"{content_hash}.json"
+
+
+def load_cached_pages(content_hash: str) -> list[str] | None:
+    """Per-page text previously extracted from a PDF with this content hash"""
+    try:
+        return json.loads(_cache_path(content_hash).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached_pages(content_hash: str, pages: list[str]):
+    """Cache per-page text for a PDF content hash"""
+    path = _cache_path(content_hash)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(pages), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+async def extract_pdf_pages(file_path: Path, content_hash: str | None = None) -> list[str]:
+    """Extract per-page text of a PDF in the process pool.
+
+    Large PDFs are split into page ranges parsed by separate workers.
+    Results are cached by content hash so the same PDF is only parsed once.
+    """
+    loop = asyncio.get_running_loop()
+    if content_hash is None:
+        content_hash = await asyncio.to_thread(file_hash, file_path)
+
+    cached = await asyncio.to_thread(load_cached_pages, content_hash)
+    metrics.cache_lookup("pdf_pages", cached is not None)
+    if cached is not None:
+        return cached
+
+    pool = get_pool()
+    page_count = await loop.run_in_executor(pool, count_pages, str(file_path))
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, extract_pages, str(file_path), start, end)
+        for start, end in ranges
+    ))
+    pages = [text for part in parts for text in part]
+
+    await asyncio.to_thread(store_cached_pages, content_hash, pages)
+    return pages
+
+
+def join_pages(pages: list[str]) -> str:
+    """Join page texts into the document text, skipping empty pages"""
+    return "\n\n".join(text for text in pages if text)
@@ -0,0 +1,348 @@
+"""Clean extracted document text before it reaches the LLM.
+
+Works on per-page text: removes running headers and footers repeated
+across pages and line-number columns, repairs words hyphenated across line
+breaks, and drops non-content sections (references, acknowledgments, ...)
+detected from their headings. A numbered reference list without a heading
+is recognised by its run of numbered, dated entries. Results are cached
+next to the parsed pages, keyed by content hash and preprocessing settings.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from app.config import (
+    PAGE_CACHE_DIR,
+    PREPROCESS_ENABLED,
+    PREPROCESS_DROP_SECTIONS,
+    PREPROCESS_EDGE_LINES,
+    PREPROCESS_BOILERPLATE_MIN_PAGES,
+    PREPROCESS_BOILERPLATE_MIN_FRACTION,
+    PREPROCESS_LINE_NUMBER_MIN_RUN,
+)
+from app.utils import metrics
+
+# Bump when the cleaning rules change so cached results are rebuilt
+VERSION = 2
+
+LIGATURES = str.maketrans({
+    "ﬀ": "ff", "ﬁ": "fi", "ﬂ": "fl", "ﬃ": "ffi", "ﬄ": "ffl", "ﬅ": "st", "ﬆ": "st",
+})
+
+# A heading alone on its line, or followed by ". text" / ": text" (run-in headings)
+HEADING_PATTERN = re.compile(
+    r"^\s*(?:\d+(?:\.\d+)*\.?\s+)?"
+    r"(?P<name>abstract|introduction|background|results?(?:\s+and\s+discussion)?|discussion|conclusions?|"
+    r"(?:materials\s+and\s+)?methods|experimental\s+procedures|supplementary(?:\s+(?:information|materials?|data))?|"
+    r"references(?:\s+and\s+notes)?|bibliography|literature\s+cited|acknowledge?ments?|funding|"
+    r"author\s+contributions|competing\s+interests?|conflicts?\s+of\s+interests?|data\s+availability)"
+    r"\s*(?:$|[.:]\s+(?P<rest>\S.*)$)",
+    re.IGNORECASE
+)
+SECTION_ALIASES = {
+    "acknowledgment": "acknowledgments",
+    "acknowledgement": "acknowledgments",
+    "acknowledgements": "acknowledgments",
+    "bibliography": "references",
+    "literature cited": "references",
+    "references and notes": "references",
+    "result": "results",
+    "conclusion": "conclusions",
+    "competing interest": "competing interests",
+    "conflict of interest": "competing interests",
+    "conflicts of interest": "competing interests",
+    "conflict of interests": "competing interests",
+    "conflicts of interests": "competing interests",
+}
+
+# Numbered reference entries: "1. A. Author", "[1] Author", "1) Author"
+REFERENCE_ENTRY_PATTERN = re.compile(r"^\s*\[?(\d{1,3})[.\])]\s+\S")
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}[a-z]?\b")
+REFERENCE_MIN_ENTRIES = 5
+
+LINE_NUMBER_PATTERN = re.compile(r"^\s*(\d{1,4})(?:\s+|$)")
+BOILERPLATE_DIGITS = re.compile(r"\d+")
+BOILERPLATE_SPACE = re.compile(r"\s+")
+INLINE_HYPHEN_PATTERN = re.compile(r"\b([A-Za-z]+)-([a-z]+)\b")
+WORD_PATTERN = re.compile(r"[A-Za-z]+")
+
+
+def _section_name(name: str) -> str:
+    name = " ".join(name.lower().split())
+    return SECTION_ALIASES.get(name, name)
+
+
+def _boilerplate_key(line: str) -> str:
+    """Line identity ignoring case, spacing and numbers (page numbers change per page)"""
+    return BOILERPLATE_SPACE.sub("", BOILERPLATE_DIGITS.sub("#", line.lower()))
+
+
+def _boilerplate(pages: list[list[str]]) -> set[str]:
+    """Keys of lines at the top or bottom of many pages"""
+    if len(pages) < PREPROCESS_BOILERPLATE_MIN_PAGES:
+        return set()
+    seen = Counter()
+    for lines in pages:
+        edges = lines[:PREPROCESS_EDGE_LINES] + lines[-PREPROCESS_EDGE_LINES:]
+        seen.update({_boilerplate_key(line) for line in edges if line.strip()})
+    threshold = max(PREPROCESS_BOILERPLATE_MIN_PAGES, PREPROCESS_BOILERPLATE_MIN_FRACTION * len(pages))
+    return {key for key, count in seen.items() if count >= threshold}
+
+
+def _strip_line_numbers(lines: list[str]) -> tuple[list[str], int]:
+    """Remove a line-number column: a long run of lines starting with increasing small steps"""
+    numbered = []
+    for i, line in enumerate(lines):
+        match = LINE_NUMBER_PATTERN.match(line)
+        if match:
+            numbered.append((i, int(match.group(1)), match.end()))
+
+    best: list[tuple[int, int, int]] = []
+    run: list[tuple[int, int, int]] = []
+    for entry in numbered:
+        if run and not 0 < entry[1] - run[-1][1] <= 5:
+            run = []
+        run.append(entry)
+        if len(run) > len(best):
+            best = list(run)
+    if len(best) < PREPROCESS_LINE_NUMBER_MIN_RUN:
+        return lines, 0
+
+    lines = list(lines)
+    for i, _, end in best:
+        lines[i] = lines[i][end:]
+    return lines, len(best)
+
+
+def _hyphen_repair(lines: list[tuple[int, str]]) -> list[tuple[int, str]]:
+    """Rejoin words hyphenated at line ends, and inside lines where the joined word occurs elsewhere.
+
+    A line-end hyphen is kept when the document spells the compound with a
+    hyphen elsewhere ("cell-type") but never without it.
+    """
+    words = set()
+    compounds = set()
+    for _, line in lines:
+        words.update(word.lower() for word in WORD_PATTERN.findall(line))
+        compounds.update(match.group(0).lower() for match in INLINE_HYPHEN_PATTERN.finditer(line))
+
+    repaired = []
+    carry = ""
+    for i, (page, line) in enumerate(lines):
+        line = carry + line
+        carry = ""
+        next_line = lines[i + 1][1] if i + 1 < len(lines) else ""
+        if len(line) > 1 and line.endswith("-") and line[-2].isalpha() and next_line[:1].islower():
+            # The word start moves to the next line, which may be on the next page
+            head, _, start = line[:-1].rpartition(" ")
+            match = WORD_PATTERN.match(next_line)
+            rest = match.group(0) if match else ""
+            compound = f"{start}-{rest}".lower()
+            keep_hyphen = compound in compounds and (start + rest).lower() not in words
+            repaired.append((page, head))
+            carry = start + "-" if keep_hyphen else start
+        else:
+            repaired.append((page, line))
+
+    def join(match: re.Match) -> str:
+        joined = match.group(1) + match.group(2)
+        return joined if joined.lower() in words else match.group(0)
+
+    return [(page, INLINE_HYPHEN_PATTERN.sub(join, line)) for page, line in repaired if line.strip()]
+
+
+def _reference_list_start(lines: list[tuple[int, str]]) -> int | None:
+    """Index of the first entry of the last numbered reference list (entries 1, 2, 3, ... mostly dated)"""
+    found = None
+    start = None
+    entries = dated = 0
+    for i, (_, line) in enumerate(lines + [(-1, "1. end")]):
+        match = REFERENCE_ENTRY_PATTERN.match(line)
+        if not match:
+            continue
+        number = int(match.group(1))
+        if number == 1:
+            if start is not None and entries >= REFERENCE_MIN_ENTRIES and dated >= entries / 2:
+                found = start
+            start, entries, dated = i, 0, 0
+        elif start is None or number != entries + 1:
+            continue
+        entries += 1
+        # Entries usually wrap, so look for the year in the entry's first lines
+        if YEAR_PATTERN.search(" ".join(line for _, line in lines[i:i + 4])):
+            dated += 1
+    return found
+
+
+def _drop_sections(lines: list[tuple[int, str]], drop: set[str]) -> tuple[list[tuple[int, str]], list[str]]:
+    """Remove lines of sections whose heading is in drop, up to the next heading.
+
+    A run-in heading ("Funding: ...") is usually a footnote-style block, so
+    its section also ends with its page.
+    """
+    dropped = []
+    if "references" in drop:
+        start = _reference_list_start(lines)
+        if start is not None:
+            # An unheaded list runs to the end unless another heading follows
+            end = next(
+                (i for i in range(start, len(lines)) if HEADING_PATTERN.match(lines[i][1])),
+                len(lines)
+            )
+            lines = lines[:start] + lines[end:]
+            dropped.append("references")
+
+    kept = []
+    dropping = False
+    run_in_page = None
+    for page, line in lines:
+        if run_in_page is not None and page != run_in_page:
+            dropping = False
+            run_in_page = None
+        match = HEADING_PATTERN.match(line)
+        if match:
+            name = _section_name(match.group("name"))
+            dropping = name in drop
+            run_in_page = page if match.group("rest") else None
+            if dropping:
+                dropped.append(name)
+                continue
+        if not dropping:
+            kept.append((page, line))
+
+    return kept, dropped
+
+
+def preprocess_pages(pages: list[str], drop_sections: tuple[str, ...] = PREPROCESS_DROP_SECTIONS) -> dict:
+    """Clean per-page text into the document text.
+
+    Returns {"text", "page_starts", "sections", "dropped_sections",
+    "removed_lines", "raw_char_count"}: page_starts[i] is the offset of page
+    i in text, and sections lists the kept headings as {"name", "start"}.
+    """
+    page_lines = [page.translate(LIGATURES).split("\n") for page in pages]
+    boilerplate = _boilerplate(page_lines)
+    removed = Counter()
+
+    lines: list[tuple[int, str]] = []
+    for number, page in enumerate(page_lines):
+        page, stripped = _strip_line_numbers(page)
+        removed["line_numbers"] += stripped
+        for i, line in enumerate(page):
+            # Repeated lines only count as headers/footers where they were
+            # detected, so number-only keys ("#") spare table cells mid-page
+            at_edge = i < PREPROCESS_EDGE_LINES or i >= len(page) - PREPROCESS_EDGE_LINES
+            if at_edge and boilerplate and _boilerplate_key(line) in boilerplate:
+                removed["boilerplate"] += 1
+            elif line.strip():
+                lines.append((number, line.rstrip()))
+
+    lines = _hyphen_repair(lines)
+    before = len(lines)
+    lines, dropped = _drop_sections(lines, {_section_name(name) for name in drop_sections})
+    removed["sections"] = before - len(lines)
+
+    # Lines of a page are joined with newlines, pages with blank lines (as join_pages)
+    parts = []
+    page_starts = []
+    sections = []
+    length = 0
+    page = -1
+    for number, line in lines:
+        if number != page:
+            separator = "\n\n" if parts else ""
+            page_starts.extend([length + len(separator)] * (number - page))
+            page = number
+        else:
+            separator = "\n"
+        length += len(separator)
+        match = HEADING_PATTERN.match(line)
+        if match:
+            sections.append({"name": _section_name(match.group("name")), "start": length})
+        parts.append(separator + line)
+        length += len(line)
+    page_starts.extend([length] * (len(pages) - len(page_starts)))
+
+    return {
+        "text": "".join(parts),
+        "page_starts": page_starts,
+        "sections": sections,
+        "dropped_sections": dropped,
+        "removed_lines": dict(removed),
+        "raw_char_count": sum(len(page) for page in pages),
+    }
+
+
+def _joined(pages: list[str]) -> dict:
+    """Unprocessed pages joined as join_pages does, in the preprocess result format"""
+    page_starts = []
+    length = 0
+    pending = 0
+    for page in pages:
+        if not page:
+            # Empty pages start where the next page does
+            pending += 1
+            continue
+        if length:
+            length += 2
+        page_starts.extend([length] * (pending + 1))
+        pending = 0
+        length += len(page)
+    page_starts.extend([length] * pending)
+    return {
+        "text": "\n\n".join(page for page in pages if page),
+        "page_starts": page_starts,
+        "sections": [],
+        "dropped_sections": [],
+        "removed_lines": {},
+        "raw_char_count": sum(len(page) for page in pages),
+    }
+
+
+def _settings_key() -> str:
+    settings = json.dumps([VERSION, sorted(_section_name(s) for s in PREPROCESS_DROP_SECTIONS), PREPROCESS_EDGE_LINES,
+                           PREPROCESS_BOILERPLATE_MIN_PAGES, PREPROCESS_BOILERPLATE_MIN_FRACTION,
+                           PREPROCESS_LINE_NUMBER_MIN_RUN])
+    return hashlib.sha256(settings.encode()).hexdigest()[:16]
+
+
+def _cache_path(content_hash: str) -> Path:
+    return PAGE_CACHE_DIR / f"{content_hash}.clean.json"
+
+
+def load_cached(content_hash: str) -> dict | None:
+    """Preprocessed text of a document with this content hash, if cached with the current settings"""
+    try:
+        cached = json.loads(_cache_path(content_hash).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return cached if cached.get("settings") == _settings_key() else None
+
+
+def store_cached(content_hash: str, result: dict):
+    """Cache the preprocessed text of a document"""
+    path = _cache_path(content_hash)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({**result, "settings": _settings_key()}), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def preprocess(pages: list[str], content_hash: str | None = None) -> dict:
+    """Preprocess a document's pages, using the cache when the content hash is known.
+
+    With PREPROCESS_ENABLED off the pages are only joined.
+    """
+    if not PREPROCESS_ENABLED:
+        return _joined(pages)
+    if content_hash:
+        cached = load_cached(content_hash)
+        metrics.cache_lookup("preprocessed", cached is not None)
+        if cached is not None:
+            return cached
+    with metrics.stage("preprocess"):
+        result = preprocess_pages(pages)
+    if content_hash:
+        store_cached(content_hash, result)
+    return result
@@ -0,0 +1,327 @@
+"""Embedding index of document passages for semantic search.
+
+Passages (the same spans as the BM25 passage index) are embedded at upload
+through the proxy and stored as unit vectors in a float32 matrix memory-
+mapped from disk, one per embedding model. Rows are appended as documents
+arrive; deleting a document only marks its rows as tombstones, and the
+matrix is rewritten without them once they make up
+VECTOR_INDEX_COMPACT_FRACTION of it. Row metadata lives in SQLite, whose
+write lock also serializes appends from several worker processes.
+"""
+import asyncio
+import re
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+from app.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    VECTOR_INDEX_DIR,
+    VECTOR_INDEX_GROWTH_ROWS,
+    VECTOR_INDEX_COMPACT_FRACTION,
+)
+from app.services import llm_client
+from app.services.llm_scheduler import BATCH, INTERACTIVE
+from app.utils import metrics
+
+# Rows copied at a time when compacting, to bound memory use
+COMPACT_BLOCK_ROWS = 8192
+
+
+class _View:
+    """Snapshot of the live rows and the mapped matrix, rebuilt when the index changes"""
+    __slots__ = ("version", "matrix", "rows", "docs", "passages", "starts", "ends", "doc_codes", "doc_ids")
+
+    def __init__(self, version: int, matrix: np.ndarray | None, records: list[sqlite3.Row]):
+        self.version = version
+        self.matrix = matrix
+        self.doc_ids = list(dict.fromkeys(r["doc_id"] for r in records))
+        self.doc_codes = {doc_id: code for code, doc_id in enumerate(self.doc_ids)}
+        self.rows = np.array([r["row"] for r in records], dtype=np.int64)
+        self.docs = np.array([self.doc_codes[r["doc_id"]] for r in records], dtype=np.int32)
+        self.passages = np.array([r["passage"] for r in records], dtype=np.int32)
+        self.starts = np.array([r["start"] for r in records], dtype=np.int64)
+        self.ends = np.array([r["end"] for r in records], dtype=np.int64)
+
+
+class VectorIndex:
+    """Memory-mapped passage vectors of one embedding model"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.directory = VECTOR_INDEX_DIR / re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._view: _View | None = None
+        self._view_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS rows (
+                    row INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    passage INTEGER NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_rows_doc ON rows(doc_id);
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    passages INTEGER NOT NULL
+                );
+            """)
+            conn.executemany(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)",
+                [("dim",), ("count",), ("capacity",), ("generation",), ("version",), ("deleted",)]
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Per-thread connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.directory / "index.db", timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _path(self, generation: int) -> Path:
+        return self.directory / f"vectors.{generation}.f32"
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection) -> dict[str, int]:
+        return {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values: int):
+        conn.executemany("UPDATE meta SET value = ? WHERE key = ?", [(v, k) for k, v in values.items()])
+
+    def has_document(self, doc_id: str) -> bool:
+        """Whether a document's passages were added (documents without passages included)"""
+        row = self._connect().execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row is not None
+
+    def documents(self) -> set[str]:
+        """IDs of all documents in the index"""
+        return {row["doc_id"] for row in self._connect().execute("SELECT doc_id FROM documents")}
+
+    def add(self, doc_id: str, spans: list[tuple[int, int]], vectors: np.ndarray):
+        """Append the unit vectors of a document's passages (spans[i] is passage i's offsets)"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.has_document(doc_id):
+                conn.execute("COMMIT")
+                return
+            meta = self._meta(conn)
+            dim = meta["dim"] or (vectors.shape[1] if len(vectors) else 0)
+            if len(vectors) and vectors.shape[1] != dim:
+                raise ValueError(f"{self.model} returned {vectors.shape[1]}-dimensional vectors, index has {dim}")
+            count, capacity = meta["count"], meta["capacity"]
+            if len(vectors):
+                path = self._path(meta["generation"])
+                if count + len(vectors) > capacity:
+                    # Grow in large steps so appends rarely resize the file
+                    capacity = count + len(vectors) + VECTOR_INDEX_GROWTH_ROWS
+                    with open(path, "ab") as f:
+                        f.truncate(capacity * dim * 4)
+                matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+                matrix[count:count + len(vectors)] = vectors
+                matrix.flush()
+                del matrix
+            conn.executemany(
+                "INSERT INTO rows (row, doc_id, passage, start, end) VALUES (?, ?, ?, ?, ?)",
+                [(count + i, doc_id, i, start, end) for i, (start, end) in enumerate(spans)]
+            )
+            conn.execute("INSERT INTO documents (doc_id, passages) VALUES (?, ?)", (doc_id, len(spans)))
+            self._set_meta(conn, dim=dim, count=count + len(spans), capacity=capacity, version=meta["version"] + 1)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, doc_id: str):
+        """Tombstone a document's rows, compacting the matrix when enough rows are dead"""
+        conn = self._connect()
+        old_path = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute("UPDATE rows SET deleted = 1 WHERE doc_id = ? AND deleted = 0", (doc_id,)).rowcount
+            removed = conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount
+            if deleted or removed:
+                meta = self._meta(conn)
+                self._set_meta(conn, deleted=meta["deleted"] + deleted, version=meta["version"] + 1)
+                if deleted and meta["deleted"] + deleted >= VECTOR_INDEX_COMPACT_FRACTION * meta["count"]:
+                    old_path = self._compact(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if old_path is not None:
+            # Readers that still map the old file keep it until they refresh
+            old_path.unlink(missing_ok=True)
+
+    def _compact(self, conn: sqlite3.Connection) -> Path:
+        """Rewrite the matrix without tombstoned rows (inside the write transaction); returns the old file"""
+        meta = self._meta(conn)
+        old_path = self._path(meta["generation"])
+        new_path = self._path(meta["generation"] + 1)
+        live = [row["row"] for row in conn.execute("SELECT row FROM rows WHERE deleted = 0 ORDER BY row")]
+        dim = meta["dim"]
+        capacity = len(live) + VECTOR_INDEX_GROWTH_ROWS
+        with open(new_path, "wb") as f:
+            f.truncate(capacity * dim * 4)
+        if live and dim:
+            old = np.memmap(old_path, dtype=np.float32, mode="r", shape=(meta["capacity"], dim))
+            new = np.memmap(new_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            for block in range(0, len(live), COMPACT_BLOCK_ROWS):
+                rows = live[block:block + COMPACT_BLOCK_ROWS]
+                new[block:block + len(rows)] = old[rows]
+            new.flush()
+            del old, new
+
+        conn.execute("DELETE FROM rows WHERE deleted = 1")
+        # Ascending order never moves a row onto one that is still in use
+        conn.executemany("UPDATE rows SET row = ? WHERE row = ?", list(enumerate(live)))
+        self._set_meta(
+            conn, count=len(live), capacity=capacity, deleted=0,
+            generation=meta["generation"] + 1, version=meta["version"] + 1
+        )
+        return old_path
+
+    def _current_view(self) -> _View:
+        """The cached view, rebuilt if another thread or process changed the index"""
+        conn = self._connect()
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()["value"]
+        view = self._view
+        if view is not None and view.version == version:
+            return view
+        with self._view_lock:
+            if self._view is not None and self._view.version == version:
+                return self._view
+            conn.execute("BEGIN")
+            try:
+                meta = self._meta(conn)
+                records = conn.execute(
+                    "SELECT row, doc_id, passage, start, end FROM rows WHERE deleted = 0 ORDER BY row"
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+            matrix = None
+            if meta["count"] and meta["dim"]:
+                matrix = np.memmap(
+                    self._path(meta["generation"]), dtype=np.float32, mode="r", shape=(meta["count"], meta["dim"])
+                )
+            self._view = _View(meta["version"], matrix, records)
+            return self._view
+
+    def search(self, vector: np.ndarray, top_k: int, doc_ids: list[str] | None = None) -> list[dict]:
+        """Passages most similar to a unit vector, optionally within some documents, best first"""
+        view = self._current_view()
+        if view.matrix is None or not len(view.rows):
+            return []
+        if vector.shape[0] != view.matrix.shape[1]:
+            raise ValueError(f"Query vector has {vector.shape[0]} dimensions, index has {view.matrix.shape[1]}")
+
+        if doc_ids is None:
+            # Scoring every row and picking live ones is cheaper than gathering live rows first
+            candidates = np.arange(len(view.rows))
+            scores = (view.matrix @ vector)[view.rows]
+        else:
+            codes = [view.doc_codes[d] for d in doc_ids if d in view.doc_codes]
+            candidates = np.flatnonzero(np.isin(view.docs, codes))
+            scores = view.matrix[view.rows[candidates]] @ vector
+        if not len(scores):
+            return []
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            {
+                "doc_id": view.doc_ids[view.docs[i]],
+                "passage": int(view.passages[i]),
+                "start": int(view.starts[i]),
+                "end": int(view.ends[i]),
+                "score": round(float(score), 4)
+            }
+            for i, score in zip(candidates[best], scores[best])
+        ]
+
+    def get_stats(self) -> dict:
+        """Dimensions, live and tombstoned rows and indexed documents"""
+        conn = self._connect()
+        meta = self._meta(conn)
+        documents = conn.execute("SELECT COUNT(*) AS n FROM documents").fetchone()["n"]
+        return {
+            "model": self.model,
+            "dim": meta["dim"],
+            "documents": documents,
+            "rows": meta["count"] - meta["deleted"],
+            "deleted_rows": meta["deleted"],
+            "capacity": meta["capacity"]
+        }
+
+
+_indexes: dict[str, VectorIndex] = {}
+
+
+def get_index(model: str | None = None) -> VectorIndex | None:
+    """The vector index of an embedding model (EMBEDDING_MODEL by default), None if embedding is off"""
+    model = model or EMBEDDING_MODEL
+    if model is None:
+        return None
+    index = _indexes.get(model)
+    if index is None:
+        index = _indexes[model] = VectorIndex(model)
+    return index
+
+
+def _normalize(vectors: list[list[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+async def embed_texts(texts: list[str], priority: int = BATCH) -> np.ndarray:
+    """Unit vectors of texts, embedded in batches of EMBEDDING_BATCH_SIZE"""
+    semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+
+    async def batch(start: int) -> list[list[float]]:
+        async with semaphore:
+            return await llm_client.embed(texts[start:start + EMBEDDING_BATCH_SIZE], priority=priority)
+
+    batches = await asyncio.gather(*(batch(start) for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)))
+    return _normalize([vector for vectors in batches for vector in vectors])
+
+
+async def index_document(doc_id: str, text: str, spans: list[tuple[int, int]]):
+    """Embed a document's passages and add them to the index (no-op if embedding is off or done)"""
+    index = get_index()
+    if index is None or await asyncio.to_thread(index.has_document, doc_id):
+        return
+    with metrics.stage("embedding"):
+        vectors = await embed_texts([text[start:end] for start, end in spans]) if spans else np.zeros((0, 0), np.float32)
+    await asyncio.to_thread(index.add, doc_id, spans, vectors)
+
+
+async def remove_document(doc_id: str):
+    """Tombstone a document's passages (off the event loop, as it may compact the matrix)"""
+    index = get_index()
+    if index is not None:
+        await asyncio.to_thread(index.delete, doc_id)
+
+
+async def search(query: str, top_k: int, doc_ids: list[str] | None = None) -> list[dict]:
+    """Passages closest to the query by cosine similarity, best first"""
+    index = get_index()
+    if index is None:
+        return []
+    vector = (await embed_texts([query], priority=INTERACTIVE))[0]
+    with metrics.stage("vector_search"):
+        return await asyncio.to_thread(index.search, vector, top_k, doc_ids)
@@ -0,0 +1,85 @@
+"""Incremental, tolerant parsing of streamed LLM JSON output"""
+import json
+
+
+class IncrementalArrayParser:
+    """Pull complete objects out of top-level JSON arrays while text streams in.
+
+    Feed the LLM output piece by piece; every object inside one of the
+    watched arrays (e.g. "entities" and "relations") is returned as soon as
+    its closing brace arrives. Text before the first "{" (prose, code fences)
+    is ignored, objects that fail to parse are skipped, and a truncated
+    stream keeps every object that closed before the cut.
+    """
+
+    def __init__(self, keys: tuple[str, ...] = ("entities", "relations")):
+        self.keys = keys
+        self.results: dict[str, list[dict]] = {key: [] for key in keys}
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string: list[str] | None = None
+        self._last_key = None
+        self._array_key = None
+        self._object: list[str] | None = None
+
+    def feed(self, text: str) -> list[tuple[str, dict]]:
+        """Consume more output; returns (array key, object) for each object completed"""
+        completed = []
+        for char in text:
+            if self.complete:
+                break
+            if self._object is not None:
+                self._object.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string is not None:
+                        self._last_key = "".join(self._string)
+                        self._string = None
+                    continue
+                if self._string is not None:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                # Only strings directly inside the top-level object can be keys
+                self._string = [] if self._depth == 1 else None
+            elif char in "{[":
+                if self._depth == 0 and char == "[":
+                    continue
+                self._depth += 1
+                if char == "[" and self._depth == 2:
+                    self._array_key = self._last_key if self._last_key in self.keys else None
+                elif char == "{" and self._depth == 3 and self._array_key:
+                    self._object = ["{"]
+            elif char in "}]":
+                if self._depth == 0:
+                    continue
+                self._depth -= 1
+                if self._depth == 2 and char == "}" and self._object is not None:
+                    obj = self._parse_object("".join(self._object))
+                    self._object = None
+                    if obj is not None:
+                        self.results[self._array_key].append(obj)
+                        completed.append((self._array_key, obj))
+                elif self._depth == 1 and char == "]":
+                    self._array_key = None
+                elif self._depth == 0:
+                    self.complete = True
+        return completed
+
+    @staticmethod
+    def _parse_object(text: str) -> dict | None:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return obj if isinstance(obj, dict) else None
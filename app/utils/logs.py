@@ -0,0 +1,165 @@
+"""Structured logging that never blocks the caller.
+
+Log calls put the record on a bounded queue. A background thread formats
+it as one JSON line and writes it to a rotating file. Messages use lazy
+%-style arguments, formatted on the writer thread. The request ID of the
+calling context, the logger's extra fields and any exception are included.
+
+    logger = logging.getLogger(__name__)
+    logger.info("Extracted %d entities", count, extra={"doc_id": doc_id})
+    log_payload(logger, "LLM response", response, model=model)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import uuid
+from datetime import datetime, timezone
+from app.config import (
+    LOG_DIR,
+    LOG_LEVEL,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE,
+    LOG_PAYLOAD_SAMPLE_RATE,
+    LOG_PAYLOAD_MAX_CHARS,
+)
+from app.utils import metrics
+
+# ID of the HTTP request (or job) being handled, attached to every record
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Attributes every LogRecord has; anything else was passed in extra
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+DROPPED_RECORDS = metrics.Counter(
+    "biobuilder_log_records_dropped_total",
+    "Log records dropped because the log queue was full"
+)
+
+_listener: logging.handlers.QueueListener | None = None
+_handler: logging.Handler | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request ID and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        payload = entry.get("payload")
+        if isinstance(payload, str):
+            entry["payload_chars"] = len(payload)
+            if len(payload) > LOG_PAYLOAD_MAX_CHARS:
+                entry["payload"] = payload[:LOG_PAYLOAD_MAX_CHARS]
+                entry["payload_truncated"] = True
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the writer thread and drops records when full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only what depends on the calling context is resolved here
+        record.request_id = request_id.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_RECORDS.inc()
+
+
+def setup_logging():
+    """Route the root logger through the queue to the rotating JSON log file (idempotent)"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_DIR / "debug.log",
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    _handler = _NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Detach the queue from the root logger, write out queued records and stop the writer thread"""
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = _handler = None
+    atexit.unregister(shutdown_logging)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: str, **fields):
+    """Log a raw LLM payload at DEBUG for a LOG_PAYLOAD_SAMPLE_RATE sample of calls.
+
+    The payload is cut to LOG_PAYLOAD_MAX_CHARS when the record is written,
+    so the caller pays for neither copying nor formatting.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(message, extra={**fields, "payload": payload})
+
+
+class RequestIdMiddleware:
+    """ASGI middleware giving each request an ID (from X-Request-ID or new), echoed in the response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.encode())
+        current = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex[:16]
+        token = request_id.set(current)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (REQUEST_ID_HEADER.encode(), current.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,240 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are updated where the work happens, at the cost of
+a lock and a dict lookup. Gauges are read from callbacks only when
+/metrics is scraped. Metrics are per process: with several uvicorn
+workers, each reports its own.
+"""
+import bisect
+import inspect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+# Latency buckets (seconds), from cache lookups to long LLM generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_registry: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def percentile(values: Iterable[float], fraction: float) -> float:
+    """Nearest-rank percentile of values (fraction in [0, 1]); 0.0 when empty"""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """Sample lines of the exposition format"""
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label combination"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in self.values().items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets per label combination"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per key: per-bucket counts (last one is +Inf, not cumulative) and sum
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block (or decorated sync function)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Current values, read from collect() at scrape time.
+
+    collect returns (label values, value) pairs, label values in the order
+    of labels.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str], collect: Callable[[], Iterable[tuple[tuple, float]]]):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labels, tuple(key))} {_number(value)}"
+            for key, value in self.collect()
+            if value is not None
+        ]
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # A failing collector must not break the whole scrape
+            lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+# Shared by the services: time spent per processing stage, and cache lookups
+STAGE_SECONDS = Histogram(
+    "biobuilder_stage_seconds",
+    "Time spent per processing stage (upload, parse, context_build, chunking, job_queue, llm_queue, llm, parse_response)",
+    ("stage",)
+)
+CACHE_LOOKUPS = Counter(
+    "biobuilder_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ("cache", "result")
+)
+
+
+def stage(name: str):
+    """Time a processing stage: with stage("parse"): ... or @stage("parse") on a sync function"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss"""
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "biobuilder_http_request_seconds",
+    "HTTP request duration until the response body is sent, by route template",
+    ("method", "route", "status")
+)
+
+
+def _route_template(scope, root_path: str) -> str:
+    """The request path with path parameters put back as {name}, keeping label values bounded"""
+    if "endpoint" not in scope:
+        return "unmatched"
+    if not inspect.isroutine(scope["endpoint"]):
+        # A mounted app (static files): the mount adds its path to root_path
+        return scope.get("root_path", "")[len(root_path):] + "/{path}"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(str(value), "{%s}" % name, 1)
+    return path
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request, streamed bodies included"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=_route_template(scope, root_path),
+                status=status
+            )
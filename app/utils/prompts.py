@@ -10,6 +10,9 @@ Instructions:
 5. Use clear, professional language"""
 
 
+# Bump whenever the extraction prompt changes so cached results are not reused
+EXTRACTION_PROMPT_VERSION = "1"
+
 GENE_EXTRACTION_PROMPT = """You are an expert biomedical text mining system. Extract all genes, proteins, and their biological relationships from scientific text.
 
 Output a valid JSON object with this exact structure:
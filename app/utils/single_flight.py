@@ -0,0 +1,66 @@
+"""Coalescing of identical concurrent async calls"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable request parts (model, messages, parameters)"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Share one in-flight call among all callers asking for the same key.
+
+    The first caller starts the call; callers arriving while it runs wait
+    for the same result (or exception). The call runs as its own task, so
+    it survives the caller that started it being cancelled, and is only
+    cancelled once every waiting caller has gone.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await call(), or the already running call for key"""
+        task = self._inflight.get(key)
+        if task is None or task.cancelled():
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters[task] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved when no caller was left to see it
+            task.exception()
+
+    def get_stats(self) -> dict:
+        """Upstream calls made, calls saved by sharing, and what is in flight now"""
+        return {
+            "upstream_calls": self.calls,
+            "saved_calls": self.coalesced,
+            "in_flight": len(self._inflight),
+            "waiters": sum(self._waiters.values())
+        }
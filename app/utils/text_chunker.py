@@ -0,0 +1,116 @@
+"""Split long scientific text into overlapping chunks"""
+import re
+
+# Headings that start a new section in scientific papers (optionally numbered),
+# plus "=== Document: name ===" headers of concatenated documents; matched at
+# the start of each paragraph
+SECTION_HEADING_PATTERN = re.compile(
+    r"\s*(?:=== Document:|(?:\d+(?:\.\d+)*\.?\s+)?"
+    r"(?:abstract|introduction|background|results?|discussion|conclusions?|"
+    r"(?:materials\s+and\s+)?methods|experimental\s+procedures|"
+    r"supplementary|references|acknowledge?ments?)\b)",
+    re.IGNORECASE
+)
+PARAGRAPH_BREAK_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_BREAK_PATTERN = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+
+# Unit boundary markers
+PARAGRAPH = 1
+SECTION = 2
+
+
+def _split_span(text: str, start: int, end: int, pattern: re.Pattern) -> list[tuple[int, int]]:
+    """Split text[start:end] on pattern, returning (start, end) spans without the separators"""
+    spans = []
+    pos = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > pos:
+            spans.append((pos, match.start()))
+        pos = match.end()
+    if pos < end:
+        spans.append((pos, end))
+    return spans
+
+
+def _hard_split(text: str, start: int, end: int, size: int) -> list[tuple[int, int]]:
+    """Split an over-long span at whitespace close to size characters"""
+    spans = []
+    while end - start > size:
+        cut = text.rfind(" ", start + size // 2, start + size)
+        if cut == -1:
+            cut = start + size
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+
+def _units(text: str, chunk_size: int) -> list[tuple[int, int, int]]:
+    """Break text into sentence-sized (start, end, boundary) units.
+
+    boundary is SECTION for the first unit of a section, PARAGRAPH for the
+    first unit of any other paragraph and 0 inside a paragraph.
+    """
+    units = []
+    for p_start, p_end in _split_span(text, 0, len(text), PARAGRAPH_BREAK_PATTERN):
+        boundary = SECTION if SECTION_HEADING_PATTERN.match(text, p_start, p_end) else PARAGRAPH
+        for s_start, s_end in _split_span(text, p_start, p_end, SENTENCE_BREAK_PATTERN):
+            for h_start, h_end in _hard_split(text, s_start, s_end, chunk_size):
+                units.append((h_start, h_end, boundary))
+                boundary = 0
+    return units
+
+
+def split_into_chunks(text: str, chunk_size: int, overlap: int = 0) -> list[dict]:
+    """Split text into chunks on section and paragraph boundaries.
+
+    Chunks end at a paragraph break where possible and never run across a
+    section heading once they hold a reasonable amount of text. Consecutive
+    chunks within a section share up to `overlap` characters of trailing
+    sentences so that statements spanning a boundary are seen whole at least
+    once. Each chunk is a dict with its index, character offsets into text
+    and the chunk text.
+    """
+    chunks = []
+    current: list[tuple[int, int, int]] = []
+
+    def emit(units):
+        start, end = units[0][0], units[-1][1]
+        chunks.append({
+            "index": len(chunks),
+            "start": start,
+            "end": end,
+            "text": text[start:end]
+        })
+
+    for unit in _units(text, chunk_size):
+        if current:
+            size = current[-1][1] - current[0][0]
+            if unit[2] == SECTION and size >= chunk_size // 4:
+                emit(current)
+                current = []
+            elif unit[1] - current[0][0] > chunk_size:
+                # Prefer cutting at the last paragraph break in the back half
+                cut = len(current)
+                for i in range(len(current) - 1, 0, -1):
+                    if current[i][0] - current[0][0] < chunk_size // 2:
+                        break
+                    if current[i][2]:
+                        cut = i
+                        break
+                emitted, rest = current[:cut], current[cut:]
+                if rest and unit[1] - rest[0][0] > chunk_size:
+                    emit(emitted)
+                    emitted, rest = rest, []
+                emit(emitted)
+                # Carry trailing sentences over, dropping them if they don't fit
+                tail_start = emitted[-1][1] - overlap
+                tail = [u for u in emitted if u[0] >= tail_start]
+                while tail and unit[1] - tail[0][0] > chunk_size:
+                    tail.pop(0)
+                current = tail + rest
+        current.append(unit)
+
+    if current:
+        emit(current)
+    return chunks
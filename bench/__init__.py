@@ -0,0 +1 @@
+"""Performance benchmarks: a fake LiteLLM proxy and a load harness for the app"""
@@ -0,0 +1,81 @@
+"""Compare two benchmark result files.
+
+    python -m bench.compare baseline.json candidate.json [--threshold 10]
+
+Prints each workload's throughput, latency and memory side by side with
+the relative change, and exits with status 1 if any metric regressed by
+more than --threshold percent (lower throughput, higher latency or RSS).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# (path within a workload's results, True if higher is better)
+METRICS = [
+    (("throughput_rps",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("ttft_ms", "p50"), False),
+    (("ttft_ms", "p95"), False),
+    (("errors",), False),
+    (("peak_rss_mb",), False),
+]
+
+
+def lookup(results: dict, path: tuple) -> float | None:
+    for key in path:
+        if not isinstance(results, dict):
+            return None
+        results = results.get(key)
+    return results
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """Print the comparison; returns the regressed metrics"""
+    regressions = []
+    workloads = list(dict.fromkeys([*baseline["workloads"], *candidate["workloads"]]))
+    print(f"{'metric':<30} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for workload in workloads:
+        before_all = baseline["workloads"].get(workload, {})
+        after_all = candidate["workloads"].get(workload, {})
+        for path, higher_is_better in METRICS:
+            before, after = lookup(before_all, path), lookup(after_all, path)
+            if before is None and after is None:
+                continue
+            name = f"{workload}.{'.'.join(path)}"
+            change = ""
+            if before and after is not None:
+                percent = (after - before) / before * 100
+                change = f"{percent:+.1f}%"
+                worse = -percent if higher_is_better else percent
+                if worse > threshold:
+                    regressions.append(name)
+                    change += " !"
+            elif not before and after and path == ("errors",):
+                regressions.append(name)
+                change = "new !"
+            print(f"{name:<30} {before if before is not None else '-':>12} {after if after is not None else '-':>12} {change:>9}")
+    return regressions
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.compare", description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    candidate = json.loads(Path(args.candidate).read_text(encoding="utf-8"))
+    print(f"baseline {baseline.get('revision')} ({baseline.get('timestamp')}), "
+          f"candidate {candidate.get('revision')} ({candidate.get('timestamp')})")
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Stand-in for the LiteLLM proxy: an OpenAI-compatible server with tunable behaviour.
+
+    python -m bench.fake_llm --port 4001 --latency 0.5 --tokens-per-second 50 --failure-rate 0.02
+
+Chat completions wait --latency seconds (plus jitter, and occasionally
+--tail-latency) before the first token, then produce tokens at
+--tokens-per-second, streamed or all at once. Extraction prompts get a
+valid entities/relations JSON built from the gene-like symbols in the
+text; other prompts get filler text. A fraction of requests fail with 500
+(--failure-rate) or 429 with Retry-After (--rate-limit-rate). Embeddings
+are deterministic hashed bag-of-words vectors, so identical texts always
+get identical vectors.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHAT_MODELS = ["nvidia-gpt-oss-120b", "fake-fast"]
+EMBEDDING_MODELS = ["fake-embed"]
+
+FILLER_WORDS = (
+    "the results indicate that expression of the protein is regulated by "
+    "binding to its partner which in turn modulates downstream signalling"
+).split()
+GENE_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]{1,7}\b")
+WORD_PATTERN = re.compile(r"\w+")
+
+# Behaviour, set from the command line
+settings = argparse.Namespace(
+    latency=0.5,
+    jitter=0.1,
+    tail_rate=0.0,
+    tail_latency=5.0,
+    tokens_per_second=50.0,
+    output_tokens=200,
+    failure_rate=0.0,
+    rate_limit_rate=0.0,
+    retry_after=1.0,
+    embedding_dim=384,
+    seed=None,
+)
+
+app = FastAPI(title="Fake LiteLLM proxy")
+
+
+def _prompt_text(messages: list[dict]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content or "")
+    return "\n".join(parts)
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _first_token_delay() -> float:
+    if settings.tail_rate and random.random() < settings.tail_rate:
+        return settings.tail_latency
+    return max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter))
+
+
+def _injected_error() -> JSONResponse | None:
+    roll = random.random()
+    if roll < settings.rate_limit_rate:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+            headers={"Retry-After": str(settings.retry_after)}
+        )
+    if roll < settings.rate_limit_rate + settings.failure_rate:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Injected failure", "type": "server_error"}}
+        )
+    return None
+
+
+def _completion_text(messages: list[dict], max_tokens: int) -> str:
+    """An extraction JSON for extraction prompts, filler text otherwise"""
+    system = messages[0].get("content", "") if messages else ""
+    user = messages[-1].get("content", "") if messages else ""
+    if "Extract all genes" in str(system):
+        symbols = list(dict.fromkeys(GENE_PATTERN.findall(str(user))))[:20]
+        entities = [
+            {"name": s, "type": "gene", "aliases": [], "description": f"{s} mentioned in text"}
+            for s in symbols
+        ]
+        relations = [
+            {
+                "source": a,
+                "target": b,
+                "type": "binding",
+                "description": f"{a} binds {b}",
+                "evidence": f"{a} ... {b}"
+            }
+            for a, b in zip(symbols, symbols[1:])
+        ]
+        return json.dumps({"entities": entities, "relations": relations}, indent=1)
+    count = min(max_tokens, settings.output_tokens)
+    return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(count))
+
+
+def _tokens(text: str) -> list[str]:
+    """Split text into stream pieces of about one token each"""
+    return re.findall(r"\s*\S{1,4}", text) or [text]
+
+
+@app.get("/v1/models")
+@app.get("/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "bench"}
+            for model in CHAT_MODELS + EMBEDDING_MODELS
+        ]
+    }
+
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    error = _injected_error()
+    if error is not None:
+        await asyncio.sleep(_first_token_delay() / 4)
+        return error
+
+    model = body.get("model", CHAT_MODELS[0])
+    messages = body.get("messages", [])
+    text = _completion_text(messages, body.get("max_tokens") or settings.output_tokens)
+    pieces = _tokens(text)
+    prompt_tokens = _count_tokens(_prompt_text(messages))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    delay = _first_token_delay()
+    per_token = 1 / settings.tokens_per_second if settings.tokens_per_second else 0.0
+
+    if not body.get("stream"):
+        await asyncio.sleep(delay + per_token * len(pieces))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(pieces),
+                "total_tokens": prompt_tokens + len(pieces)
+            }
+        }
+
+    def chunk(delta: dict, finish_reason: str | None = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def events():
+        await asyncio.sleep(delay)
+        yield chunk({"role": "assistant", "content": ""})
+        started = time.monotonic()
+        for i, piece in enumerate(pieces):
+            # Pace against the start so sleep overhead does not accumulate
+            wait = started + i * per_token - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield chunk({"content": piece})
+        yield chunk({}, "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(pieces),
+                "total_tokens": prompt_tokens + len(pieces)
+            }
+            yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def embed(text: str, dim: int) -> list[float]:
+    """Deterministic unit vector of the text's hashed word counts"""
+    vector = [0.0] * dim
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@app.post("/v1/embeddings")
+@app.post("/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    error = _injected_error()
+    if error is not None:
+        return error
+
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dim = body.get("dimensions") or settings.embedding_dim
+    await asyncio.sleep(max(0.0, settings.latency / 5))
+    tokens = sum(_count_tokens(str(text)) for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model", EMBEDDING_MODELS[0]),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": embed(str(text), dim)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Behaviour options, shared with the benchmark harness"""
+    parser.add_argument("--latency", type=float, default=settings.latency, help="Seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=settings.jitter, help="Uniform +/- jitter on the latency (seconds)")
+    parser.add_argument("--tail-rate", type=float, default=settings.tail_rate, help="Fraction of requests that take --tail-latency")
+    parser.add_argument("--tail-latency", type=float, default=settings.tail_latency, help="Latency of slow requests (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second, help="Generation speed (0 for instant)")
+    parser.add_argument("--output-tokens", type=int, default=settings.output_tokens, help="Length of non-extraction answers")
+    parser.add_argument("--failure-rate", type=float, default=settings.failure_rate, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=settings.rate_limit_rate, help="Fraction of requests failing with 429")
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after, help="Retry-After of 429 responses (seconds)")
+    parser.add_argument("--embedding-dim", type=int, default=settings.embedding_dim)
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible failures and latencies")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.fake_llm", description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4001)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    for name, value in vars(args).items():
+        setattr(settings, name, value)
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
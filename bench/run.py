@@ -0,0 +1,366 @@
+"""Benchmark harness: run the app against the fake LLM proxy and measure it.
+
+    python -m bench.run -o bench-results.json [--documents 8] [--questions 40] [--concurrency 8]
+
+Starts bench.fake_llm and the app (uvicorn, empty data and upload
+directories in a temporary folder), then runs these workloads one after
+the other:
+
+    upload      POST /api/documents/upload of distinct copies of a PDF
+    qa_ask      POST /api/qa/ask with distinct questions over all documents
+    qa_stream   POST /api/qa/ask_stream, also timing the first answer token
+    search      GET /api/search with distinct queries over all documents
+    extraction  POST /api/extraction/genes, one document per request
+
+For each it reports throughput, latency percentiles, errors and the peak
+RSS of the app (PDF parser processes included). Results are written as
+JSON; compare two runs with bench.compare. Options not listed here are
+passed to the fake proxy (see python -m bench.fake_llm --help).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from app.utils import metrics
+from bench import fake_llm
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PDF = ROOT / "app" / "pnas.202003193.pdf"
+
+QUESTIONS = [
+    "What is the main finding of the study",
+    "Which genes are discussed",
+    "What methods were used",
+    "Which proteins interact with each other",
+    "What are the limitations of the study",
+    "How was the experiment controlled",
+    "What signalling pathways are involved",
+    "Which cell types were studied",
+]
+
+# How often the app's memory is sampled (seconds)
+RSS_INTERVAL = 0.1
+STARTUP_TIMEOUT = 60.0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss(pid: int) -> int | None:
+    """Resident memory (bytes) of a process and its descendants, or None without /proc"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            if current == pid:
+                return None
+    return total
+
+
+class RssMonitor:
+    """Samples the app's memory in the background, keeping the peak per workload"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak = 0
+        self.workload_peak = 0
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            rss = process_tree_rss(self.pid)
+            if rss is None:
+                return
+            self.peak = max(self.peak, rss)
+            self.workload_peak = max(self.workload_peak, rss)
+            await asyncio.sleep(RSS_INTERVAL)
+
+    def start(self):
+        self._task = asyncio.create_task(self._sample())
+
+    def reset_workload(self):
+        self.workload_peak = process_tree_rss(self.pid) or 0
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+def summarize(latencies: list[float]) -> dict:
+    """Percentiles in milliseconds, ranked the same way as the app's own latency stats"""
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    def percentile(fraction):
+        return metrics.percentile(latencies, fraction) if latencies else None
+
+    return {
+        "p50": ms(percentile(0.5)),
+        "p95": ms(percentile(0.95)),
+        "p99": ms(percentile(0.99)),
+        "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max": ms(max(latencies, default=None))
+    }
+
+
+async def run_workload(name: str, calls: list, concurrency: int, monitor: RssMonitor) -> tuple[dict, list]:
+    """Run calls (async functions returning (result, ttft)) with bounded concurrency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, ttfts, results, errors = [], [], [], []
+    monitor.reset_workload()
+
+    async def run(call):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result, ttft = await call()
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}"[:200])
+                return
+            latencies.append(time.monotonic() - started)
+            if ttft is not None:
+                ttfts.append(ttft)
+            results.append(result)
+
+    started = time.monotonic()
+    await asyncio.gather(*(run(call) for call in calls))
+    duration = time.monotonic() - started
+
+    stats = {
+        "requests": len(calls),
+        "succeeded": len(latencies),
+        "errors": len(errors),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 3) if duration else None,
+        "latency_ms": summarize(latencies),
+        "peak_rss_mb": round(monitor.workload_peak / 2**20, 1) if monitor.workload_peak else None
+    }
+    if ttfts:
+        stats["ttft_ms"] = summarize(ttfts)
+    if errors:
+        stats["error_samples"] = sorted(set(errors))[:5]
+    print(
+        f"{name:<11} {stats['succeeded']}/{stats['requests']} ok in {stats['duration_s']}s, "
+        f"{stats['throughput_rps']} req/s, p50 {stats['latency_ms']['p50']}ms, "
+        f"p99 {stats['latency_ms']['p99']}ms",
+        file=sys.stderr
+    )
+    return stats, results
+
+
+def checked(response: httpx.Response) -> dict:
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:120]}")
+    return response.json()
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} during startup")
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {STARTUP_TIMEOUT}s")
+
+
+async def run_benchmark(args, app_url: str, app_process: subprocess.Popen) -> dict:
+    monitor = RssMonitor(app_process.pid)
+    monitor.start()
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    workloads = {}
+    async with httpx.AsyncClient(base_url=app_url, timeout=timeout, limits=limits) as client:
+        pdf = Path(args.pdf).read_bytes()
+
+        def upload(i: int):
+            async def call():
+                # Distinct bytes so uploads are not deduplicated by content hash
+                content = pdf + f"\n%bench-{i}-{time.time_ns()}\n".encode()
+                files = {"file": (f"bench-{i}.pdf", content, "application/pdf")}
+                data = checked(await client.post("/api/documents/upload", files=files))
+                return data["document"]["id"], None
+            return call
+
+        workloads["upload"], doc_ids = await run_workload(
+            "upload", [upload(i) for i in range(args.documents)], args.concurrency, monitor
+        )
+        if not doc_ids:
+            raise RuntimeError("No document was uploaded; nothing to query")
+
+        def question(i: int) -> dict:
+            # Distinct questions so identical requests are not coalesced
+            return {"question": f"{QUESTIONS[i % len(QUESTIONS)]} (variant {i})?", "model": args.model}
+
+        def ask(i: int):
+            async def call():
+                checked(await client.post("/api/qa/ask", json=question(i)))
+                return None, None
+            return call
+
+        workloads["qa_ask"], _ = await run_workload(
+            "qa_ask", [ask(i) for i in range(args.questions)], args.concurrency, monitor
+        )
+
+        def ask_stream(i: int):
+            async def call():
+                started = time.monotonic()
+                ttft = None
+                async with client.stream("POST", "/api/qa/ask_stream", json=question(args.questions + i)) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        checked(response)
+                    async for chunk in response.aiter_bytes():
+                        if chunk and ttft is None:
+                            ttft = time.monotonic() - started
+                return None, ttft
+            return call
+
+        workloads["qa_stream"], _ = await run_workload(
+            "qa_stream", [ask_stream(i) for i in range(args.questions)], args.concurrency, monitor
+        )
+
+        def search(i: int):
+            async def call():
+                params = {"q": question(i)["question"]}
+                checked(await client.get("/api/search", params=params))
+                return None, None
+            return call
+
+        workloads["search"], _ = await run_workload(
+            "search", [search(i) for i in range(args.questions)], args.concurrency, monitor
+        )
+
+        def extract(doc_id: str):
+            async def call():
+                body = {"document_ids": [doc_id], "model": args.model}
+                checked(await client.post("/api/extraction/genes", json=body))
+                return None, None
+            return call
+
+        workloads["extraction"], _ = await run_workload(
+            "extraction", [extract(doc_id) for doc_id in doc_ids], args.concurrency, monitor
+        )
+
+        try:
+            server_stats = checked(await client.get("/api/models/stats"))
+        except Exception:
+            server_stats = None
+
+    monitor.stop()
+    return {
+        "workloads": workloads,
+        "peak_rss_mb": round(monitor.peak / 2**20, 1) if monitor.peak else None,
+        "server_stats": server_stats
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description="Benchmark the app against a fake LLM proxy")
+    parser.add_argument("-o", "--output", default="bench-results.json", help="Where to write the JSON results")
+    parser.add_argument("--documents", type=int, default=8, help="PDFs uploaded (and extracted)")
+    parser.add_argument("--questions", type=int, default=40, help="Questions per Q&A workload")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests per workload")
+    parser.add_argument("--pdf", default=str(DEFAULT_PDF), help="PDF uploaded by the upload workload")
+    parser.add_argument("--model", default=None, help="Model requested from the app (default: the app's)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout (seconds)")
+    fake_llm.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fake_options = []
+    for action in parser._actions:
+        if action.dest in vars(fake_llm.settings) and getattr(args, action.dest) is not None:
+            fake_options += [action.option_strings[0], str(getattr(args, action.dest))]
+
+    fake_port, app_port = free_port(), free_port()
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="biobuilder-bench-") as workdir:
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+            "BIOBUILDER_DATA_DIR": str(Path(workdir) / "data"),
+            "BIOBUILDER_UPLOAD_DIR": str(Path(workdir) / "uploads"),
+            "BIOBUILDER_LOG_DIR": str(Path(workdir) / "logs"),
+            "LITELLM_BASE_URL": f"http://127.0.0.1:{fake_port}",
+            "BIOBUILDER_EMBEDDING_MODEL": fake_llm.EMBEDDING_MODELS[0]
+        }
+        try:
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "bench.fake_llm", "--port", str(fake_port), *fake_options],
+                cwd=ROOT, env=env
+            ))
+            app_process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+                cwd=workdir, env=env
+            )
+            processes.append(app_process)
+
+            async def bench():
+                async with httpx.AsyncClient() as client:
+                    await wait_ready(client, f"http://127.0.0.1:{fake_port}/v1/models", processes[0])
+                    await wait_ready(client, f"http://127.0.0.1:{app_port}/api/documents", app_process)
+                return await run_benchmark(args, f"http://127.0.0.1:{app_port}", app_process)
+
+            measured = asyncio.run(bench())
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        **measured
+    }
+    Path(args.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Shared test setup: an empty data directory and a deterministic embedder"""
+import hashlib
+import os
+import re
+import tempfile
+
+# app.config creates its directories at import, so point them away from the checkout first
+_root = tempfile.mkdtemp(prefix="biobuilder-tests-")
+for name in ("DATA", "UPLOAD", "LOG"):
+    os.environ.setdefault(f"BIOBUILDER_{name}_DIR", os.path.join(_root, name.lower()))
+
+import numpy as np
+import pytest
+from app.services import document_store, llm_client, passage_index, vector_index
+
+EMBEDDING_DIM = 64
+
+
+def hash_embedding(text: str) -> list[float]:
+    """Bag of hashed words: texts sharing words get similar vectors"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = hashlib.sha256(word.encode("utf-8")).digest()
+        vector[digest[0] % EMBEDDING_DIM] += 1.0 if digest[1] % 2 else -1.0
+    return vector.tolist()
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """Replace the proxy's embeddings endpoint with hash_embedding; yields the list of embedded batches"""
+    calls = []
+
+    async def embed(texts, model=None, priority=None):
+        calls.append(list(texts))
+        return [hash_embedding(text) for text in texts]
+
+    monkeypatch.setattr(llm_client, "embed", embed)
+    return calls
+
+
+@pytest.fixture
+def vectors(tmp_path, monkeypatch, embedder):
+    """An empty vector index for a test embedding model"""
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_DIR", tmp_path / "vectors")
+    monkeypatch.setattr(vector_index, "EMBEDDING_MODEL", "test-embedding")
+    monkeypatch.setattr(vector_index, "_indexes", {})
+    return vector_index.get_index()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """An empty in-memory document store"""
+    monkeypatch.setattr(document_store, "_store", document_store.MemoryDocumentStore())
+    monkeypatch.setattr(passage_index, "_indexes", {})
+    return document_store.get_store()
@@ -0,0 +1,46 @@
+"""Locating evidence quotes in document text"""
+from app.services import evidence_grounding
+from app.services.evidence_grounding import EvidenceIndex
+
+TEXT = (
+    "Page one.\nIn irradiated cells, p53 is stabi-\nlized because ATM phosphorylates\n"
+    "Ser15, blocking the interaction with MDM2.\nPage two starts here. Knockdown of "
+    "CHEK2 abolished the ﬁnal checkpoint response in all tested lines."
+)
+PAGE_STARTS = [0, TEXT.index("Page two")]
+
+
+def test_exact_quote_across_line_breaks_and_hyphenation():
+    index = EvidenceIndex(TEXT, PAGE_STARTS)
+    span = index.locate("p53 is stabilized because ATM phosphorylates Ser15")
+    assert span["score"] == 1.0 and span["page"] == 1
+    assert TEXT[span["start"]:span["end"]] == "p53 is stabi-\nlized because ATM phosphorylates\nSer15"
+
+
+def test_ligatures_and_elided_quotes():
+    index = EvidenceIndex(TEXT, PAGE_STARTS)
+    span = index.locate("Knockdown of CHEK2 abolished the final checkpoint response")
+    assert span["score"] == 1.0 and span["page"] == 2
+    span = index.locate("ATM phosphorylates Ser15 ... the interaction with MDM2")
+    assert TEXT[span["start"]:span["end"]].startswith("ATM") and TEXT[span["start"]:span["end"]].endswith("MDM2")
+
+
+def test_approximate_and_missing_quotes():
+    index = EvidenceIndex(TEXT)
+    span = index.locate("Knockdown of CHEK2 abolished the final checkpoint responses in every tested line")
+    assert span is not None and 0 < span["score"] < 1.0 and span["page"] is None
+    assert index.locate("BRCA1 repairs double strand breaks in zebrafish embryos") is None
+
+
+def test_ground_relations_marks_each_relation():
+    relations = [
+        {"source": "ATM", "target": "TP53", "evidence": "ATM phosphorylates Ser15"},
+        {"source": "BRCA1", "target": "ATM", "evidence": "BRCA1 binds ATM at the fork"},
+        {"source": "CHEK2", "target": "TP53"},
+    ]
+    grounded = evidence_grounding.ground_relations(None, TEXT, relations)
+    assert [r["grounded"] for r in grounded] == [True, False, False]
+    assert grounded[0]["evidence_span"]["doc_id"] is None
+    assert "evidence_span" not in relations[0]
+    # Text that is not a stored document is never cached
+    assert None not in evidence_grounding._indexes
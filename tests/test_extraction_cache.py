@@ -0,0 +1,60 @@
+"""Memory and disk tiers of the extraction cache"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+import pytest
+from app.services import extraction_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE_DB_PATH", tmp_path / "cache.db")
+    monkeypatch.setattr(extraction_cache, "_local", threading.local())
+    monkeypatch.setattr(extraction_cache, "_memory", OrderedDict())
+    monkeypatch.setattr(extraction_cache, "_touched", {})
+    monkeypatch.setattr(extraction_cache, "_stats", dict.fromkeys(extraction_cache._stats, 0))
+    return extraction_cache
+
+
+def result(n: int) -> dict:
+    return {"entities": [{"name": f"GENE{n}"}], "relations": []}
+
+
+def test_disk_tier_serves_evicted_memory_entries(cache):
+    async def scenario():
+        await cache.put("a", result(1))
+        await cache.put("a", result(2))
+        cache._memory.clear()
+        assert await cache.get("a") == result(2)
+        assert await cache.get("a") == result(2)
+        assert await cache.get("b") is None
+
+    asyncio.run(scenario())
+    stats = cache.get_stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["disk_entries"] == 1
+    assert stats["disk_bytes"] == len(json.dumps(result(2)))
+
+
+def test_disk_tier_evicts_least_recently_used(cache, monkeypatch):
+    size = len(json.dumps(result(1)))
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE_DISK_BYTES", int(3.5 * size))
+
+    async def scenario():
+        for n in (1, 2, 3):
+            await cache.put(f"k{n}", result(n))
+        cache._memory.clear()
+        # Reading k1 makes k2 the least recently used entry
+        await cache.get("k1")
+        cache._memory.clear()
+        await cache.put("k4", result(4))
+        return [await cache.get(f"k{n}") is not None for n in (1, 2, 3, 4)]
+
+    assert asyncio.run(scenario()) == [True, False, True, True]
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert (stats["disk_entries"], stats["disk_bytes"]) == (3, 3 * size)
+
+    asyncio.run(cache.clear())
+    assert (cache.get_stats()["disk_entries"], cache.get_stats()["disk_bytes"]) == (0, 0)
@@ -0,0 +1,81 @@
+"""Running, cancelling and recovering background jobs"""
+import asyncio
+import socket
+import time
+import pytest
+from app.services import job_queue
+
+
+@pytest.fixture
+def jobs(store, monkeypatch):
+    """A job queue with no workers yet, backed by the in-memory store"""
+    monkeypatch.setattr(job_queue, "_runners", {})
+    monkeypatch.setattr(job_queue, "_queue", None)
+    monkeypatch.setattr(job_queue, "_workers", [])
+    monkeypatch.setattr(job_queue, "_running", {})
+    monkeypatch.setattr(job_queue, "_cancel_requested", set())
+    monkeypatch.setattr(job_queue, "_done_events", {})
+
+    async def count(params, progress):
+        for i in range(params["n"]):
+            progress(i + 1, params["n"], {"partial": i + 1})
+            await asyncio.sleep(params.get("delay", 0))
+        if params.get("fail"):
+            raise RuntimeError("runner failed")
+        return {"counted": params["n"]}
+
+    job_queue.register("count", count)
+    return store
+
+
+def test_jobs_run_to_completion_or_failure(jobs):
+    async def scenario():
+        done = job_queue.submit("count", {"n": 3})
+        failed = job_queue.submit("count", {"n": 1, "fail": True})
+        records = [await job_queue.wait(job["id"], timeout=1) for job in (done, failed)]
+        await job_queue.shutdown()
+        return records
+
+    done, failed = asyncio.run(scenario())
+    assert (done["status"], done["done"], done["total"], done["result"]) == ("completed", 3, 3, {"counted": 3})
+    assert (failed["status"], failed["error"]) == ("failed", "runner failed")
+    with pytest.raises(ValueError):
+        job_queue.submit("unknown", {})
+
+
+def test_cancelled_job_frees_its_worker(jobs, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_WORKERS", 1)
+
+    async def scenario():
+        slow = job_queue.submit("count", {"n": 100, "delay": 0.01})
+        queued = job_queue.submit("count", {"n": 1})
+        await asyncio.sleep(0.03)
+        assert job_queue.get_job(slow["id"])["status"] == "running"
+        assert job_queue.cancel(slow["id"])
+        records = [await job_queue.wait(job["id"], timeout=1) for job in (slow, queued)]
+        await job_queue.shutdown()
+        return records
+
+    slow, queued = asyncio.run(scenario())
+    assert slow["status"] == "cancelled" and slow["result"]["partial"] < 100
+    assert queued["status"] == "completed"
+    assert not job_queue.cancel(queued["id"])
+
+
+def test_start_recovers_persisted_jobs(jobs):
+    now = time.time()
+    base = {"kind": "count", "params": {"n": 1}, "done": 0, "total": 0, "result": None, "error": None,
+            "created_at": now, "updated_at": now}
+    jobs.save_job({**base, "id": "queued", "status": "queued", "worker": None})
+    jobs.save_job({**base, "id": "dead", "status": "running", "worker": f"{socket.gethostname()}:2147483646"})
+    jobs.save_job({**base, "id": "other-host", "status": "running", "worker": "elsewhere:1"})
+
+    async def scenario():
+        job_queue.start()
+        await asyncio.sleep(0.01)
+        await job_queue.shutdown()
+
+    asyncio.run(scenario())
+    assert job_queue.get_job("queued")["status"] == "completed"
+    assert job_queue.get_job("dead")["status"] == "failed"
+    assert job_queue.get_job("other-host")["status"] == "running"
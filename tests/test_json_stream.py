@@ -0,0 +1,40 @@
+"""Incremental parsing of streamed extraction output"""
+from app.utils.json_stream import IncrementalArrayParser
+
+OUTPUT = (
+    'Here is the result:\n```json\n{"entities": [{"name": "TP53", "type": "gene"}, '
+    '{"name": "MDM2 {E3}", "type": "protein"}], "relations": [{"source": "TP53", '
+    '"target": "MDM2", "type": "binds", "evidence": "TP53 \\"binds\\" MDM2"}]}\n```'
+)
+
+
+def feed(text: str, size: int) -> tuple[IncrementalArrayParser, list]:
+    parser = IncrementalArrayParser()
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+    return parser, events
+
+
+def test_objects_complete_regardless_of_piece_boundaries():
+    for size in (1, 7, len(OUTPUT)):
+        parser, events = feed(OUTPUT, size)
+        assert [key for key, _ in events] == ["entities", "entities", "relations"]
+        assert parser.complete
+        assert parser.results["entities"][1]["name"] == "MDM2 {E3}"
+        assert parser.results["relations"][0]["evidence"] == 'TP53 "binds" MDM2'
+
+
+def test_truncated_stream_keeps_closed_objects():
+    cut = OUTPUT.index('"relations"') + 30
+    parser, events = feed(OUTPUT[:cut], 5)
+    assert not parser.complete
+    assert [obj["name"] for obj in parser.results["entities"]] == ["TP53", "MDM2 {E3}"]
+    assert parser.results["relations"] == []
+    assert len(events) == 2
+
+
+def test_malformed_objects_and_other_keys_are_skipped():
+    parser, _ = feed('{"notes": [{"name": "x"}], "entities": [{"name": "TP53",}, {"name": "ATM"}]}', 3)
+    assert parser.complete
+    assert parser.results == {"entities": [{"name": "ATM"}], "relations": []}
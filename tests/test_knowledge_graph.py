@@ -0,0 +1,49 @@
+"""Path queries over the knowledge graph"""
+import threading
+import pytest
+from app.services import knowledge_graph
+
+RELATIONS = [
+    ("TP53", "MDM2", "binds"),
+    ("MDM2", "TP53", "inhibits"),
+    ("ATM", "TP53", "activates"),
+    ("ATM", "CHEK2", "activates"),
+    ("CHEK2", "TP53", "activates"),
+    ("BRCA1", "ATM", "binds"),
+]
+
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge_graph, "KNOWLEDGE_GRAPH_DB_PATH", tmp_path / "graph.db")
+    monkeypatch.setattr(knowledge_graph, "_local", threading.local())
+    knowledge_graph.add_document("doc-a", {
+        "relations": [{"source": s, "target": t, "type": r} for s, t, r in RELATIONS]
+    })
+
+
+def route(path):
+    return [(step["from"], step["to"]) for step in path]
+
+
+def test_paths_shortest_first(graph):
+    paths = knowledge_graph.find_paths("BRCA1", "TP53", max_hops=3, directed=True)
+    assert [route(p) for p in paths] == [
+        [("brca1", "atm"), ("atm", "tp53")],
+        [("brca1", "atm"), ("atm", "chek2"), ("chek2", "tp53")],
+    ]
+    assert knowledge_graph.find_paths("BRCA1", "TP53", max_hops=1, directed=True) == []
+
+
+def test_undirected_paths_follow_edges_backwards(graph):
+    assert knowledge_graph.find_paths("TP53", "BRCA1", max_hops=3, directed=True) == []
+    paths = knowledge_graph.find_paths("TP53", "BRCA1", max_hops=3)
+    assert route(paths[0]) == [("tp53", "atm"), ("atm", "brca1")]
+    assert [step["direction"] for step in paths[0]] == ["in", "in"]
+    assert all(len(p) <= 3 and len({s["to"] for s in p}) == len(p) for p in paths)
+    assert len(knowledge_graph.find_paths("TP53", "BRCA1", max_hops=3, limit=1)) == 1
+
+
+def test_path_search_is_capped(graph, monkeypatch):
+    monkeypatch.setattr(knowledge_graph, "KNOWLEDGE_GRAPH_PATH_MAX_NODES", 1)
+    assert knowledge_graph.find_paths("BRCA1", "TP53", max_hops=3, directed=True) == []
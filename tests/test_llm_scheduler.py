@@ -0,0 +1,209 @@
+"""Admission, retries, lease release and hedging of LLM requests"""
+import asyncio
+import httpx
+import openai
+import pytest
+from app.services import llm_client, llm_scheduler
+
+MODEL = "test-model"
+
+
+@pytest.fixture
+def lanes(monkeypatch):
+    """Fresh lanes admitting one request at a time, with instant retries"""
+    monkeypatch.setattr(llm_scheduler, "_lanes", {})
+    monkeypatch.setattr(llm_scheduler, "LLM_DEFAULT_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_scheduler, "LLM_RETRY_BASE_DELAY", 0.001)
+
+
+def in_flight() -> int:
+    return llm_scheduler.get_stats()[MODEL]["in_flight"]
+
+
+def connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://proxy/chat/completions"))
+
+
+def test_interactive_requests_are_admitted_first(lanes):
+    async def scenario():
+        lease = await llm_scheduler.acquire(MODEL, llm_scheduler.BATCH)
+        order = []
+
+        async def wait(priority, name):
+            admitted = await llm_scheduler.acquire(MODEL, priority)
+            order.append(name)
+            admitted.release()
+
+        waiters = [
+            asyncio.ensure_future(wait(llm_scheduler.BATCH, "batch")),
+            asyncio.ensure_future(wait(llm_scheduler.INTERACTIVE, "interactive")),
+        ]
+        await asyncio.sleep(0)
+        lease.release()
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "batch"]
+
+
+def test_interactive_wait_times_out(lanes, monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_INTERACTIVE_QUEUE_TIMEOUT", 0.01)
+
+    async def scenario():
+        lease = await llm_scheduler.acquire(MODEL)
+        with pytest.raises(llm_scheduler.LLMOverloadedError):
+            await llm_scheduler.acquire(MODEL)
+        assert in_flight() == 1
+        lease.release()
+        # The timed out request left no slot or queue entry behind
+        (await llm_scheduler.acquire(MODEL)).release()
+
+    asyncio.run(scenario())
+    assert in_flight() == 0
+    assert llm_scheduler.get_stats()[MODEL]["queued"] == {"interactive": 0, "batch": 0}
+
+
+def test_cancelled_waiter_leaves_the_queue(lanes):
+    async def scenario():
+        lease = await llm_scheduler.acquire(MODEL)
+        waiter = asyncio.ensure_future(llm_scheduler.acquire(MODEL, llm_scheduler.BATCH))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        lease.release()
+        assert in_flight() == 0
+        (await llm_scheduler.acquire(MODEL)).release()
+
+    asyncio.run(scenario())
+    assert in_flight() == 0
+
+
+def test_call_retries_transient_errors_and_releases_every_lease(lanes):
+    attempts = []
+
+    async def request():
+        attempts.append(in_flight())
+        if len(attempts) < 3:
+            raise connection_error()
+        return "ok"
+
+    assert asyncio.run(llm_scheduler.call(MODEL, request)) == "ok"
+    assert attempts == [1, 1, 1]
+    assert in_flight() == 0
+    assert llm_scheduler.get_stats()[MODEL]["retries"] == 2
+
+
+def test_call_releases_lease_on_failure_and_cancel(lanes):
+    async def fail():
+        raise ValueError("not retryable")
+
+    with pytest.raises(ValueError):
+        asyncio.run(llm_scheduler.call(MODEL, fail))
+    assert in_flight() == 0
+
+    async def scenario():
+        task = asyncio.ensure_future(llm_scheduler.call(MODEL, lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert in_flight() == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert in_flight() == 0
+
+
+class StubStream:
+    """Async-iterable stand-in for a streamed chat completion"""
+
+    def __init__(self, pieces):
+        self.chunks = [
+            type("Chunk", (), {"usage": None, "choices": [type("Choice", (), {"delta": type("Delta", (), {"content": p})})]})
+            for p in pieces
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def stub_client(monkeypatch, create):
+    completions = type("Completions", (), {"create": staticmethod(create)})
+    client = type("Client", (), {"chat": type("Chat", (), {"completions": completions})})
+    monkeypatch.setattr(llm_client, "get_client", lambda: client)
+
+
+def test_stream_releases_lease_when_cancelled_while_opening(lanes, monkeypatch):
+    async def create(**kwargs):
+        await asyncio.sleep(10)
+
+    stub_client(monkeypatch, create)
+
+    async def scenario():
+        stream = llm_client.stream_chat_completion([{"role": "user", "content": "hi"}], model=MODEL)
+        task = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.01)
+        assert in_flight() == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert in_flight() == 0
+
+
+def test_stream_retries_opening_and_releases_lease_at_end(lanes, monkeypatch):
+    attempts = []
+
+    async def create(**kwargs):
+        attempts.append(in_flight())
+        if len(attempts) == 1:
+            raise connection_error()
+        return StubStream(["TP53 ", "binds MDM2"])
+
+    stub_client(monkeypatch, create)
+
+    async def scenario():
+        return [piece async for piece in llm_client.stream_chat_completion(
+            [{"role": "user", "content": "hi"}], model=MODEL
+        )]
+
+    assert asyncio.run(scenario()) == ["TP53 ", "binds MDM2"]
+    assert attempts == [1, 1]
+    assert in_flight() == 0
+
+
+def test_slow_request_is_hedged_to_fallback(lanes, monkeypatch):
+    monkeypatch.setattr(llm_client, "_latencies", {})
+    monkeypatch.setattr(llm_client, "_hedges", {})
+    monkeypatch.setattr(llm_client, "LLM_HEDGE_MIN_DELAY", 0.01)
+    monkeypatch.setattr(llm_client, "LLM_FALLBACK_MODELS", {MODEL: "fallback-model"})
+    for _ in range(llm_client.LLM_HEDGE_MIN_SAMPLES):
+        llm_client.record_latency(MODEL, 0.01)
+    cancelled = []
+
+    async def send(target):
+        if target == MODEL:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(target)
+                raise
+        return target
+
+    assert asyncio.run(llm_client._hedged(MODEL, send)) == "fallback-model"
+    assert cancelled == [MODEL]
+    stats = llm_client.get_latency_stats()[MODEL]
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+    # Too few samples: no hedge
+    assert asyncio.run(llm_client._hedged("fallback-model", lambda target: asyncio.sleep(0, target))) == "fallback-model"
+    assert "fallback-model" not in llm_client._hedges
@@ -0,0 +1,25 @@
+"""Relation type matching of targeted extraction"""
+import pytest
+from app.services.bio_extractor import relation_type_matches
+
+
+@pytest.mark.parametrize("rel_type, target", [
+    ("phosphorylates", "phosphorylation"),
+    ("phosphorylated", "Phosphorylation"),
+    ("binds", "binding"),
+    ("degrades", "degradation"),
+    ("interacts", "interaction"),
+    ("binds_to", "binds to"),
+])
+def test_word_forms_match(rel_type, target):
+    assert relation_type_matches(rel_type, [target])
+
+
+@pytest.mark.parametrize("rel_type, target", [
+    ("interacts", "interferes"),
+    ("inhibits", "activates"),
+    ("regulates", "upregulates"),
+    ("binds", ""),
+])
+def test_other_types_do_not_match(rel_type, target):
+    assert not relation_type_matches(rel_type, [target])
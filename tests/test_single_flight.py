@@ -0,0 +1,75 @@
+"""Sharing and cancellation of coalesced calls"""
+import asyncio
+import pytest
+from app.utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.run("key", call) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["result"] * 3
+    assert len(calls) == 1
+    assert flights.get_stats() == {"upstream_calls": 1, "saved_calls": 2, "in_flight": 0, "waiters": 0}
+
+
+def test_call_survives_one_cancelled_caller():
+    flights = SingleFlight()
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.run("key", lambda: asyncio.sleep(0.02, "result")))
+        second = asyncio.ensure_future(flights.run("key", lambda: asyncio.sleep(0.02, "other")))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "result"
+
+
+def test_call_is_cancelled_with_its_last_caller():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        callers = [asyncio.ensure_future(flights.run("key", call)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert flights.get_stats()["in_flight"] == 0
+        # A later caller starts afresh rather than joining the cancelled call
+        return await flights.run("key", lambda: asyncio.sleep(0, "again"))
+
+    assert asyncio.run(scenario()) == "again"
+    assert cancelled == [True]
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("proxy down")
+
+    async def scenario():
+        return await asyncio.gather(*(flights.run("key", call) for _ in range(2)), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(scenario())] == ["proxy down", "proxy down"]
@@ -0,0 +1,43 @@
+"""Chunk boundaries, sizes and overlap of split_into_chunks"""
+from app.utils.text_chunker import split_into_chunks
+
+SENTENCES = [f"Gene{i} regulates Gene{i + 1} in cultured cells." for i in range(40)]
+TEXT = (
+    "Introduction\n\n" + " ".join(SENTENCES[:15]) + "\n\n" + " ".join(SENTENCES[15:25])
+    + "\n\nResults\n\n" + " ".join(SENTENCES[25:])
+)
+
+
+def test_chunks_cover_the_text_within_size():
+    chunks = split_into_chunks(TEXT, 400, overlap=100)
+    assert [c["index"] for c in chunks] == list(range(len(chunks)))
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(TEXT)
+    for chunk in chunks:
+        assert chunk["text"] == TEXT[chunk["start"]:chunk["end"]]
+        assert len(chunk["text"]) <= 400
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Gaps are only the whitespace between units; overlap stays within bounds
+        assert not TEXT[previous["end"]:chunk["start"]].strip()
+        assert previous["end"] - chunk["start"] <= 100
+
+
+def test_overlap_repeats_whole_sentences():
+    chunks = split_into_chunks(TEXT, 400, overlap=100)
+    overlapping = [(a, b) for a, b in zip(chunks, chunks[1:]) if b["start"] < a["end"]]
+    assert overlapping
+    for previous, chunk in overlapping:
+        assert TEXT[chunk["start"]:previous["end"]].endswith(" in cultured cells.")
+        assert TEXT[chunk["start"]:].startswith("Gene")
+
+
+def test_sections_start_new_chunks():
+    chunks = split_into_chunks(TEXT, 2000)
+    assert [c["text"].split("\n", 1)[0] for c in chunks] == ["Introduction", "Results"]
+    assert split_into_chunks("", 100) == []
+
+
+def test_overlong_sentence_is_split_at_whitespace():
+    text = " ".join(["word"] * 100)
+    chunks = split_into_chunks(text, 50)
+    assert all(len(c["text"]) <= 50 for c in chunks)
+    assert "".join(c["text"] for c in chunks).replace(" ", "") == text.replace(" ", "")
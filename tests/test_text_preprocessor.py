@@ -0,0 +1,50 @@
+"""Cleaning of per-page document text"""
+from app.services.text_preprocessor import preprocess_pages
+
+GENES = ["TP53", "MDM2", "ATM", "CHEK2", "BRCA1", "RAD51", "PTEN", "AKT1", "MYC", "KRAS", "EGFR", "ERBB2"]
+
+
+def page(n: int, lines: list[str]) -> str:
+    """A page with a running header and footer and a line-number column"""
+    numbered = [f"{n * 100 + i} {line}" for i, line in enumerate(lines, 1)]
+    return "\n".join(["Journal of Testing 12 (2024)", *numbered, f"Page {n} of 3"])
+
+
+PAGES = [
+    page(1, ["Introduction"] + [f"{g} was studied in sample {i}." for i, g in enumerate(GENES[:8])]
+         + ["ATM phos-", "phorylates CHEK2 after damage."]),
+    page(2, ["Results"] + [f"{g} levels rose in line {i}." for i, g in enumerate(GENES)]),
+    page(3, [f"{g} bound its partner {i}." for i, g in enumerate(GENES[:6])]
+         + ["References"] + [f"{i}. Author {i}. A paper. {2000 + i}." for i in range(1, 7)]),
+]
+
+
+def test_boilerplate_and_line_numbers_are_removed():
+    result = preprocess_pages(PAGES)
+    text = result["text"]
+    assert "Journal of Testing" not in text and "of 3" not in text
+    assert text.startswith("Introduction\nTP53 was studied in sample 0.")
+    assert result["removed_lines"]["boilerplate"] == 6
+    assert result["removed_lines"]["line_numbers"] == 37
+
+
+def test_hyphenation_is_repaired():
+    assert "ATM\nphosphorylates CHEK2 after damage." in preprocess_pages(PAGES)["text"]
+
+
+def test_sections_and_pages_are_tracked():
+    result = preprocess_pages(PAGES)
+    text = result["text"]
+    assert "References" not in text and "Author 1" not in text
+    assert "references" in result["dropped_sections"]
+    assert text.endswith("RAD51 bound its partner 5.")
+    assert [s["name"] for s in result["sections"]] == ["introduction", "results"]
+    assert text[result["sections"][1]["start"]:].startswith("Results")
+    assert [text[start:].split("\n", 1)[0] for start in result["page_starts"]] == [
+        "Introduction", "Results", "TP53 bound its partner 0."
+    ]
+
+
+def test_nothing_is_dropped_when_disabled():
+    text = preprocess_pages(PAGES, drop_sections=())["text"]
+    assert "References" in text and "Author 6" in text
@@ -0,0 +1,181 @@
+"""Vector index and /api/search, with embeddings from the hash embedder in conftest"""
+import asyncio
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routers import search as search_router
+from app.services import document_processor, llm_client, vector_index
+from tests.conftest import hash_embedding
+
+PASSAGES = {
+    "doc-a": ["TP53 binds MDM2 in the nucleus", "MDM2 ubiquitinates TP53 for degradation"],
+    "doc-b": ["BRCA1 repairs DNA double strand breaks", "Zebrafish embryos were raised at 28 degrees"],
+    "doc-c": ["Kinase assays used recombinant ATM", "ATM phosphorylates MDM2 after DNA damage"],
+}
+
+
+def unit(text: str) -> np.ndarray:
+    return vector_index._normalize([hash_embedding(text)])[0]
+
+
+def add_documents(index, doc_ids=PASSAGES):
+    for doc_id in doc_ids:
+        passages = PASSAGES[doc_id]
+        spans = [(i * 100, i * 100 + len(p)) for i, p in enumerate(passages)]
+        index.add(doc_id, spans, vector_index._normalize([hash_embedding(p) for p in passages]))
+
+
+def test_search_ranks_closest_passage_first(vectors):
+    add_documents(vectors)
+    results = vectors.search(unit("BRCA1 repairs DNA double strand breaks"), top_k=3)
+    assert [(r["doc_id"], r["passage"]) for r in results][0] == ("doc-b", 0)
+    assert results[0]["score"] == 1.0
+    assert results[0]["start"] == 0 and results[0]["end"] == len(PASSAGES["doc-b"][0])
+    scores = [r["score"] for r in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_within_documents(vectors):
+    add_documents(vectors)
+    results = vectors.search(unit("BRCA1 repairs DNA double strand breaks"), top_k=10, doc_ids=["doc-a", "doc-c"])
+    assert {r["doc_id"] for r in results} == {"doc-a", "doc-c"}
+    assert len(results) == 4
+    assert vectors.search(unit("TP53"), top_k=10, doc_ids=["missing"]) == []
+
+
+def test_add_is_idempotent(vectors):
+    add_documents(vectors)
+    add_documents(vectors, ["doc-a"])
+    assert vectors.get_stats()["rows"] == 6
+    assert vectors.documents() == set(PASSAGES)
+
+
+def test_delete_tombstones_rows(vectors, monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_COMPACT_FRACTION", 1.0)
+    add_documents(vectors)
+    vectors.delete("doc-b")
+    stats = vectors.get_stats()
+    assert stats["rows"] == 4 and stats["deleted_rows"] == 2
+    assert not vectors.has_document("doc-b")
+    results = vectors.search(unit("BRCA1 repairs DNA double strand breaks"), top_k=10)
+    assert "doc-b" not in {r["doc_id"] for r in results}
+    assert len(results) == 4
+
+
+def test_compact_renumbers_rows(vectors, monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_COMPACT_FRACTION", 0.3)
+    add_documents(vectors)
+    old_path = vectors._path(0)
+    vectors.delete("doc-a")
+
+    stats = vectors.get_stats()
+    assert stats["rows"] == 4 and stats["deleted_rows"] == 0
+    assert not old_path.exists() and vectors._path(1).exists()
+    rows = vectors._connect().execute("SELECT row, doc_id, passage FROM rows ORDER BY row").fetchall()
+    assert [(r["row"], r["doc_id"], r["passage"]) for r in rows] == [
+        (0, "doc-b", 0), (1, "doc-b", 1), (2, "doc-c", 0), (3, "doc-c", 1)
+    ]
+    # Renumbered rows still point at their own vectors
+    for doc_id, passages in PASSAGES.items():
+        if doc_id == "doc-a":
+            continue
+        for i, passage in enumerate(passages):
+            best = vectors.search(unit(passage), top_k=1)[0]
+            assert (best["doc_id"], best["passage"], best["score"]) == (doc_id, i, 1.0)
+
+    # Appends after compaction go to the new file
+    add_documents(vectors, ["doc-a"])
+    best = vectors.search(unit(PASSAGES["doc-a"][1]), top_k=1)[0]
+    assert (best["doc_id"], best["passage"]) == ("doc-a", 1)
+
+
+def test_index_document_embeds_in_batches(vectors, embedder, monkeypatch):
+    monkeypatch.setattr(vector_index, "EMBEDDING_BATCH_SIZE", 2)
+    text = " ".join(PASSAGES["doc-a"] + PASSAGES["doc-c"])
+    spans, start = [], 0
+    for passage in PASSAGES["doc-a"] + PASSAGES["doc-c"]:
+        spans.append((start, start + len(passage)))
+        start += len(passage) + 1
+    asyncio.run(vector_index.index_document("doc-x", text, spans))
+    assert [len(batch) for batch in embedder] == [2, 2]
+    asyncio.run(vector_index.index_document("doc-x", text, spans))
+    assert len(embedder) == 2
+
+    results = asyncio.run(vector_index.search("ATM phosphorylates MDM2 after DNA damage", 1))
+    assert (results[0]["doc_id"], results[0]["passage"]) == ("doc-x", 3)
+
+
+def test_search_endpoint(vectors, store):
+    for doc_id, passages in PASSAGES.items():
+        text = "\n\n".join(passages)
+        store.add({
+            "id": doc_id, "filename": f"{doc_id}.txt", "path": f"/tmp/{doc_id}.txt", "content_hash": doc_id,
+            "text": text, "char_count": len(text), "word_count": len(text.split())
+        })
+    app = FastAPI()
+    app.include_router(search_router.router, prefix="/api/search")
+    client = TestClient(app)
+
+    # Documents are embedded on their first search
+    response = client.get("/api/search", params={"q": "BRCA1 repairs DNA double strand breaks", "top_k": 2})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 2
+    assert results[0]["doc_id"] == "doc-b" and results[0]["filename"] == "doc-b.txt"
+    assert "BRCA1 repairs DNA" in results[0]["text"]
+    assert vectors.documents() == set(PASSAGES)
+
+    response = client.get("/api/search", params={"q": "BRCA1", "document_ids": ["doc-a", "doc-c"]})
+    assert {r["doc_id"] for r in response.json()["results"]} <= {"doc-a", "doc-c"}
+
+    assert client.get("/api/search", params={"q": ""}).status_code == 422
+
+
+def test_search_endpoint_disabled(monkeypatch, store):
+    monkeypatch.setattr(vector_index, "EMBEDDING_MODEL", None)
+    app = FastAPI()
+    app.include_router(search_router.router, prefix="/api/search")
+    assert TestClient(app).get("/api/search", params={"q": "TP53"}).status_code == 503
+
+
+def test_delete_document_removes_vectors(vectors, store):
+    add_documents(vectors, ["doc-a"])
+    text = "\n\n".join(PASSAGES["doc-a"])
+    store.add({
+        "id": "doc-a", "filename": "doc-a.txt", "path": "/nonexistent/doc-a.txt", "content_hash": "doc-a",
+        "text": text, "char_count": len(text), "word_count": len(text.split())
+    })
+    assert asyncio.run(document_processor.delete_document("doc-a"))
+    assert not vectors.has_document("doc-a")
+    assert not asyncio.run(document_processor.delete_document("doc-a"))
+
+
+def test_search_skips_documents_that_fail_to_embed(vectors, store, monkeypatch):
+    monkeypatch.setattr(document_processor, "EMBEDDING_BACKFILL_DOCUMENTS", 2)
+    for doc_id, passages in PASSAGES.items():
+        text = "\n\n".join(passages)
+        store.add({
+            "id": doc_id, "filename": f"{doc_id}.txt", "path": f"/tmp/{doc_id}.txt", "content_hash": doc_id,
+            "text": text, "char_count": len(text), "word_count": len(text.split())
+        })
+    embed = llm_client.embed
+
+    async def flaky_embed(texts, model=None, priority=None):
+        if any("BRCA1" in text for text in texts):
+            raise RuntimeError("embeddings endpoint down")
+        return await embed(texts, model, priority)
+
+    monkeypatch.setattr(llm_client, "embed", flaky_embed)
+    app = FastAPI()
+    app.include_router(search_router.router, prefix="/api/search")
+    client = TestClient(app)
+
+    # At most two documents are embedded per search, and doc-b's failure doesn't fail it
+    response = client.get("/api/search", params={"q": "TP53 binds MDM2"})
+    assert response.status_code == 200
+    assert vectors.documents() == {"doc-a"}
+    assert response.json()["results"][0]["doc_id"] == "doc-a"
+
+    monkeypatch.setattr(llm_client, "embed", embed)
+    client.get("/api/search", params={"q": "TP53 binds MDM2"})
+    assert vectors.documents() == set(PASSAGES)